@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""Compare the local interfaces: task throughput on null tasks and on tasks
+which release the GIL (NumPy if it is installed, otherwise zlib), the latency
+of single null tasks and the memory used by the master and worker processes."""
+
+from pymw import *
+from pymw import interfaces
+import pymw.interfaces.multicore
+import pymw.interfaces.threaded
+import pymw.interfaces.fork
+import pymw.interfaces.subinterpreter
+import os
+import time
+from optparse import OptionParser
+
+def null_task(in_data):
+	return in_data
+
+def numpy_task(size):
+	import numpy
+	a = numpy.random.rand(size, size)
+	return float(numpy.dot(a, a).sum())
+
+def zlib_task(size):
+	import os, zlib
+	data = os.urandom(1024) * size
+	return len(zlib.compress(data, 9))
+
+def run_tasks(interface_obj, task_func, task_input, n_tasks):
+	pymw_master = pymw.PyMW_Master(interface=interface_obj)
+	start_time = time.time()
+	tasks = [pymw_master.submit_task(task_func, input_data=(task_input,)) for i in range(n_tasks)]
+	for task in tasks:
+		pymw_master.get_result(task)
+	return time.time() - start_time
+
+# Mean time from submitting a task to getting its result, with one task at a time
+def task_latency(interface_obj, n_tasks):
+	pymw_master = pymw.PyMW_Master(interface=interface_obj)
+	start_time = time.time()
+	for i in range(n_tasks):
+		pymw_master.get_result(pymw_master.submit_task(null_task, input_data=(i,)))
+	return (time.time() - start_time) / n_tasks
+
+# Resident memory of the master and the peak of its finished worker processes in MB (Linux only)
+def memory_usage():
+	master_rss = 0.0
+	try:
+		for line in open("/proc/self/status"):
+			if line.startswith("VmRSS:"): master_rss = int(line.split()[1]) / 1024.0
+	except IOError:
+		pass
+	try:
+		import resource
+		worker_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+	except ImportError:
+		worker_rss = 0.0
+	return master_rss, worker_rss
+
+parser = OptionParser(usage="usage: %prog")
+parser.add_option("-t", "--num_tasks", dest="n_tasks", default="200",
+				help="number of tasks", metavar="N")
+parser.add_option("-n", "--num_workers", dest="n_workers", default="4",
+				help="number of workers", metavar="N")
+parser.add_option("-s", "--size", dest="size", default="200",
+				help="size of the GIL releasing tasks", metavar="N")
+options, args = parser.parse_args()
+n_tasks, n_workers, size = int(options.n_tasks), int(options.n_workers), int(options.size)
+
+try:
+	import numpy
+	work_name, work_func = "numpy", numpy_task
+except ImportError:
+	work_name, work_func = "zlib", zlib_task
+
+interface_classes = [("multicore", pymw.interfaces.multicore.MulticoreInterface),
+					 ("threaded", pymw.interfaces.threaded.ThreadInterface)]
+if hasattr(os, "fork"): interface_classes.append(("fork", pymw.interfaces.fork.ForkInterface))
+# Without subinterpreter support this is the multicore interface again
+interface_classes.append(("subinterp", pymw.interfaces.subinterpreter.SubinterpreterInterface))
+
+# The worker process peak is the largest so far, so the process-based interfaces come first
+print("Number of tasks: %d, workers: %d" % (n_tasks, n_workers))
+print("%-10s %12s %12s %11s %10s %10s" % ("interface", "null tasks/s", work_name+" tasks/s",
+										  "latency ms", "master MB", "worker MB"))
+for name, interface_class in interface_classes:
+	null_time = run_tasks(interface_class(num_workers=n_workers), null_task, 1, n_tasks)
+	work_time = run_tasks(interface_class(num_workers=n_workers), work_func, size, n_tasks)
+	latency = task_latency(interface_class(num_workers=1), max(n_tasks // 10, 1))
+	master_rss, worker_rss = memory_usage()
+	print("%-10s %12.1f %12.1f %11.2f %10.1f %10.1f" % (name, n_tasks / null_time, n_tasks / work_time,
+														1000 * latency, master_rss, worker_rss))
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""Measure the overhead of journaling tasks, so the master can be resumed
+after a restart, on null tasks.  The threaded interface keeps results in
+memory, so the journal has to keep them itself, while the multicore
+interface leaves them in output files, but takes much longer per task."""
+
+from pymw import *
+from pymw import interfaces
+import pymw.interfaces.multicore
+import pymw.interfaces.threaded
+import os
+import tempfile
+import time
+from optparse import OptionParser
+
+def null_task(in_data):
+	return in_data
+
+def run_tasks(interface_class, n_tasks, n_workers, journal_file):
+	interface_obj = interface_class(num_workers=n_workers)
+	if journal_file: journal = pymw.journal.PyMW_Journal(journal_file)
+	else: journal = None
+	pymw_master = pymw.PyMW_Master(interface=interface_obj, journal=journal)
+	start_time = time.time()
+	tasks = [pymw_master.submit_task(null_task, input_data=(i,)) for i in range(n_tasks)]
+	for task in tasks:
+		pymw_master.get_result(task)
+	if journal: journal.close(completed=True)
+	run_time = time.time() - start_time
+	pymw_master._cleanup(None, None)
+	return run_time
+
+parser = OptionParser(usage="usage: %prog")
+parser.add_option("-t", "--num_tasks", dest="n_tasks", default="2000",
+				help="number of tasks", metavar="N")
+parser.add_option("-n", "--num_workers", dest="n_workers", default="4",
+				help="number of workers", metavar="N")
+parser.add_option("-r", "--repeats", dest="repeats", default="3",
+				help="number of runs of each configuration", metavar="N")
+parser.add_option("-i", "--interface", dest="interface", default="threaded",
+				help="interface to use (threaded or multicore)", metavar="NAME")
+options, args = parser.parse_args()
+n_tasks, n_workers, repeats = int(options.n_tasks), int(options.n_workers), int(options.repeats)
+interface_classes = {"threaded": pymw.interfaces.threaded.ThreadInterface,
+					 "multicore": pymw.interfaces.multicore.MulticoreInterface}
+interface_class = interface_classes[options.interface]
+
+journal_fd, journal_file = tempfile.mkstemp()
+os.close(journal_fd)
+
+# Alternate the runs to even out background noise, and keep the best of each
+plain_times, journal_times = [], []
+for i in range(repeats):
+	plain_times.append(run_tasks(interface_class, n_tasks, n_workers, None))
+	journal_times.append(run_tasks(interface_class, n_tasks, n_workers, journal_file))
+os.remove(journal_file)
+
+plain_time, journal_time = min(plain_times), min(journal_times)
+print("Interface:", options.interface)
+print("Number of tasks:", n_tasks)
+print("Without journal: %6.3f sec" % plain_time)
+print("With journal:    %6.3f sec" % journal_time)
+print("Overhead:        %5.1f%%" % (100.0 * (journal_time - plain_time) / plain_time))
@@ -31,7 +31,7 @@ def prime_test(n):
 		p = pow(decimal.Decimal(a), d, n) # p = a^d % n
 		if p != 1:
 			maybe_prime = False
-			for r in range(s):
+			for r in range(int(s)):
 				q = pow(a, pow(2,r)*d, n) # q = a^(d*2^r) % n
 				if q == n-1:
 					maybe_prime = True
@@ -55,6 +55,9 @@ parser.add_option("-r", "--min_val", dest="min_val", default="1",
 parser.add_option("-s", "--max_val", dest="max_val", default="10000", 
 				help="maximum value to check", metavar="N")
 
+parser.add_option("-f", "--first", dest="first", action="store_true", default=False,
+				help="stop after the first task that finds primes")
+
 options, args = interfaces.parse_options(parser)
 
 n_workers, min_val, max_val = int(options.n_workers), int(options.min_val), int(options.max_val)
@@ -87,6 +90,10 @@ primes = []
 for i in range(len(in_data)):
 	res_task, res = pymw_master.get_result()
 	primes.extend(res)
+	# Cancel the remaining tasks once we have what we need
+	if options.first and len(primes) > 0:
+		pymw_master.cancel([task for task in tasks if task is not res_task])
+		break
 
 end_time = time.time()
 
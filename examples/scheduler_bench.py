@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Compare the makespan of the task matching heuristics in pymw.schedulers
+on a simulated heterogeneous desktop grid."""
+
+from pymw import *
+from pymw import interfaces
+from pymw import schedulers
+import pymw.interfaces.grid_simulator
+import random
+import time
+from optparse import OptionParser
+
+# Task lengths are in CPU seconds on a worker of speed 1
+def sim_task(worker, cpu_secs):
+	return cpu_secs
+
+# Worker speeds are uniformly distributed between 0.2 and 5
+def worker_speed(worker_num):
+	return random.uniform(0.2, 5)
+
+# Workers are always available
+def worker_avail(worker_num):
+	return [1e12], [1.0]
+
+def run_heuristic(name, matcher_class, n_workers, task_lens):
+	random.seed(1)
+	interface_obj = pymw.interfaces.grid_simulator.GridSimulatorInterface()
+	interface_obj.generate_workers(n_workers, worker_speed, worker_avail)
+	# Matchers use the simulated worker speeds and the simulation clock
+	if matcher_class:
+		matcher = matcher_class(speed_func=lambda worker: worker._speed,
+								clock=lambda: interface_obj._cur_sim_time)
+	else:
+		matcher = None
+	pymw_master = pymw.PyMW_Master(interface=interface_obj, scheduler_func=matcher)
+
+	start_time = time.time()
+	tasks = [pymw_master.submit_task(sim_task, input_data=(task_len,), cost=task_len) for task_len in task_lens]
+	for task in tasks:
+		pymw_master.get_result(task)
+	end_time = time.time()
+
+	all_workers = interface_obj._worker_list + interface_obj._waiting_list
+	makespan = max([worker._cur_time for worker in all_workers])
+	print("%-20s makespan: %12.1f   scheduling time: %6.2f sec" % (name, makespan, end_time-start_time))
+
+parser = OptionParser(usage="usage: %prog")
+parser.add_option("-t", "--num_tasks", dest="n_tasks", default="2000",
+				help="number of tasks", metavar="N")
+parser.add_option("-w", "--num_sim_workers", dest="n_sim_workers", default="200",
+				help="number of simulated workers", metavar="N")
+options, args = parser.parse_args()
+n_tasks, n_workers = int(options.n_tasks), int(options.n_sim_workers)
+
+# Mix of many short tasks and a few long ones
+random.seed(0)
+task_lens = [random.choice([random.uniform(10, 30)]*9 + [random.uniform(200, 600)]) for i in range(n_tasks)]
+
+heuristics = [("first task/worker", None),
+			  ("min-min", schedulers.MinMinMatcher),
+			  ("max-min", schedulers.MaxMinMatcher),
+			  ("sufferage", schedulers.SufferageMatcher),
+			  ("LPT", schedulers.LPTMatcher),
+			  ("speed proportional", schedulers.SpeedProportionalMatcher)]
+
+print("Number of tasks:", n_tasks)
+print("Number of workers:", n_workers)
+print("Total CPU work:", sum(task_lens))
+for name, matcher_class in heuristics:
+	run_heuristic(name, matcher_class, n_workers, task_lens)
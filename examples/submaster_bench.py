@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""Measure the dispatch throughput of null tasks with a single master and with
+1, 2, 4, ... sub-masters, each running its workers in threads, so the time
+is spent in the masters rather than in the tasks."""
+
+from pymw import *
+from pymw import interfaces
+import pymw.interfaces.threaded
+import pymw.interfaces.submaster
+import functools
+import time
+from optparse import OptionParser
+
+def null_task(in_data):
+	return in_data
+
+def run_tasks(interface_obj, n_tasks):
+	pymw_master = pymw.PyMW_Master(interface=interface_obj)
+	# The first task waits for the sub-masters to start
+	pymw_master.get_result(pymw_master.submit_task(null_task, input_data=(0,)))
+	start_time = time.time()
+	tasks = [pymw_master.submit_task(null_task, input_data=(i,)) for i in range(n_tasks)]
+	for task in tasks:
+		pymw_master.get_result(task)
+	elapsed = time.time() - start_time
+	try:
+		interface_obj._cleanup()
+	except AttributeError:
+		pass
+	return n_tasks / elapsed
+
+# Sub-masters start new processes, so the benchmark must only run in the main script
+if __name__ == "__main__":
+	parser = OptionParser(usage="usage: %prog")
+	parser.add_option("-t", "--num_tasks", dest="n_tasks", default="5000",
+					help="number of tasks", metavar="N")
+	parser.add_option("-n", "--num_workers", dest="n_workers", default="4",
+					help="number of workers of each sub-master", metavar="N")
+	parser.add_option("-s", "--max_submasters", dest="max_submasters", default="4",
+					help="largest number of sub-masters", metavar="N")
+	options, args = parser.parse_args()
+	n_tasks, n_workers, max_submasters = int(options.n_tasks), int(options.n_workers), int(options.max_submasters)
+
+	print("Number of tasks: %d, workers per sub-master: %d" % (n_tasks, n_workers))
+	print("%-12s %12s" % ("sub-masters", "tasks/s"))
+	rate = run_tasks(pymw.interfaces.threaded.ThreadInterface(num_workers=n_workers), n_tasks)
+	print("%-12s %12.1f" % ("none", rate))
+	interface_factory = functools.partial(pymw.interfaces.threaded.ThreadInterface, num_workers=n_workers)
+	n_submasters = 1
+	while n_submasters <= max_submasters:
+		interface_obj = pymw.interfaces.submaster.SubMasterInterface(num_submasters=n_submasters,
+																	 interface_factory=interface_factory)
+		print("%-12d %12.1f" % (n_submasters, run_tasks(interface_obj, n_tasks)))
+		n_submasters *= 2
@@ -1,4 +1,4 @@
-__all__ = ["pymw"]
+__all__ = ["pymw", "estimator", "schedulers", "cache", "journal", "result_store"]
 
 from .pymw import PyMW_Master
 from .interfaces import *
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+"""Provide an on-disk cache of PyMW task results, so unchanged tasks
+are not computed again in later runs.
+"""
+
+import collections
+import hashlib
+import logging
+import os
+import pickle
+import site
+import sys
+import sysconfig
+import tempfile
+import threading
+
+class PyMW_ResultCache:
+	"""Stores task results in cache_dir, keyed by a hash of the task function
+	source, the modules it uses, its data files and its input.  Local modules
+	are identified by the contents of their source files, and modules installed
+	in the standard library or site-packages by their __version__.
+	When the cache grows beyond max_bytes, the least recently used results
+	are removed."""
+
+	def __init__(self, cache_dir, max_bytes=1<<30):
+		self._cache_dir = cache_dir
+		self._max_bytes = max_bytes
+		self._lock = threading.Lock()
+		self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+		# Content hashes of data files, by name, modification time and size
+		self._file_hashes = {}
+		if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+		# Directories of installed modules
+		install_dirs = [sysconfig.get_path(name) for name in ("stdlib", "platstdlib", "purelib", "platlib")]
+		try:
+			install_dirs += site.getsitepackages() + [site.getusersitepackages()]
+		except AttributeError:
+			pass
+		self._install_dirs = tuple(set([os.path.join(os.path.realpath(path), "") for path in install_dirs if path]))
+
+		# Entries and their sizes in least recently used order, starting from the file times
+		self._entries = collections.OrderedDict()
+		self._total_bytes = 0
+		entry_list = []
+		for file_name in os.listdir(cache_dir):
+			if not file_name.endswith(".pkl"): continue
+			file_stat = os.stat(os.path.join(cache_dir, file_name))
+			entry_list.append((file_stat.st_mtime, file_name[:-4], file_stat.st_size))
+		for mtime, key, size in sorted(entry_list):
+			self._entries[key] = size
+			self._total_bytes += size
+
+	def get_key(self, func_sources, modules, data_files, input_data):
+		"""Returns the cache key of a task, or None if the input can't be pickled."""
+		key_hash = hashlib.sha256()
+		for func_source in func_sources:
+			key_hash.update(func_source.encode("utf-8"))
+		for module_name in sorted(modules):
+			key_hash.update((module_name+"=").encode("utf-8"))
+			key_hash.update(self._module_id(module_name))
+			key_hash.update(b"\n")
+		for file_name in data_files:
+			key_hash.update(os.path.basename(file_name).encode("utf-8"))
+			key_hash.update(self._file_hash(file_name))
+		try:
+			key_hash.update(pickle.dumps(input_data, 2))
+		except (pickle.PicklingError, TypeError, AttributeError):
+			return None
+		return key_hash.hexdigest()
+
+	# Returns the version of an installed module, or a hash of the source files of a local module
+	def _module_id(self, module_name):
+		try:
+			__import__(module_name)
+			module = sys.modules[module_name]
+		except Exception:
+			return b"None"
+		module_file = getattr(module, "__file__", None)
+		if not module_file or os.path.realpath(module_file).startswith(self._install_dirs):
+			return str(getattr(module, "__version__", None)).encode("utf-8")
+		# A local package is identified by all the source files below it
+		if os.path.basename(module_file).startswith("__init__."):
+			package_dir = os.path.dirname(module_file)
+			source_files = []
+			for dir_path, dir_names, file_names in os.walk(package_dir):
+				dir_names.sort()
+				source_files += [os.path.join(dir_path, file_name) for file_name in sorted(file_names) if file_name.endswith(".py")]
+		else:
+			package_dir = os.path.dirname(module_file)
+			source_files = [module_file]
+		module_hash = hashlib.sha256()
+		for file_name in source_files:
+			try:
+				file_hash = self._file_hash(file_name)
+			except (IOError, OSError):
+				file_hash = b"None"
+			module_hash.update(os.path.relpath(file_name, package_dir).encode("utf-8"))
+			module_hash.update(file_hash)
+		return module_hash.digest()
+
+	def _file_hash(self, file_name):
+		file_stat = os.stat(file_name)
+		file_id = (file_name, file_stat.st_mtime, file_stat.st_size)
+		if file_id not in self._file_hashes:
+			data_file = open(file_name, "rb")
+			self._file_hashes[file_id] = hashlib.sha256(data_file.read()).digest()
+			data_file.close()
+		return self._file_hashes[file_id]
+
+	def _file_name(self, key):
+		return os.path.join(self._cache_dir, key+".pkl")
+
+	def get(self, key):
+		"""Returns (True, result) if a result is cached under key, otherwise (False, None)."""
+		self._lock.acquire()
+		try:
+			if key in self._entries:
+				try:
+					cache_file = open(self._file_name(key), "rb")
+					result = pickle.Unpickler(cache_file).load()
+					cache_file.close()
+					os.utime(self._file_name(key), None)
+				except (IOError, OSError, EOFError, pickle.UnpicklingError) as e:
+					logging.warning("Could not read cached result "+key+": "+str(e))
+					self._remove(key)
+				else:
+					# Move the entry to the most recently used end
+					self._entries[key] = self._entries.pop(key)
+					self._stats["hits"] += 1
+					return True, result
+			self._stats["misses"] += 1
+			return False, None
+		finally:
+			self._lock.release()
+
+	def put(self, key, result):
+		"""Stores result under key, removing old results to stay within max_bytes."""
+		file_name = self._file_name(key)
+		try:
+			# Write to a temporary file first, so readers never see a partial result
+			tmp_fd, tmp_file_name = tempfile.mkstemp(suffix=".tmp", dir=self._cache_dir)
+			cache_file = os.fdopen(tmp_fd, "wb")
+			pickle.Pickler(cache_file, 2).dump(result)
+			cache_file.close()
+			os.rename(tmp_file_name, file_name)
+			size = os.path.getsize(file_name)
+		except (IOError, OSError, pickle.PicklingError, TypeError) as e:
+			logging.warning("Could not cache result "+key+": "+str(e))
+			return
+
+		self._lock.acquire()
+		try:
+			if key in self._entries: self._total_bytes -= self._entries.pop(key)
+			self._entries[key] = size
+			self._total_bytes += size
+			self._stats["stores"] += 1
+			while self._total_bytes > self._max_bytes and len(self._entries) > 1:
+				self._remove(next(iter(self._entries)))
+				self._stats["evictions"] += 1
+		finally:
+			self._lock.release()
+
+	# Must be called with the lock held
+	def _remove(self, key):
+		self._total_bytes -= self._entries.pop(key)
+		try:
+			os.remove(self._file_name(key))
+		except OSError:
+			pass
+
+	def get_stats(self):
+		"""Returns the number of cache hits, misses, stored and evicted results,
+		the hit ratio and the size of the cache in bytes."""
+		self._lock.acquire()
+		stats = dict(self._stats)
+		stats["num_entries"] = len(self._entries)
+		stats["num_bytes"] = self._total_bytes
+		self._lock.release()
+		lookups = stats["hits"] + stats["misses"]
+		if lookups > 0: stats["hit_ratio"] = stats["hits"] / float(lookups)
+		else: stats["hit_ratio"] = 0.0
+		return stats
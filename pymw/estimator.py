@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""Provide runtime estimates for PyMW tasks based on previously executed tasks.
+"""
+
+import logging
+import os
+import pickle
+import threading
+
+class PyMW_RuntimeEstimator:
+	"""Learns how long tasks take to execute from finished tasks.
+	Exponentially weighted execution time statistics are kept per function,
+	per function and worker, and for the relative speed of each worker.
+	If size_func is given, it is called with a task and should return a number
+	describing the size of the task input.  Statistics are then also kept for
+	each power of two size bucket.
+	Tasks submitted with a cost hint are assumed to take time proportional to their
+	cost, so for these the time per unit of cost is learned instead, under the
+	function name with "/cost" appended.
+	If model_file is given, the model is loaded from this file if it exists and
+	saved to it when the PyMW_Master is cleaned up, so later runs can use it.
+	Workers are identified by str(worker), so the per-worker statistics only carry
+	over to later runs if the workers of the interface have stable names."""
+
+	MODEL_VERSION = 1
+
+	def __init__(self, alpha=0.3, size_func=None, model_file=None, default_estimate=None):
+		self._alpha = alpha
+		self._size_func = size_func
+		self._model_file = model_file
+		self._default_estimate = default_estimate
+		self._lock = threading.Lock()
+		# Each statistic is a list of [EWMA mean, EWMA variance, number of samples]
+		self._func_stats = {}
+		self._worker_func_stats = {}
+		self._worker_factors = {}
+		if model_file and os.path.exists(model_file):
+			self.load(model_file)
+
+	def get_size_bucket(self, task):
+		"""Returns the size bucket of a task, or None if no size_func was given."""
+		return self._size_bucket(task)
+
+	def _size_bucket(self, task):
+		if not self._size_func: return None
+		try:
+			size = int(self._size_func(task))
+		except Exception:
+			return None
+		return max(size, 0).bit_length()
+
+	def _update_stat(self, stat_dict, key, value):
+		stat = stat_dict.get(key)
+		if stat is None:
+			stat_dict[key] = [value, 0.0, 1]
+			return
+		diff = value - stat[0]
+		incr = self._alpha * diff
+		stat[0] += incr
+		stat[1] = (1 - self._alpha) * (stat[1] + diff * incr)
+		stat[2] += 1
+
+	# Returns the name statistics for a task are kept under, and the task cost to scale them by
+	def _stat_name(self, task):
+		cost = getattr(task, "_cost", None)
+		if cost: return task._func_name+"/cost", cost
+		return task._func_name, 1.0
+
+	def _func_mean(self, func_name, bucket):
+		stat = self._func_stats.get((func_name, bucket))
+		if stat is None and bucket is not None:
+			stat = self._func_stats.get((func_name, None))
+		if stat: return stat[0]
+		return None
+
+	def record(self, task, worker, exec_time):
+		"""Updates the model with the execution time of a finished task on a worker."""
+		if exec_time is None or exec_time < 0: return
+		func_name, scale = self._stat_name(task)
+		exec_time = exec_time / scale
+		bucket = self._size_bucket(task)
+		worker_name = str(worker)
+		self._lock.acquire()
+		try:
+			# Compare the worker with the function mean before including this sample
+			func_mean = self._func_mean(func_name, bucket)
+			if func_mean:
+				self._update_stat(self._worker_factors, worker_name, exec_time / func_mean)
+			self._update_stat(self._func_stats, (func_name, bucket), exec_time)
+			if bucket is not None:
+				self._update_stat(self._func_stats, (func_name, None), exec_time)
+			self._update_stat(self._worker_func_stats, (func_name, bucket, worker_name), exec_time)
+		finally:
+			self._lock.release()
+
+	def estimate(self, task, worker=None):
+		"""Returns the estimated execution time in seconds of task on worker.
+		If worker is None, the estimate is for an average worker.
+		If nothing is known about the task function, the cost hint given when
+		the task was submitted is used, otherwise default_estimate is returned."""
+		func_name, scale = self._stat_name(task)
+		bucket = self._size_bucket(task)
+		worker_name = str(worker)
+		self._lock.acquire()
+		try:
+			if worker is not None:
+				stat = self._worker_func_stats.get((func_name, bucket, worker_name))
+				if stat: return stat[0] * scale
+			func_mean = self._func_mean(func_name, bucket)
+			if func_mean is None:
+				# Fall back to the cost hint, which is in seconds on an average worker
+				if scale == 1.0: return self._default_estimate
+				func_mean = 1.0
+			if worker is not None and worker_name in self._worker_factors:
+				return func_mean * scale * self._worker_factors[worker_name][0]
+			return func_mean * scale
+		finally:
+			self._lock.release()
+
+	def get_function_stats(self, func_name, bucket=None):
+		"""Returns the mean, standard deviation and number of samples of the
+		execution time of func_name, or None if the function has not been seen."""
+		self._lock.acquire()
+		try:
+			stat = self._func_stats.get((func_name, bucket))
+			if not stat: return None
+			return stat[0], stat[1] ** 0.5, stat[2]
+		finally:
+			self._lock.release()
+
+	def get_task_stats(self, task):
+		"""Returns the mean and standard deviation of the execution time of task
+		on an average worker and the number of samples they are based on,
+		or None if nothing is known about the task function."""
+		func_name, scale = self._stat_name(task)
+		bucket = self._size_bucket(task)
+		self._lock.acquire()
+		try:
+			stat = self._func_stats.get((func_name, bucket))
+			if stat is None and bucket is not None:
+				stat = self._func_stats.get((func_name, None))
+			if not stat: return None
+			return stat[0] * scale, stat[1] ** 0.5 * scale, stat[2]
+		finally:
+			self._lock.release()
+	
+	def get_worker_factor(self, worker):
+		"""Returns how much slower than average the worker is (1.0 if unknown)."""
+		stat = self._worker_factors.get(str(worker))
+		if stat: return stat[0]
+		return 1.0
+
+	def save(self, file_name=None):
+		"""Saves the model to file_name, or to model_file if file_name is None."""
+		if not file_name: file_name = self._model_file
+		if not file_name: return
+		self._lock.acquire()
+		try:
+			model = {"version": self.MODEL_VERSION, "func_stats": self._func_stats,
+					 "worker_func_stats": self._worker_func_stats, "worker_factors": self._worker_factors}
+			model_file = open(file_name+".tmp", "wb")
+			pickle.Pickler(model_file).dump(model)
+			model_file.close()
+			os.rename(file_name+".tmp", file_name)
+		finally:
+			self._lock.release()
+
+	def load(self, file_name):
+		"""Loads a model previously saved with save()."""
+		try:
+			model_file = open(file_name, "rb")
+			model = pickle.Unpickler(model_file).load()
+			model_file.close()
+		except (IOError, OSError, EOFError, pickle.UnpicklingError) as e:
+			logging.warning("Could not load runtime model "+file_name+": "+str(e))
+			return
+		if model.get("version") != self.MODEL_VERSION:
+			logging.warning("Ignoring runtime model "+file_name+" with unknown version")
+			return
+		self._lock.acquire()
+		self._func_stats = model["func_stats"]
+		self._worker_func_stats = model["worker_func_stats"]
+		self._worker_factors = model["worker_factors"]
+		self._lock.release()
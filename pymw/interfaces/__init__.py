@@ -1,7 +1,8 @@
-__all__ = ["generic", "boinc", "condor", "ganga", "mpi", "multicore"]
+__all__ = ["generic", "boinc", "condor", "ganga", "mpi", "multicore", "fork", "threaded", "subinterpreter", "tcp", "federated", "submaster"]
 
 from .generic import *
 
+import os
 import sys
 
 from optparse import OptionParser
@@ -19,12 +20,15 @@ def parse_options(parser=None, args=None):
 		args = sys.argv[1:]
 
 	parser.add_option("-i", "--interface", dest="interface", default="generic", 
-			help="specify the interface (generic/multicore/mpi/condor/boinc)", 
+			help="specify the interface (generic/multicore/fork/threaded/subinterpreter/mpi/tcp/condor/boinc)", 
 			metavar="INTERFACE")
 
 	parser.add_option("-n", "--num_workers", dest="n_workers", default="4", 
 			help="number of workers", metavar="N")
 
+	parser.add_option("--port", dest="port", default="7700", 
+			help="port for worker agents to connect to (TCP interface)", metavar="PORT")
+
 	parser.add_option("-g", "--ganga_loc", dest="g_loc", default="~/Ganga/bin/ganga", 
 			help="directory of GANGA executable (GANGA interface)", metavar="FILE")
 
@@ -51,8 +55,22 @@ def get_interface(options):
 		interface_obj = generic.GenericInterface(num_workers=n_workers)
 	elif options.interface == "multicore":
 		interface_obj = multicore.MulticoreInterface(num_workers=n_workers)
+	elif options.interface == "fork":
+		interface_obj = fork.ForkInterface(num_workers=n_workers)
+	elif options.interface == "threaded":
+		interface_obj = threaded.ThreadInterface(num_workers=n_workers)
+	elif options.interface == "subinterpreter":
+		interface_obj = subinterpreter.SubinterpreterInterface(num_workers=n_workers)
 	elif options.interface == "mpi":
 		interface_obj = mpi.MPIInterface(num_workers=n_workers)
+	elif options.interface == "tcp":
+		# Agents on other machines can only connect if the master has the key they share
+		# Otherwise agents on this machine use the generated key in authkey_file
+		authkey = os.environ.get("PYMW_AUTHKEY")
+		if authkey: interface_obj = tcp.SocketInterface(port=int(options.port), host="", authkey=authkey.encode())
+		else:
+			interface_obj = tcp.SocketInterface(port=int(options.port))
+			print(("Start agents with PYMW_AUTHKEY_FILE="+interface_obj.authkey_file))
 	elif options.interface == "condor":
 		interface_obj = condor.CondorInterface()
 	elif options.interface == "ganga":
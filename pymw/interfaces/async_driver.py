@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""Provide an asyncio event loop thread which runs the worker processes of
+the local interfaces, so they don't need a thread per running task.
+"""
+
+import asyncio
+import logging
+import threading
+
+from pymw.pymw import pymw_decode_record_header
+
+class AsyncDriver:
+	"""Runs an asyncio event loop in one thread.  Interfaces submit coroutines
+	which start worker processes and read their pipes.  When the processes exit,
+	their completion is handled in the default executor of the loop, so the
+	scheduler work done by task.task_finished doesn't hold up the other processes.
+	On Python 3.12 and later (on Linux), process exits are also watched from the
+	loop, while earlier versions wait for each process in a helper thread."""
+
+	def __init__(self):
+		self._loop = asyncio.new_event_loop()
+		self._thread = threading.Thread(target=self._loop.run_forever)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def run(self, coro):
+		"""Schedules coro on the event loop and returns a concurrent.futures.Future of its result."""
+		return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+_driver = None
+_driver_lock = threading.Lock()
+
+def get_driver():
+	"""Returns the driver shared by all interfaces, starting it on first use."""
+	global _driver
+	_driver_lock.acquire()
+	try:
+		if _driver is None: _driver = AsyncDriver()
+		return _driver
+	finally:
+		_driver_lock.release()
+
+async def read_stream(task, reader):
+	"""Reads the records a worker writes to its stdout from an asyncio StreamReader,
+	like PyMW_Task.read_stream.  Returns the data of the "O" (output) record,
+	or None if there was none."""
+	output = None
+	while True:
+		try:
+			header = await reader.readexactly(11)
+		except asyncio.IncompleteReadError:
+			return output
+		try:
+			record_type, length = pymw_decode_record_header(header)
+		except ValueError:
+			logging.warning("Task "+str(task)+" wrote unexpected data to stdout")
+			await reader.read()
+			return output
+		try:
+			data = await reader.readexactly(length)
+		except asyncio.IncompleteReadError:
+			return output
+		if record_type == "O": output = data
+		else: task.stream_record(record_type, data)
+
+async def _run_process(task, args, running, input_data, kwargs):
+	stdin = None
+	if input_data is not None: stdin = asyncio.subprocess.PIPE
+	process = await asyncio.create_subprocess_exec(*args, stdin=stdin, stdout=asyncio.subprocess.PIPE,
+												   stderr=asyncio.subprocess.PIPE, **kwargs)
+	running[1] = process
+	if running[2]: process.kill()
+	# Read stderr while the results are streamed, so neither pipe fills up
+	stderr_read = asyncio.ensure_future(process.stderr.read())
+	if input_data is not None:
+		try:
+			process.stdin.write(input_data)
+			await process.stdin.drain()
+			process.stdin.close()
+		except (IOError, OSError):
+			pass
+	output = await read_stream(task, process.stdout)
+	proc_stderr = await stderr_read
+	await process.wait()
+	return process.returncode, output, proc_stderr
+
+async def _run_task(task, args, running, finish_func, input_data, kwargs):
+	try:
+		returncode, output, proc_stderr = await _run_process(task, args, running, input_data, kwargs)
+	except Exception as e:
+		returncode, output, proc_stderr = None, None, str(e).encode()
+	await asyncio.get_running_loop().run_in_executor(None, finish_func, returncode, output, proc_stderr)
+
+def start_process(task, args, running, finish_func, input_data=None, **kwargs):
+	"""Runs a worker process for task with the arguments args from the event loop
+	of the shared driver, and returns without waiting for it.  running is the
+	[task, process, cancelled] list of the interface, which gets the process once
+	it starts.  input_data is written to the stdin of the process, and the records
+	it writes to stdout are streamed to the task.  When the process exits,
+	finish_func(returncode, output, stderr) is called in an executor thread of
+	the event loop, with a returncode of None if the process could not be run.
+	Other keyword arguments are passed to asyncio.create_subprocess_exec."""
+	get_driver().run(_run_task(task, args, running, finish_func, input_data, kwargs))
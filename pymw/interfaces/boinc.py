@@ -2,7 +2,7 @@
 """Provide a BOINC interface for master worker computing with PyMW.
 """
 
-import threading, shutil, os, sys
+import threading, shutil, os, sys, glob
 import time, calendar
 import logging
 from . import boinc_setup
@@ -111,6 +111,14 @@ class BOINCInterface:
 				try:
 					for entry in self._task_list:
 						task, out_file = entry
+						# Tasks reattached after a restart have an output file pattern,
+						# since the batch id of their workunit is unknown
+						if "*" in out_file:
+							found_files = glob.glob(out_file) + glob.glob(out_file + ".error")
+							if not found_files: continue
+							out_file = found_files[0]
+							if out_file.endswith(".error"): out_file = out_file[:-len(".error")]
+							task._output_arg = out_file
 						# Check for the output files
 						if os.path.isfile(out_file):
 							task.task_finished()
@@ -297,6 +305,29 @@ class BOINCInterface:
 		pickup_file = os.path.join(os.path.dirname(task._output_arg), out_file)
 		self._queue_task(task, pickup_file)
 	
+	def reattach_task(self, task):
+		"""Waits for the result of a workunit created before the master was restarted."""
+		out_file = os.path.basename(task._output_arg).replace(".dat", "_b*.dat")
+		self._queue_task(task, os.path.join(os.path.dirname(task._output_arg), out_file))
+		return True
+	
+	def cancel_task(self, task, worker):
+		"""Cancels the workunit of a running task, which then finishes with an error."""
+		self._task_list_lock.acquire()
+		try:
+			cancel_list = [entry for entry in self._task_list if entry[0] is task]
+			for entry in cancel_list: self._task_list.remove(entry)
+		finally:
+			self._task_list_lock.release()
+		if not cancel_list: return
+		
+		try:
+			mgr = Manager(self._project_home)
+			mgr.cancel_workunit("pymw_" + str(task._task_name))
+		except Exception as data:
+			logging.error("Unable to cancel workunit of task %s: %s" % (task, data))
+		task.task_finished(task_err=Exception("Task was cancelled"))
+	
 	def _get_ouput_template(self, out_file):
 		"""Returns a populated output BOINC template
 		"""
@@ -350,13 +381,19 @@ class BOINCInterface:
 		mgr.zero_batch(self._batch_id)
 		
 	def pymw_worker_func(func_name_to_call, options):
+		global _res_list
 		# Get the input data
 		input_data = pymw_worker_read(options)
 		if not input_data: input_data = ()
 		# Execute the worker function
 		result = func_name_to_call(*input_data)
-		# Output the result
-		pymw_emit_result(result)
+		# Generator functions emit each result they yield, otherwise output the result
+		import types
+		if isinstance(result, types.GeneratorType):
+			_res_list = True
+			for item in result: pymw_emit_result(item)
+		else:
+			pymw_emit_result(result)
 		open("boinc_finish_called", "w").close()
 		
 
@@ -422,6 +459,25 @@ class Manager():
 		finally:
 			self.Boinc.database.close()
 	
+	def cancel_workunit(self, wu_name):
+		"""Cancels a workunit so its unsent results are not sent to hosts."""
+		self.Boinc.database.connect()
+		
+		try:
+			unsent = self.Boinc.boinc_db.RESULT_SERVER_STATE_UNSENT
+			over = self.Boinc.boinc_db.RESULT_SERVER_STATE_OVER
+			didnt_need = self.Boinc.boinc_db.RESULT_OUTCOME_DIDNT_NEED
+			for wu in self.Boinc.database.Workunits.find(name=wu_name):
+				wu.error_mask |= self.Boinc.boinc_db.WU_ERROR_CANCELED
+				for result in self.Boinc.database.Results.find(workunit=wu):
+					if result.server_status == unsent:
+						result.server_status = over
+						result.outcome = didnt_need
+						result.commit()
+				wu.commit()
+		finally:
+			self.Boinc.database.close()
+	
 	def delete_batch(self, batch_id):
 		self.zero_batch(batch_id, cancel_workunits=True)
 		self._bin_run("file_deleter -d 3 -dont_delete_batches")
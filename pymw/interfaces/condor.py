@@ -7,6 +7,7 @@ __date__ = "22 February 2009"
 
 import subprocess
 import os
+import re
 import time
 import sys
 import pickle
@@ -28,17 +29,21 @@ Queue"""
 
 class CondorInterface:
 	"""Provides a simple interface for desktop grids running Condor."""
-	def __init__(self, python_loc="", condor_submit_loc=""):
+	def __init__(self, python_loc="", condor_submit_loc="", condor_rm_loc=""):
 		if sys.platform.startswith("win"):
 			if python_loc != "": self._python_loc = python_loc
 			else: self._python_loc = "C:\\Python25\\python.exe"
 			if condor_submit_loc != "": self._condor_submit_loc = condor_submit_loc
 			else: self._condor_submit_loc = "C:\\condor\\bin\\condor_submit.exe"
+			if condor_rm_loc != "": self._condor_rm_loc = condor_rm_loc
+			else: self._condor_rm_loc = "C:\\condor\\bin\\condor_rm.exe"
 		else:
 			if python_loc != "": self._python_loc = python_loc
 			else: self._python_loc = "/usr/local/bin/python"
 			if condor_submit_loc != "": self._condor_submit_loc = condor_submit_loc
 			else: self._condor_submit_loc = "condor_submit"
+			if condor_rm_loc != "": self._condor_rm_loc = condor_rm_loc
+			else: self._condor_rm_loc = "condor_rm"
 		self._task_list = []
 		self._task_list_lock = threading.Lock()
 		self._result_checker_running = False
@@ -113,11 +118,20 @@ class CondorInterface:
 		proc_stdout, proc_stderr = submit_process.communicate()
 		
 		# TODO: check stdout for problems
+		proc_stdout, proc_stderr = proc_stdout.decode(), proc_stderr.decode()
 		if proc_stderr != "":
 			raise Exception("condor_submit failed with error:\n"+proc_stderr)
 		
+		# Remember the cluster of the job so it can be removed if the task is cancelled
+		cluster_match = re.search(r"submitted to cluster (\d+)", proc_stdout)
+		if cluster_match: cluster_id = cluster_match.group(1)
+		else: cluster_id = None
+		
+		self._watch_task([task, err_file_name, log_file_name, submit_file_name, cluster_id])
+	
+	def _watch_task(self, entry):
 		self._task_list_lock.acquire()
-		self._task_list.append([task, err_file_name, log_file_name, submit_file_name])
+		self._task_list.append(entry)
 		self._task_list_lock.release()
 		
 		if not self._result_checker_running:
@@ -125,6 +139,44 @@ class CondorInterface:
 			self._task_finish_thread = threading.Thread(target=self._get_finished_tasks)
 			self._task_finish_thread.start()
 	
+	def reattach_task(self, task):
+		"""Watch the Condor job of a task submitted before the master was restarted.
+		Returns False if the job log of the task can't be found."""
+		err_file_name = "tasks/"+task._task_name+".err"
+		log_file_name = "tasks/"+task._task_name+".log"
+		submit_file_name = "tasks/"+str(task._task_name)+"_condor"
+		try:
+			log_file = open(log_file_name, "r")
+			log_data = log_file.read()
+			log_file.close()
+		except IOError:
+			return False
+		# Job events in the log start with the job id, as in "000 (123.000.000)"
+		cluster_match = re.search(r"\((\d+)\.\d+\.\d+\)", log_data)
+		if cluster_match: cluster_id = cluster_match.group(1)
+		else: cluster_id = None
+		self._watch_task([task, err_file_name, log_file_name, submit_file_name, cluster_id])
+		return True
+	
+	def cancel_task(self, task, worker):
+		"""Remove the Condor job of a running task, which then finishes with an error."""
+		self._task_list_lock.acquire()
+		cancel_list = [entry for entry in self._task_list if entry[0] is task]
+		for entry in cancel_list: self._task_list.remove(entry)
+		self._task_list_lock.release()
+		
+		if sys.platform.startswith("win"): cf=0x08000000
+		else: cf=0
+		for entry in cancel_list:
+			if entry[4]:
+				rm_process = subprocess.Popen(args=[self._condor_rm_loc, entry[4]],
+								creationflags=cf, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+				rm_process.communicate()
+			for file_name in entry[1:4]:
+				try: os.remove(file_name)
+				except: pass
+			task.task_finished(Exception("Task was cancelled"))
+	
 	def _cleanup(self):
 		self._scan_finished_tasks = False
 
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""Provide an interface which spreads the tasks of one master over several
+other interfaces, such as local cores, a Condor pool and a BOINC project.
+"""
+
+import collections
+import functools
+import inspect
+import logging
+import math
+import os
+import textwrap
+import threading
+import time
+
+from pymw.pymw import PyMW_Master
+
+# Worker script functions an interface can replace
+_SCRIPT_FUNCS = ("pymw_worker_read", "pymw_worker_write", "pymw_worker_func")
+
+class Backend:
+	"""An interface used by the federated interface.  latency is the expected time
+	in seconds from starting a task to getting its result, which is replaced by the
+	measured time once tasks finish, and cost is the cost of running a task there."""
+
+	# Weight of the latest task in the measured latency
+	LATENCY_WEIGHT = 0.2
+
+	def __init__(self, name, interface, latency=0.0, cost=0.0):
+		self.name = name
+		self.interface = interface
+		self.latency = latency
+		self.cost = cost
+		self._measured_latency = None
+		self._num_tasks = 0
+		# Start time of each running task by its output file, and the finish times of recent tasks
+		self._start_times = {}
+		self._finish_times = collections.deque()
+
+	def get_latency(self):
+		"""Returns the measured mean latency, or the expected latency if no task finished yet."""
+		if self._measured_latency is None: return self.latency
+		return self._measured_latency
+
+	def get_throughput(self, window=60.0):
+		"""Returns the number of tasks finished per second in the last window seconds."""
+		now = time.time()
+		while self._finish_times and self._finish_times[0] < now - window: self._finish_times.popleft()
+		return len(self._finish_times) / window
+
+	def get_num_workers(self):
+		try:
+			return self.interface.get_status()["num_total_workers"]
+		except Exception:
+			return len(self._start_times)
+
+	def _task_started(self, output_file):
+		self._start_times[output_file] = time.time()
+
+	def _task_finished(self, output_file):
+		start_time = self._start_times.pop(output_file, None)
+		if start_time is None: return
+		now = time.time()
+		self._num_tasks += 1
+		self._finish_times.append(now)
+		if self._measured_latency is None: self._measured_latency = now - start_time
+		else: self._measured_latency += self.LATENCY_WEIGHT * (now - start_time - self._measured_latency)
+
+class FederatedWorker:
+	"""A worker of one of the backends, tagged with its backend."""
+	def __init__(self, backend, worker):
+		self.backend = backend
+		self.worker = worker
+
+	def __str__(self):
+		return self.backend.name+":"+str(self.worker)
+
+class FederatedPolicy:
+	"""Chooses the backends whose free workers are offered to the scheduler.
+	Backends are ranked by their latency plus cost_weight times their cost, plus
+	for backends without free workers the expected wait for one, which is their
+	latency times the queued tasks per worker.  Backends are offered in this order
+	until their free workers cover the queued tasks, and a backend without free
+	workers stops the search, since waiting for it is expected to be faster than
+	using the backends after it.  So slower or more expensive backends only get
+	the tasks the better ones can't start soon."""
+
+	def __init__(self, cost_weight=1.0):
+		self.cost_weight = cost_weight
+
+	def order_backends(self, backend_workers, queue_length):
+		"""backend_workers is a list of (backend, free workers) pairs.  Returns the
+		pairs to offer, in the order the workers should be used."""
+		def score(pair):
+			backend, workers = pair
+			wait = 0.0
+			if not workers:
+				wait = backend.get_latency() * math.ceil(float(queue_length) / max(backend.get_num_workers(), 1))
+			return backend.get_latency() + self.cost_weight * backend.cost + wait
+
+		offered, num_free = [], 0
+		for backend, workers in sorted(backend_workers, key=score):
+			if not workers or (offered and num_free >= queue_length): break
+			offered.append((backend, workers))
+			num_free += len(workers)
+		return offered
+
+class FederatedInterface:
+	"""Runs tasks on several interfaces at once, which are given as Backend objects
+	or (name, interface) pairs.  The workers of all backends are offered to the
+	scheduler as FederatedWorker objects, and policy (a FederatedPolicy by default)
+	chooses which backends get tasks based on their latency, cost and the number of
+	queued tasks.  Worker scripts are adapted to the worker functions of each backend,
+	and task input is stored for backends which keep it in memory when a task is sent
+	to them.  get_status reports the throughput and latency of each backend."""
+
+	def __init__(self, backends, policy=None):
+		self._backends = []
+		for backend in backends:
+			if not isinstance(backend, Backend): backend = Backend(*backend)
+			self._backends.append(backend)
+		self._policy = policy or FederatedPolicy()
+		self._queue_length = 0
+		self._lock = threading.Lock()
+		# The tagged worker of each backend worker, so the scheduler always gets the same objects
+		self._workers = dict([(backend, {}) for backend in self._backends])
+		# Backend which ran the task writing each output file, and the worker script of each backend
+		self._output_backends = {}
+		self._scripts = {}
+
+	def set_queue_length(self, length):
+		self._queue_length = length
+
+	def _tag_worker(self, backend, worker):
+		tagged = self._workers[backend].get(worker)
+		if tagged is None: tagged = self._workers[backend][worker] = FederatedWorker(backend, worker)
+		return tagged
+
+	def get_available_workers(self):
+		backend_workers = []
+		for backend in self._backends:
+			try:
+				worker_list = backend.interface.get_available_workers()
+				if not type(worker_list)==list: worker_list = [None]
+			except Exception:
+				worker_list = [None]
+			backend_workers.append((backend, worker_list))
+		worker_list = []
+		for backend, workers in self._policy.order_backends(backend_workers, self._queue_length):
+			worker_list.extend([self._tag_worker(backend, worker) for worker in workers])
+		return worker_list
+
+	def reserve_worker(self, worker):
+		try:
+			worker.backend.interface.reserve_worker(worker.worker)
+		except AttributeError:
+			pass
+
+	def worker_finished(self, worker):
+		try:
+			worker.backend.interface.worker_finished(worker.worker)
+		except AttributeError:
+			pass
+
+	def get_worker_data(self, worker):
+		try:
+			return set(worker.backend.interface.get_worker_data(worker.worker))
+		except AttributeError:
+			return set()
+
+	# Returns the worker script of a task for a backend, with the worker functions of the backend
+	def _backend_script(self, script_name, backend):
+		key = (script_name, backend)
+		if key in self._scripts: return self._scripts[key]
+		replacements = []
+		for func_name in _SCRIPT_FUNCS:
+			func = getattr(backend.interface, func_name, None)
+			if func is not None:
+				replacements.append((textwrap.dedent(inspect.getsource(getattr(PyMW_Master, func_name))),
+									 textwrap.dedent(inspect.getsource(func))))
+		modules = getattr(backend.interface, "_pymw_interface_modules", ())
+		if not replacements and not modules:
+			self._scripts[key] = script_name
+			return script_name
+
+		script_file = open(script_name, "r")
+		script_source = script_file.read()
+		script_file.close()
+		for old_source, new_source in replacements:
+			script_source = script_source.replace(old_source, new_source)
+		backend_script = script_name[:-3]+"_"+str(self._backends.index(backend))+".py"
+		script_file = open(backend_script, "w")
+		script_file.write("".join(["import "+module_name+"\n" for module_name in modules])+script_source)
+		script_file.close()
+		self._scripts[key] = backend_script
+		return backend_script
+
+	def execute_task(self, task, worker):
+		backend = worker.backend
+		self._lock.acquire()
+		backend._task_started(task._output_arg)
+		self._output_backends[task._output_arg] = backend
+		self._lock.release()
+		# Backends without worker lists share one tagged worker, so the latency is measured per task
+		task._finish_func = functools.partial(self._task_finished, backend, task._finish_func)
+		# Tasks keep their original worker script, since a retry may run on another backend
+		try:
+			script_name = task._federated_script
+		except AttributeError:
+			script_name = task._federated_script = task._executable_name
+		if hasattr(task._raw_exec, '__call__'): task._executable_name = self._backend_script(script_name, backend)
+		# Backends which keep the input in memory get it from the input file
+		if hasattr(backend.interface, "pymw_master_write"):
+			backend.interface.pymw_master_write(PyMW_Master.pymw_master_read(None, task._input_arg), task._input_arg)
+
+		if hasattr(backend.interface, "start_task"): backend.interface.start_task(task, worker.worker)
+		else: backend.interface.execute_task(task, worker.worker)
+
+	def _task_finished(self, backend, finish_func, task):
+		self._lock.acquire()
+		backend._task_finished(task._output_arg)
+		self._lock.release()
+		if finish_func: finish_func(task)
+
+	def cancel_task(self, task, worker):
+		try:
+			worker.backend.interface.cancel_task(task, worker.worker)
+		except AttributeError:
+			pass
+
+	def _cleanup(self):
+		for backend in self._backends:
+			try:
+				backend.interface._cleanup()
+			except AttributeError:
+				pass
+			except Exception as e:
+				logging.error("Could not clean up backend "+backend.name+": "+str(e))
+		for script_name, backend in list(self._scripts):
+			if self._scripts[(script_name, backend)] != script_name:
+				try:
+					os.remove(self._scripts[(script_name, backend)])
+				except OSError:
+					pass
+
+	def get_status(self):
+		status = {"num_total_workers": 0, "num_active_workers": 0, "backends": {}}
+		for backend in self._backends:
+			try:
+				backend_status = backend.interface.get_status()
+				if type(backend_status) != dict: backend_status = {}
+			except Exception:
+				backend_status = {}
+			for key in ("num_total_workers", "num_active_workers"):
+				if key in backend_status: status[key] += backend_status[key]
+			backend_status.update({"num_tasks": backend._num_tasks, "num_running": len(backend._start_times),
+								   "throughput": backend.get_throughput(), "latency": backend.get_latency(),
+								   "cost": backend.cost})
+			status["backends"][backend.name] = backend_status
+		return status
+
+	def pymw_master_read(self, loc):
+		self._lock.acquire()
+		backend = self._output_backends.pop(loc, None)
+		self._lock.release()
+		if backend and hasattr(backend.interface, "pymw_master_read"): return backend.interface.pymw_master_read(loc)
+		return PyMW_Master.pymw_master_read(None, loc)
+
+	def pymw_master_write(self, output, loc):
+		PyMW_Master.pymw_master_write(None, output, loc)
+
+	def pymw_master_release(self, loc):
+		# Retries may have stored the input on several backends
+		for backend in self._backends:
+			if hasattr(backend.interface, "pymw_master_release"): backend.interface.pymw_master_release(loc)
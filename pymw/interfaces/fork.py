@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+"""Provide an interface which runs PyMW tasks in processes forked from the master,
+so worker functions can use the objects of the master without copying them.
+"""
+
+import io
+import os
+import pickle
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+import types
+import zipfile
+
+from pymw.pymw import pymw_encode_record
+
+# Records are written in the format PyMW_Task.read_stream() reads
+def _send_record(out_file, record_type, data):
+	out_file.write(pymw_encode_record(record_type, data))
+	out_file.flush()
+
+def _run_child(get_task, out_fd, err_fd, worker_dir):
+	"""Runs a task in a forked process and exits the process.  get_task returns the
+	task function, its input and its data file archive.  Results are always streamed,
+	so lazy results need no special handling.  The process exits with os._exit,
+	so it never runs the cleanup of the master."""
+	status = 1
+	try:
+		signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+		out_file = os.fdopen(out_fd, "wb")
+		func, input_data, data_file_zip = get_task()
+		if data_file_zip:
+			data_file_zip = os.path.abspath(data_file_zip)
+		os.chdir(worker_dir)
+		if data_file_zip:
+			data_arch = zipfile.ZipFile(data_file_zip, "r")
+			data_arch.extractall()
+			data_arch.close()
+
+		res_array = []
+		progress_time = [0]
+		def pymw_emit_result(result):
+			res_array.append(None)
+			_send_record(out_file, "R", pickle.dumps(result, 2))
+		def pymw_set_progress(prog_ratio):
+			now = time.time()
+			if now - progress_time[0] < 0.2 and prog_ratio < 1: return
+			progress_time[0] = now
+			_send_record(out_file, "P", ("%.4f" % min(max(prog_ratio, 0.0), 1.0)).encode("ascii"))
+		# This process has its own copy of the function globals, so the worker calls can be added to them
+		func_globals = getattr(func, "__globals__", None)
+		if func_globals is not None:
+			func_globals["pymw_emit_result"] = pymw_emit_result
+			func_globals["pymw_set_progress"] = pymw_set_progress
+
+		sys.stdout = io.StringIO()
+		sys.stderr = io.StringIO()
+		result = func(*(input_data or ()))
+		res_list = isinstance(result, types.GeneratorType)
+		if res_list:
+			for item in result: pymw_emit_result(item)
+		else:
+			pymw_emit_result(result)
+
+		# The master builds the result from the streamed results, as for the multicore interface
+		if res_list or len(res_array) != 1: _send_record(out_file, "S", b"list")
+		else: _send_record(out_file, "S", b"item")
+		_send_record(out_file, "O", pickle.dumps([None, sys.stdout.getvalue(), sys.stderr.getvalue()], 2))
+		out_file.close()
+		status = 0
+	except BaseException:
+		try:
+			os.write(err_fd, traceback.format_exc().encode("utf-8", "replace"))
+		except Exception:
+			pass
+	finally:
+		os._exit(status)
+
+def _zygote_loop(control_sock, worker_dirs):
+	"""Serves task requests from the master until the control socket is closed.
+	Each request passes the input, output and error file descriptors of a task,
+	and a process is forked from the zygote to run it."""
+	# Task processes are reaped automatically
+	signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+	try:
+		while True:
+			msg, fds, flags, addr = socket.recv_fds(control_sock, 64, 3)
+			if not msg: break
+			in_fd, out_fd, err_fd = fds
+			worker_dir = worker_dirs[int(msg)]
+			pid = os.fork()
+			if pid == 0:
+				control_sock.close()
+				def get_task():
+					in_file = os.fdopen(in_fd, "rb")
+					try:
+						return pickle.Unpickler(in_file).load()
+					finally:
+						in_file.close()
+				_run_child(get_task, out_fd, err_fd, worker_dir)
+			for fd in fds: os.close(fd)
+			control_sock.sendall(("%010d" % pid).encode("ascii"))
+	finally:
+		os._exit(0)
+
+class Worker:
+	"""Represents a worker in the fork interface."""
+	def __init__(self, worker_num):
+		self._worker_num = worker_num
+		self._worker_dir = tempfile.mkdtemp()
+		self._exec_pid = None
+		self._exec_task = None
+		self._cancelled = False
+
+	def __str__(self):
+		return "fork"+str(self._worker_num)
+
+	def _kill(self):
+		try:
+			if self._exec_pid: os.kill(self._exec_pid, signal.SIGKILL)
+		except OSError:
+			pass
+
+	def _cleanup(self):
+		shutil.rmtree(self._worker_dir, ignore_errors=True)
+
+class ForkInterface:
+	"""Runs function tasks in processes forked from the master, which see the
+	objects of the master as they were at the fork with copy-on-write memory.
+	Only the task input and results are pickled, and without a zygote not even
+	the input.  This requires os.fork, so it is not available on Windows.
+
+	If zygote is True, a zygote process is forked from the master when the
+	interface is created, and tasks are forked from the zygote instead.  Workers
+	then see the state of the master at that point, which avoids forking a master
+	with many threads and a changing memory image for every task.  Task functions
+	and their input are pickled to the zygote, so functions must be defined before
+	the zygote is created.  refresh_zygote() replaces the zygote with a new
+	snapshot of the master.
+
+	Only the thread which forks is copied into a forked process, so locks held by
+	other master threads stay locked there.  Worker functions should only read
+	the data of the master, not use its locks or threads."""
+
+	def __init__(self, num_workers=1, zygote=False):
+		if not hasattr(os, "fork"):
+			raise Exception("ForkInterface requires os.fork, which is not available on this platform")
+		self._num_workers = num_workers
+		self._worker_list = [Worker(worker_num) for worker_num in range(num_workers)]
+		self._available_worker_list = list(self._worker_list)
+		self._input_objs = {}
+		self._output_objs = {}
+		# Only one thread forks at a time, so a task process never inherits the pipe of another task
+		self._fork_lock = threading.Lock()
+		self._zygote_pid = None
+		self._zygote_sock = None
+		if zygote: self.refresh_zygote()
+
+	def refresh_zygote(self):
+		"""Forks a new zygote from the current state of the master.  Tasks started
+		from the old zygote keep running, and later tasks are forked from the new one."""
+		master_sock, zygote_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+		worker_dirs = [worker._worker_dir for worker in self._worker_list]
+		self._fork_lock.acquire()
+		try:
+			pid = os.fork()
+			if pid == 0:
+				master_sock.close()
+				if self._zygote_sock: self._zygote_sock.close()
+				_zygote_loop(zygote_sock, worker_dirs)
+			zygote_sock.close()
+			self._stop_zygote()
+			self._zygote_pid, self._zygote_sock = pid, master_sock
+		finally:
+			self._fork_lock.release()
+
+	# Closing the control socket makes the zygote exit
+	def _stop_zygote(self):
+		if not self._zygote_sock: return
+		self._zygote_sock.close()
+		try:
+			os.waitpid(self._zygote_pid, 0)
+		except OSError:
+			pass
+		self._zygote_pid = self._zygote_sock = None
+
+	def get_available_workers(self):
+		return list(self._available_worker_list)
+
+	def reserve_worker(self, worker):
+		self._available_worker_list.remove(worker)
+
+	def worker_finished(self, worker):
+		self._available_worker_list.append(worker)
+
+	def _fork_task(self, task, worker, out_fd, err_fd):
+		input_data = self._input_objs[task._input_arg]
+		pid = os.fork()
+		if pid == 0:
+			_run_child(lambda: (task._raw_exec, input_data, task._data_file_zip),
+					   out_fd, err_fd, worker._worker_dir)
+		return pid
+
+	def _zygote_task(self, task, worker, out_fd, err_fd):
+		data_file_zip = task._data_file_zip and os.path.abspath(task._data_file_zip)
+		request_str = pickle.dumps((task._raw_exec, self._input_objs[task._input_arg], data_file_zip), 2)
+		in_fd, request_fd = os.pipe()
+		try:
+			socket.send_fds(self._zygote_sock, [str(worker._worker_num).encode("ascii")], [in_fd, out_fd, err_fd])
+			pid_str = b""
+			while len(pid_str) < 10:
+				data = self._zygote_sock.recv(10-len(pid_str))
+				if not data: raise Exception("The zygote process is not running")
+				pid_str += data
+		finally:
+			os.close(in_fd)
+		# The task process reads the request while it is written
+		request_file = os.fdopen(request_fd, "wb")
+		try:
+			request_file.write(request_str)
+		except (IOError, OSError):
+			pass
+		finally:
+			try:
+				request_file.close()
+			except (IOError, OSError):
+				pass
+		return int(pid_str)
+
+	def execute_task(self, task, worker):
+		if not hasattr(task._raw_exec, '__call__'):
+			raise Exception("ForkInterface can only execute function tasks")
+		worker._exec_task = task
+		worker._cancelled = False
+
+		err_file = tempfile.TemporaryFile()
+		self._fork_lock.acquire()
+		try:
+			out_r, out_w = os.pipe()
+			try:
+				if self._zygote_sock:
+					pid = self._zygote_task(task, worker, out_w, err_file.fileno())
+				else:
+					pid = self._fork_task(task, worker, out_w, err_file.fileno())
+			finally:
+				os.close(out_w)
+		except:
+			os.close(out_r)
+			err_file.close()
+			worker._exec_task = None
+			raise
+		finally:
+			self._fork_lock.release()
+
+		worker._exec_pid = pid
+		if worker._cancelled: worker._kill()
+		# Read the streamed results until the task process closes its output
+		out_file = os.fdopen(out_r, "rb")
+		output_str = task.read_stream(out_file)
+		out_file.close()
+		# Processes forked from the zygote are its children, so only it can wait for them
+		if not self._zygote_sock:
+			try:
+				os.waitpid(pid, 0)
+			except OSError:
+				pass
+		err_file.seek(0)
+		proc_stderr = err_file.read()
+		err_file.close()
+		worker._exec_pid = None
+		worker._exec_task = None
+		if worker._cancelled:
+			raise Exception("Task was cancelled")
+		elif output_str is None:
+			raise Exception("Task process failed\n"+proc_stderr.decode("utf-8", "replace"))
+		self._output_objs[task._output_arg] = pickle.loads(output_str)
+
+		task.task_finished()	# notify the task
+
+	def cancel_task(self, task, worker):
+		if worker._exec_task is task:
+			worker._cancelled = True
+			worker._kill()
+
+	def _cleanup(self):
+		self._stop_zygote()
+		for worker in self._worker_list:
+			worker._kill()
+			worker._cleanup()
+
+	def get_status(self):
+		return {"num_total_workers" : self._num_workers,
+			"num_active_workers": self._num_workers-len(self._available_worker_list)}
+
+	def pymw_master_read(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+
+	def pymw_master_write(self, output, loc):
+		self._input_objs[loc] = output
+
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
@@ -7,23 +7,41 @@ __date__ = "22 February 2009"
 
 import subprocess
 import sys
+import os
 import errno
 import tempfile
 import shutil
+import threading
 
 class GenericInterface:
 	"""Provides a simple generic interface for single machine systems.
 	This can take advantage of multicore machines by starting multiple processes."""
 
-	def __init__(self, num_workers=1, python_loc=sys.executable):
+	def __init__(self, num_workers=1, python_loc=sys.executable, prefetch_depth=0, use_async=False):
 		"""Interface initialization should start any necessary programs, 
-		and create an initial list of workers if appropriate."""
+		and create an initial list of workers if appropriate.
+		Up to prefetch_depth tasks are staged on each busy worker.
+		If use_async is True, the worker processes are run from one asyncio
+		event loop thread instead of a thread per running task, and tasks are
+		not prefetched, since starting a staged task waits for its staging."""
 		self._num_workers = num_workers
 		self._available_worker_list = [worker_num for worker_num in range(num_workers)]
 		self._worker_dirs = {}
+		self._worker_data = {}
+		self._staged_tasks = {}
 		for wnum in range(num_workers):
 			self._worker_dirs[wnum] = tempfile.mkdtemp()
+			self._worker_data[wnum] = set()
+			self._staged_tasks[wnum] = {}
 		self._python_loc = python_loc
+		self._prefetch_depth = prefetch_depth
+		self._copy_lock = threading.Lock()
+		# The task and process running on each busy worker
+		self._processes = {}
+		# The scheduler starts tasks with start_task if the interface has it, without a thread per task
+		if use_async:
+			self.start_task = self._start_task_async
+			self._prefetch_depth = 0
 	
 	def get_available_workers(self):
 		"""Return a list of available workers, or [] if there are no available workers."""
@@ -37,22 +55,110 @@ class GenericInterface:
 		"""Return a given worker to the pool of available workers."""
 		self._available_worker_list.append(worker)
 	
+	def get_worker_data(self, worker):
+		"""Return the names of the data archives already copied to a worker."""
+		return set(self._worker_data[worker])
+	
+	def get_prefetch_workers(self):
+		"""Return a dictionary of the busy workers that can stage tasks,
+		and how many tasks each of them can stage."""
+		if self._prefetch_depth <= 0: return {}
+		return dict([(wnum, self._prefetch_depth) for wnum in range(self._num_workers)
+					 if wnum not in self._available_worker_list])
+	
+	def stage_task(self, task, worker):
+		"""Start copying the files of a task to a busy worker, so the task
+		can start as soon as the worker finishes its current task."""
+		stage_thread = threading.Thread(target=self._copy_task_files, args=(task, worker))
+		self._staged_tasks[worker][task] = stage_thread
+		stage_thread.start()
+	
+	def unstage_task(self, task, worker):
+		"""Cancel the staging of a task so it can run on another worker.
+		The copied archive is kept, since later tasks may need it."""
+		stage_thread = self._staged_tasks[worker].pop(task, None)
+		if stage_thread: stage_thread.join()
+	
+	# Copy any necessary files to the worker directory, unless a previous task already did
+	def _copy_task_files(self, task, worker):
+		if not task._data_file_zip: return
+		zip_name = os.path.basename(task._data_file_zip)
+		self._copy_lock.acquire()
+		try:
+			if zip_name not in self._worker_data[worker]:
+				shutil.copy(task._data_file_zip, self._worker_dirs[worker])
+				self._worker_data[worker].add(zip_name)
+		finally:
+			self._copy_lock.release()
+	
+	# Sets up a task to run on a worker, and returns its [task, process, cancelled] entry
+	def _prepare_task(self, task, worker):
+		# The task can be cancelled from now on, even before its process starts
+		running = [task, None, False]
+		self._processes[worker] = running
+		
+		# Wait for the files of a prefetched task to finish copying
+		# Copying again is skipped unless the task was not staged or staging failed
+		stage_thread = self._staged_tasks[worker].pop(task, None)
+		if stage_thread: stage_thread.join()
+		self._copy_task_files(task, worker)
+		return running
+	
 	def execute_task(self, task, worker):
 		"""Execute the task and deal with error codes"""
 		if sys.platform.startswith("win"): cf=0x08000000
 		else: cf=0
+		running = self._prepare_task(task, worker)
 		
-		# Copy any necessary files to the worker directory
-		if task._data_file_zip: shutil.copy(task._data_file_zip, self._worker_dirs[worker])
-		
-		# Execute the task
+		# Execute the task, reading the results it streams over stdout until it finishes
+		err_file = tempfile.TemporaryFile()
 		exec_process = subprocess.Popen(args=[self._python_loc, task._executable_name, task._input_arg, task._output_arg],
-												cwd=self._worker_dirs[worker], creationflags=cf, stderr=subprocess.PIPE)
-		proc_stdout, proc_stderr = exec_process.communicate()   # wait for the process to finish
-		if exec_process.returncode is not 0:
+												cwd=self._worker_dirs[worker], creationflags=cf, stdout=subprocess.PIPE,
+												stderr=err_file, env=dict(os.environ, PYMW_STREAM="1"))
+		running[1] = exec_process
+		if running[2]: exec_process.kill()
+		task.read_stream(exec_process.stdout)
+		exec_process.stdout.close()
+		exec_process.wait()
+		err_file.seek(0)
+		proc_stderr = err_file.read()
+		err_file.close()
+		self._processes.pop(worker, None)
+		if running[2]:
+			raise Exception("Task was cancelled")
+		if exec_process.returncode != 0:
 			raise Exception("Executable failed with error "+str(exec_process.returncode)+"\n"+proc_stderr.decode())
 		
 		task.task_finished()
+	
+	def _start_task_async(self, task, worker):
+		"""Start the task from the asyncio driver and return without waiting for it"""
+		from pymw.interfaces import async_driver
+		running = self._prepare_task(task, worker)
+		kwargs = {}
+		if sys.platform.startswith("win"): kwargs["creationflags"] = 0x08000000
+		async_driver.start_process(task, [self._python_loc, task._executable_name, task._input_arg, task._output_arg],
+								   running, lambda *result: self._task_process_done(task, worker, running, *result),
+								   cwd=self._worker_dirs[worker], env=dict(os.environ, PYMW_STREAM="1"), **kwargs)
+	
+	def _task_process_done(self, task, worker, running, returncode, output, proc_stderr):
+		self._processes.pop(worker, None)
+		if running[2]:
+			task.task_finished(Exception("Task was cancelled"))
+		elif returncode != 0:
+			task.task_finished(Exception("Executable failed with error "+str(returncode)+"\n"+proc_stderr.decode()))
+		else:
+			task.task_finished()
+	
+	def cancel_task(self, task, worker):
+		"""Stop a running task, which then finishes with an error."""
+		running = self._processes.get(worker)
+		if running and running[0] is task:
+			running[2] = True
+			try:
+				if running[1]: running[1].kill()
+			except OSError:
+				pass
 
 	def get_status(self):
 		return {"num_total_workers" : self._num_workers,
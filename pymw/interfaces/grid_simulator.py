@@ -96,6 +96,9 @@ class SimWorker:
 	
 	def __cmp__(self, other):
 		return self._cur_time - other._cur_time
+	
+	def __lt__(self, other):
+		return self._cur_time < other._cur_time
 
 class GridSimulatorInterface:
 	def __init__(self, trace_files=[]):
@@ -103,6 +106,7 @@ class GridSimulatorInterface:
 		self._num_executed_tasks = 0
 		self._worker_list = []
 		self._waiting_list = []
+		self._num_running_tasks = 0
 	
 	def add_worker(self, worker):
 		# Advance the new worker to its first available time
@@ -145,7 +149,8 @@ class GridSimulatorInterface:
 	# If none of the workers matched the available tasks and there are still workers in the wait queue,
 	# advance simulation time and tell PyMW to try again
 	def try_avail_check_again(self):
-		if len(self._waiting_list) == 0:
+		# Don't advance the simulation past tasks whose execution hasn't been simulated yet
+		if len(self._waiting_list) == 0 or self._num_running_tasks > 0:
 			return False
 		
 		self._cur_sim_time = self._waiting_list[0]._cur_time
@@ -160,16 +165,23 @@ class GridSimulatorInterface:
 	
 	def reserve_worker(self, worker):
 		self._worker_list.remove(worker)
+		self._num_running_tasks += 1
 	
 	def worker_finished(self, worker):
 		heapq.heappush(self._waiting_list, worker)
+		self._num_running_tasks -= 1
 	
 	def execute_task(self, task, worker):
 		if not worker:
 			raise Exception("Cannot use NULL worker")
 		
+		# A worker that sat idle starts the task at the current simulation time
+		if worker._cur_time < self._cur_sim_time:
+			worker.advance_wall_time(self._cur_sim_time - worker._cur_time)
+		
 		# Get the CPU seconds for the specified task and worker
-		task_exec_time = task._raw_exec(worker)
+		if task.input_data: task_exec_time = task._raw_exec(worker, *task.input_data)
+		else: task_exec_time = task._raw_exec(worker)
 		
 		# Run the worker for task_exec_time CPU seconds
 		worker.run_cpu(task_exec_time)
@@ -183,7 +195,7 @@ class GridSimulatorInterface:
 		total_time = 0
 		for x in times: total_time += x
 		mean_time = total_time / len(times)
-		median_time = times[len(times)/2]
+		median_time = times[len(times)//2]
 		stddev_time = 0
 		for time_n in times:
 			stddev_time += pow(mean_time - time_n, 2)
@@ -6,46 +6,227 @@ __author__ = "Eric Heien <pymw@heien.org>"
 __date__ = "10 April 2008"
 
 import sys
+import collections
+import hashlib
+import logging
+import threading
+import queue
+import subprocess
 import tempfile
 import textwrap
 import shutil
 import os
 import inspect
+import pickle
+
+from pymw.pymw import PyMW_CallbackInterface, pymw_decode_record_header, pymw_read_record, pymw_read_script, pymw_run_script
 
 try:
 	from mpi4py import MPI
 except ImportError:
 	MPI = None
 
-# NOTE: this interface currently has a limit of 100 processes b/c of the PyMW thread limiter.
-# This can be fixed if mpi4py IProbe gets fixed
+# Pass the records the script streams over stdout to forward, until the script closes stdout
+def forward_records(stream_file, forward):
+	while True:
+		try:
+			record = pymw_read_record(stream_file)
+		except ValueError:
+			stream_file.read()
+			break
+		if record is None: break
+		forward(record)
+
+# Objects are pickled with out-of-band buffers where possible (such as NumPy arrays),
+# and the buffers are sent with buffer-based Send rather than copied into the pickle
+def send_pickled(comm, obj, dest, tag):
+	buffers = []
+	if sys.version_info >= (3, 8):
+		data = pickle.dumps(obj, 5, buffer_callback=buffers.append)
+	else:
+		data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+	raw_buffers = [buf.raw() for buf in buffers]
+	comm.send([data, [len(buf) for buf in raw_buffers]], dest=dest, tag=tag)
+	for buf in raw_buffers:
+		comm.Send([buf, MPI.BYTE], dest=dest, tag=tag)
+
+def recv_pickled(comm, source, tag):
+	data, sizes = comm.recv(source=source, tag=tag)
+	buffers = []
+	for size in sizes:
+		buf = bytearray(size)
+		comm.Recv([buf, MPI.BYTE], source=source, tag=tag)
+		buffers.append(buf)
+	if buffers: return pickle.loads(data, buffers=buffers)
+	return pickle.loads(data)
+
+# Worker calls of in-process tasks, which get their input and give their output through their script namespace
+def pymw_worker_read(options):
+	return _pymw_input
+
+def pymw_worker_write(output, options):
+	global _pymw_output
+	_pymw_output = output
+
+# Writes a file the master sent to the worker temp directory, and records its path by content hash
+def save_file(worker_temp_dir, files, msg):
+	file_path = os.path.join(worker_temp_dir, msg[2])
+	data_file = open(file_path, "wb")
+	data_file.write(msg[3])
+	data_file.close()
+	files[msg[1]] = file_path
+
+# Kills the script of a task when the master cancels it, until a None message ends the worker.
+# running holds the output file and process of the running task, and the output file of the last
+# cancelled task, so a cancel which arrives before the script starts still stops it
+def cancel_listener(parent_comm, running, running_lock):
+	while True:
+		output_arg = parent_comm.recv(source=0, tag=2)
+		if output_arg is None: break
+		running_lock.acquire()
+		try:
+			running[2] = output_arg
+			if running[0] == output_arg and running[1]: running[1].kill()
+		finally:
+			running_lock.release()
+
+# Handles the cancel messages which have arrived, without waiting for more
+# Returns False once the None message ending the worker was received
+def poll_cancels(parent_comm, running):
+	while parent_comm.Iprobe(source=0, tag=2):
+		output_arg = parent_comm.recv(source=0, tag=2)
+		if output_arg is None: return False
+		running[2] = output_arg
+		if running[0] == output_arg and running[1]: running[1].kill()
+	return True
+
+# Waits for the script of a task while only this thread makes MPI calls: a thread
+# reads the streamed records into a queue, and they are sent from here between
+# checks for cancel messages.  Returns False once the worker was ended
+def poll_task(parent_comm, exec_process, output_arg, running, listening):
+	records = queue.Queue()
+	read_thread = threading.Thread(target=forward_records, args=(exec_process.stdout, records.put))
+	read_thread.start()
+	while read_thread.is_alive() or not records.empty():
+		if listening: listening = poll_cancels(parent_comm, running)
+		try:
+			record = records.get(timeout=0.01)
+		except queue.Empty:
+			continue
+		parent_comm.send([output_arg, record[0], record[1]], dest=0, tag=3)
+	read_thread.join()
+	exec_process.wait()
+	return listening
 
 def worker_func():
 	# Figure out who the parent is and who the worker is
 	parent_comm = MPI.Comm.Get_parent()
 	rank = parent_comm.Get_rank()
-	# Create a directory for temp files
+	# Create a directory for temp files, which also holds the scripts and archives sent by the master
 	worker_temp_dir = tempfile.mkdtemp()
+	files = {}
+	# Cancel messages are received by their own thread, so the worker just waits for each script to exit.
+	# This needs MPI_THREAD_MULTIPLE, otherwise this thread polls for them while the script runs
+	threaded = MPI.Query_thread() == MPI.THREAD_MULTIPLE
+	running, running_lock = [None, None, None], threading.Lock()
+	listening = True
+	if threaded:
+		cancel_thread = threading.Thread(target=cancel_listener, args=(parent_comm, running, running_lock))
+		cancel_thread.start()
 	# Go around in an infinite loop
 	while True:
 		# Get the next command from the master
 		msg = parent_comm.recv(source=0, tag=0)
 		# If it's a null command, then it's time to quit
 		if msg is None:
+			if threaded: cancel_thread.join()
+			else:
+				while listening and parent_comm.recv(source=0, tag=2) is not None: pass
 			parent_comm.Disconnect()
 			break
-		# Execute the script and get the output
-		exec_process = subprocess.Popen(args=[sys.executable, msg[0], msg[1], msg[2]],
-										cwd=worker_temp_dir,
-										stderr=subprocess.PIPE)
-		proc_stdout, proc_stderr = exec_process.communicate()
+		if msg[0] == "file":
+			save_file(worker_temp_dir, files, msg)
+			continue
+		# Execute the script, which the cancel thread kills if the task is cancelled
+		# Cancel messages name the output file of the task, so late ones for earlier tasks are ignored
+		err_file = tempfile.TemporaryFile()
+		if not threaded and listening: listening = poll_cancels(parent_comm, running)
+		running_lock.acquire()
+		try:
+			running[0] = msg[3]
+			exec_process = running[1] = subprocess.Popen(args=[sys.executable, files[msg[1]], msg[2], msg[3]],
+										cwd=worker_temp_dir, stdout=subprocess.PIPE,
+										stderr=err_file, env=dict(os.environ, PYMW_STREAM="1"))
+			if running[2] == msg[3]: exec_process.kill()
+		finally:
+			running_lock.release()
+		# All streamed records are sent before the result
+		if threaded:
+			output_arg = msg[3]
+			forward_thread = threading.Thread(target=forward_records, args=(exec_process.stdout,
+				lambda record: parent_comm.send([output_arg, record[0], record[1]], dest=0, tag=3)))
+			forward_thread.start()
+			exec_process.wait()
+		else:
+			listening = poll_task(parent_comm, exec_process, msg[3], running, listening)
+		running_lock.acquire()
+		running[0] = running[1] = None
+		running_lock.release()
+		if threaded: forward_thread.join()
+		exec_process.stdout.close()
+		err_file.seek(0)
+		proc_stderr = err_file.read().decode()
+		err_file.close()
 		# Send the return code and stderr (exception data) back to the master
 		send_result = parent_comm.send([rank, exec_process.returncode, proc_stderr], dest=0, tag=1)
 	# Delete the worker temp directory
 	shutil.rmtree(path=worker_temp_dir, ignore_errors=True)
 
-class MPIInterface:
-	def __init__(self, num_workers=1):
+# Runs tasks in the worker process.  The master sends the task input over MPI,
+# and gets the output over MPI
+def inprocess_worker_func():
+	parent_comm = MPI.Comm.Get_parent()
+	rank = parent_comm.Get_rank()
+	# Scripts and data file archives are written to a temp directory, where the worker scripts find the archives
+	worker_temp_dir = tempfile.mkdtemp()
+	os.chdir(worker_temp_dir)
+	files = {}
+	# Namespace and last line of each loaded worker script by its path, or the error loading it
+	scripts = {}
+	while True:
+		msg = parent_comm.recv(source=0, tag=0)
+		if msg is None:
+			parent_comm.Disconnect()
+			break
+		if msg[0] == "file":
+			save_file(worker_temp_dir, files, msg)
+		elif msg[0] == "run":
+			input_data = recv_pickled(parent_comm, 0, 0)
+			status, output = pymw_run_script(scripts, files[msg[1]], input_data)
+			# Running tasks can't be stopped, so cancel messages are only dropped
+			while parent_comm.Iprobe(source=0, tag=2):
+				parent_comm.recv(source=0, tag=2)
+			if status == 0:
+				parent_comm.send([rank, 0, ""], dest=0, tag=1)
+				send_pickled(parent_comm, output, 0, 1)
+			else:
+				parent_comm.send([rank, 1, output], dest=0, tag=1)
+	shutil.rmtree(path=worker_temp_dir, ignore_errors=True)
+
+class MPIInterface(PyMW_CallbackInterface):
+	"""Runs tasks on MPI worker processes spawned by the master.  Worker scripts and
+	data file archives are sent to each worker once per content hash and kept in its
+	temp directory, and tasks refer to them by hash.  By default each worker runs a
+	task by starting its worker script, with the input and output files in the tasks
+	directory, which must be on a filesystem shared with the workers.  If in_process
+	is True, the workers load the worker script of each function once and run tasks
+	in their own process, with the input and output sent over MPI, so no shared
+	filesystem is needed.
+	In-process tasks can't be stopped once they run and don't stream their results.
+	Tasks are started without blocking, and one progress thread polls for the
+	messages of all workers while tasks run, so the master needs no thread per
+	running task.  While no tasks run, the progress thread waits for a command."""
+	def __init__(self, num_workers=1, in_process=False):
 		if MPI is None:
 			raise Exception("PyMW MPI interface requires mpi4py to be installed. Please install mpi4py and try again.")
 		# TODO: Write the worker function to a temp file and run MPI with this file
@@ -56,9 +237,18 @@ class MPIInterface:
 		self._worker_func_file.write("import shutil\n")
 		self._worker_func_file.write("import sys\n")
 		self._worker_func_file.write("import subprocess\n")
-		worker_func_source = textwrap.dedent(inspect.getsource(worker_func))
-		self._worker_func_file.write(worker_func_source)
-		self._worker_func_file.write("worker_func()\n")
+		self._worker_func_file.write("import os\n")
+		self._worker_func_file.write("import threading\n")
+		self._worker_func_file.write("import queue\n")
+		self._worker_func_file.write("import io\n")
+		self._worker_func_file.write("import pickle\n")
+		self._worker_func_file.write("import traceback\n")
+		for func in (pymw_decode_record_header, pymw_read_record, pymw_read_script, pymw_run_script,
+					 forward_records, send_pickled, recv_pickled, save_file, cancel_listener,
+					 poll_cancels, poll_task, worker_func, inprocess_worker_func):
+			self._worker_func_file.write(textwrap.dedent(inspect.getsource(func)))
+		if in_process: self._worker_func_file.write("inprocess_worker_func()\n")
+		else: self._worker_func_file.write("worker_func()\n")
 		self._worker_func_file.close()
 		
 		self._child_comm = MPI.COMM_SELF.Spawn(sys.executable,
@@ -67,6 +257,32 @@ class MPIInterface:
 
 		self._num_workers = self._child_comm.Get_remote_size()
 		self._available_worker_list = [i for i in range(self._num_workers)]
+		# The task running on each busy worker, whether it was cancelled, and the function to call when it finishes
+		self._running_tasks = {}
+		# Commands for the progress thread, which makes the MPI calls, and the condition it waits on for them
+		self._commands = collections.deque()
+		self._commands_cond = threading.Condition()
+		# Content hash of each sent file by its name and modification time, the hashes sent to each
+		# worker, the file contents until all workers have them, and the hashes all workers have
+		self._file_hashes = {}
+		self._sent_files = dict([(worker, set()) for worker in range(self._num_workers)])
+		self._file_data = {}
+		self._complete_files = set()
+		
+		self._in_process = in_process
+		if in_process:
+			# Inputs and outputs are kept in memory, and the worker scripts use the in-process worker calls
+			self._input_objs = {}
+			self._output_objs = {}
+			self.pymw_master_read = self._read_output
+			self.pymw_master_write = self._store_input
+			self.pymw_master_release = self._release_input
+			self.pymw_worker_read = pymw_worker_read
+			self.pymw_worker_write = pymw_worker_write
+		
+		self._progress_thread = threading.Thread(target=self._progress_engine)
+		self._progress_thread.daemon = True
+		self._progress_thread.start()
 	
 	def get_available_workers(self):
 		return list(self._available_worker_list)
@@ -77,16 +293,125 @@ class MPIInterface:
 	def worker_finished(self, worker):
 		self._available_worker_list.append(worker)
 
-	def execute_task(self, task, worker):
-		cmd = [task._executable_name, task._input_arg, task._output_arg]
-		self._child_comm.send(cmd, dest=worker, tag=0)
-		res = self._child_comm.recv(source=worker, tag=1)
-		if res[1] is not 0:
-			raise Exception(res[2])
-		task.task_finished()
+	# The progress thread sends the task, and calls finish_func with the error, if any, once it is done
+	def _start_task(self, task, worker, finish_func):
+		self._running_tasks[worker] = [task, False, finish_func]
+		self._add_command(lambda: self._send_task(task, worker))
+	
+	# Queues a command for the progress thread, and wakes it up if it is waiting
+	def _add_command(self, command):
+		self._commands_cond.acquire()
+		self._commands.append(command)
+		self._commands_cond.notify()
+		self._commands_cond.release()
+	
+	def _progress_engine(self):
+		"""Sends the queued commands and receives the messages of all workers.
+		This is the only thread which makes MPI calls while the interface runs, so
+		the number of master threads doesn't grow with the number of workers."""
+		status = MPI.Status()
+		while True:
+			while self._commands:
+				command = self._commands.popleft()
+				if command is None: return
+				command()
+			# Messages from each worker are received in the order it sent them, so records come before results
+			if self._child_comm.Iprobe(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG, status=status):
+				worker, tag = status.Get_source(), status.Get_tag()
+				msg = self._child_comm.recv(source=worker, tag=tag)
+				try:
+					if tag == 3: self._recv_record(worker, msg)
+					else: self._recv_result(worker, msg)
+				except Exception as e:
+					logging.error("MPI worker "+str(worker)+" message could not be handled: "+str(e))
+				continue
+			# Poll again shortly while tasks run, otherwise no messages are expected until a command is queued
+			self._commands_cond.acquire()
+			if not self._commands:
+				if self._running_tasks: self._commands_cond.wait(0.001)
+				else: self._commands_cond.wait()
+			self._commands_cond.release()
+	
+	def _send_task(self, task, worker):
+		try:
+			# Scripts are run from the worker temp directory, and archives are unpacked from there
+			script_hash = self._send_file(worker, task._executable_name, is_script=True)
+			for zip_file in (task._data_file_zip, task._modules_file_zip):
+				if zip_file: self._send_file(worker, zip_file)
+			if self._in_process:
+				self._child_comm.send(["run", script_hash], dest=worker, tag=0)
+				send_pickled(self._child_comm, self._input_objs[task._input_arg], worker, 0)
+			else:
+				self._child_comm.send(["run", script_hash, task._input_arg, task._output_arg], dest=worker, tag=0)
+		except Exception as e:
+			running = self._running_tasks.pop(worker, None)
+			if running: running[2](e)
+	
+	def _send_file(self, worker, file_name, is_script=False):
+		"""Sends a file to a worker unless it already has the same contents, and returns
+		the content hash, which later messages use to refer to the file."""
+		file_stat = os.stat(file_name)
+		file_key = (file_name, file_stat.st_mtime, file_stat.st_size)
+		file_hash = self._file_hashes.get(file_key)
+		if file_hash is None:
+			data_file = open(file_name, "rb")
+			data = data_file.read()
+			data_file.close()
+			file_hash = self._file_hashes[file_key] = hashlib.sha1(data).hexdigest()
+			if file_hash not in self._complete_files: self._file_data[file_hash] = data
+		if file_hash not in self._sent_files[worker]:
+			# Worker scripts are stored by hash, archives under the name the worker scripts open
+			if is_script: local_name = file_hash+".py"
+			else: local_name = os.path.basename(file_name)
+			self._child_comm.send(["file", file_hash, local_name, self._file_data[file_hash]], dest=worker, tag=0)
+			self._sent_files[worker].add(file_hash)
+			if all(file_hash in sent for sent in self._sent_files.values()):
+				self._complete_files.add(file_hash)
+				self._file_data.pop(file_hash, None)
+		return file_hash
+	
+	def _recv_result(self, worker, res):
+		output = None
+		if self._in_process and res[1] == 0: output = recv_pickled(self._child_comm, worker, 1)
+		running = self._running_tasks.pop(worker, None)
+		if not running: return
+		task, cancelled, finish_func = running
+		if cancelled:
+			finish_func(Exception("Task was cancelled"))
+		elif res[1] != 0:
+			finish_func(Exception(res[2]))
+		else:
+			if self._in_process: self._output_objs[task._output_arg] = output
+			finish_func()
+	
+	def _read_output(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+	
+	def _store_input(self, output, loc):
+		self._input_objs[loc] = output
+	
+	def _release_input(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
+	
+	# Records of earlier tasks that were cancelled are ignored
+	def _recv_record(self, worker, record):
+		running = self._running_tasks.get(worker)
+		if running and record[0] == running[0]._output_arg: running[0].stream_record(record[1], record[2])
+	
+	def cancel_task(self, task, worker):
+		running = self._running_tasks.get(worker)
+		if running and running[0] is task:
+			running[1] = True
+			self._add_command(lambda: self._child_comm.send(task._output_arg, dest=worker, tag=2))
 	
 	def _cleanup(self):
+		self._add_command(None)
+		self._progress_thread.join()
 		for worker in range(self._num_workers):
+			# The cancel thread of each worker ends before the worker does
+			if not self._in_process: self._child_comm.send(None, dest=worker, tag=2)
 			self._child_comm.send(None, dest=worker, tag=0)
 		self._child_comm.Disconnect()
 		shutil.rmtree(path=self._worker_func_filename, ignore_errors=True)
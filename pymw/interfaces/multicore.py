@@ -14,21 +14,40 @@ import errno
 import pickle
 import tempfile
 import shutil
+import threading
 
 class Worker:
 	"""Represents a worker in the multicore interface.
 	Provides functions to kill the worker and clean up any temporary files."""
-	def __init__(self):
+	def __init__(self, worker_num=0):
+		self._worker_num = worker_num
 		self._exec_process = None
+		self._exec_task = None
+		self._cancelled = False
 		self._worker_dir = tempfile.mkdtemp()
+		self._data_files = set()
+		# The [task, process, cancelled] entry of a task run by the asyncio driver
+		self._running = None
+		# Prefetched tasks mapped to [staging thread, started process, pickled input]
+		self._staged = {}
+	
+	# Workers are named by their number, so the runtime model recognizes them in later runs
+	def __str__(self):
+		return "multicore"+str(self._worker_num)
 	
 	def _kill(self):
+		self._kill_process(self._exec_process)
+		if self._running: self._kill_process(self._running[1])
+		for stage_thread, process, input_obj_str in list(self._staged.values()):
+			self._kill_process(process)
+	
+	def _kill_process(self, process):
 		try:
-			if self._exec_process:
+			if process:
 				if sys.platform.startswith("win"):
-					ctypes.windll.kernel32.TerminateProcess(int(self._exec_process._handle), -1)
+					ctypes.windll.kernel32.TerminateProcess(int(process._handle), -1)
 				else:
-					os.kill(self._exec_process.pid, signal.SIGKILL)
+					os.kill(process.pid, signal.SIGKILL)
 		except:
 			pass
 	
@@ -39,14 +58,22 @@ class MulticoreInterface:
 	"""Provides a simple interface for single machine systems.
 	This can take advantage of multicore by starting multiple processes."""
 
-	def __init__(self, num_workers=1, python_loc=sys.executable):
+	def __init__(self, num_workers=1, python_loc=sys.executable, prefetch_depth=0, use_async=False):
+		"""If use_async is True, the worker processes are run from one asyncio event
+		loop thread instead of a thread per running task, and tasks are not prefetched."""
 		self._num_workers = num_workers
-		self._available_worker_list = [Worker() for worker_num in range(num_workers)]
+		self._available_worker_list = [Worker(worker_num) for worker_num in range(num_workers)]
 		self._worker_list = [worker for worker in self._available_worker_list]
 		self._python_loc = python_loc
+		self._prefetch_depth = prefetch_depth
 		self._input_objs = {}
 		self._output_objs = {}
+		self._copy_lock = threading.Lock()
 		self.pymw_interface_modules = "pickle", "sys"
+		# The scheduler starts tasks with start_task if the interface has it, without a thread per task
+		if use_async:
+			self.start_task = self._start_task_async
+			self._prefetch_depth = 0
 	
 	def get_available_workers(self):
 		return list(self._available_worker_list)
@@ -57,30 +84,133 @@ class MulticoreInterface:
 	def worker_finished(self, worker):
 		self._available_worker_list.append(worker)
 	
-	def execute_task(self, task, worker):
+	def get_worker_data(self, worker):
+		return set(worker._data_files)
+	
+	def get_prefetch_workers(self):
+		if self._prefetch_depth <= 0: return {}
+		return dict([(worker, self._prefetch_depth) for worker in self._worker_list
+					 if worker not in self._available_worker_list])
+	
+	def stage_task(self, task, worker):
+		staged = [None, None, None]
+		staged[0] = threading.Thread(target=self._stage, args=(task, worker, staged))
+		worker._staged[task] = staged
+		staged[0].start()
+	
+	def unstage_task(self, task, worker):
+		staged = worker._staged.pop(task, None)
+		if not staged: return
+		staged[0].join()
+		if staged[1]:
+			worker._kill_process(staged[1])
+			staged[1].wait()
+			staged[1].pymw_err_file.close()
+	
+	# Copy the files, pickle the input and start the process of a task
+	# The process blocks until its input is written, so it can be started while the worker is busy
+	def _stage(self, task, worker, staged):
+		self._copy_task_files(task, worker)
+		staged[2] = pickle.dumps(self._input_objs[task._input_arg])
+		# Archives are unpacked in the worker directory before the input is read,
+		# so only start the process early if that can't disturb the running task
+		if not task._data_file_zip:
+			staged[1] = self._start_process(task, worker)
+	
+	# Copy any necessary files to the worker directory, unless a previous task already did
+	def _copy_task_files(self, task, worker):
+		if not task._data_file_zip: return
+		zip_name = os.path.basename(task._data_file_zip)
+		self._copy_lock.acquire()
+		try:
+			if zip_name not in worker._data_files:
+				shutil.copy(task._data_file_zip, worker._worker_dir)
+				worker._data_files.add(zip_name)
+		finally:
+			self._copy_lock.release()
+	
+	# The process streams results and its output over stdout, and stderr goes to a temporary file
+	def _start_process(self, task, worker):
 		if sys.platform.startswith("win"): cf=0x08000000
 		else: cf=0
+		err_file = tempfile.TemporaryFile()
+		process = subprocess.Popen(args=[self._python_loc, task._executable_name, task._input_arg, task._output_arg],
+								cwd=worker._worker_dir, creationflags=cf, stdin=subprocess.PIPE,
+								stdout=subprocess.PIPE, stderr=err_file, env=dict(os.environ, PYMW_STREAM="1"))
+		process.pymw_err_file = err_file
+		return process
+	
+	def execute_task(self, task, worker):
+		# The task can be cancelled from now on, even before its process starts
+		worker._exec_task = task
+		worker._cancelled = False
 		
-		# Copy any necessary files to the worker directory
-		if task._data_file_zip: shutil.copy(task._data_file_zip, worker._worker_dir)
+		# Use whatever was staged for a prefetched task, and do the rest now
+		staged = worker._staged.pop(task, None)
+		if staged: staged[0].join()
+		else: staged = [None, None, None]
+		self._copy_task_files(task, worker)
+		input_obj_str = staged[2]
+		if input_obj_str is None: input_obj_str = pickle.dumps(self._input_objs[task._input_arg])
+		exec_process = staged[1]
+		if exec_process is None: exec_process = self._start_process(task, worker)
 		
-		# Pickle the input argument and remove it from the list
-		input_obj_str = pickle.dumps(self._input_objs[task._input_arg])
-
-		worker._exec_process = subprocess.Popen(args=[self._python_loc, task._executable_name, task._input_arg, task._output_arg],
-												cwd=worker._worker_dir, creationflags=cf, stdin=subprocess.PIPE,
-												stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		# Wait for the process to finish
-		proc_stdout, proc_stderr = worker._exec_process.communicate(input_obj_str)
-		retcode = worker._exec_process.returncode
-		if retcode is 0:
-			self._output_objs[task._output_arg] = pickle.loads(proc_stdout)
+		worker._exec_process = exec_process
+		if worker._cancelled: worker._kill_process(exec_process)
+		# Send the input, then read the streamed results until the process finishes
+		try:
+			exec_process.stdin.write(input_obj_str)
+			exec_process.stdin.close()
+		except (IOError, OSError):
+			pass
+		output_str = task.read_stream(exec_process.stdout)
+		exec_process.stdout.close()
+		retcode = exec_process.wait()
+		exec_process.pymw_err_file.seek(0)
+		proc_stderr = exec_process.pymw_err_file.read()
+		exec_process.pymw_err_file.close()
+		worker._exec_process = None
+		worker._exec_task = None
+		if worker._cancelled:
+			raise Exception("Task was cancelled")
+		elif retcode == 0 and output_str is not None:
+			self._output_objs[task._output_arg] = pickle.loads(output_str)
 		else:
-			raise Exception("Executable failed with error "+str(retcode)+"\n"+proc_stderr)
+			raise Exception("Executable failed with error "+str(retcode)+"\n"+proc_stderr.decode())
 		
-		worker._exec_process = None
 		task.task_finished()	# notify the task
 
+	def _start_task_async(self, task, worker):
+		worker._exec_task = task
+		worker._cancelled = False
+		self._copy_task_files(task, worker)
+		input_obj_str = pickle.dumps(self._input_objs[task._input_arg])
+		running = worker._running = [task, None, False]
+		from pymw.interfaces import async_driver
+		async_driver.start_process(task, [self._python_loc, task._executable_name, task._input_arg, task._output_arg],
+								   running, lambda *result: self._task_process_done(task, worker, *result),
+								   input_data=input_obj_str, cwd=worker._worker_dir, env=dict(os.environ, PYMW_STREAM="1"))
+	
+	def _task_process_done(self, task, worker, returncode, output_str, proc_stderr):
+		worker._running = None
+		worker._exec_task = None
+		if worker._cancelled:
+			task.task_finished(Exception("Task was cancelled"))
+		elif returncode == 0 and output_str is not None:
+			self._output_objs[task._output_arg] = pickle.loads(output_str)
+			task.task_finished()
+		else:
+			task.task_finished(Exception("Executable failed with error "+str(returncode)+"\n"+proc_stderr.decode()))
+	
+	def cancel_task(self, task, worker):
+		if worker._exec_task is task:
+			worker._cancelled = True
+			if worker._exec_process: worker._kill_process(worker._exec_process)
+			if worker._running:
+				# The process may not have started yet, in which case the driver kills it once it does
+				worker._running[2] = True
+				worker._kill_process(worker._running[1])
+	
 	def _cleanup(self):
 		for worker in self._worker_list:
 			worker._kill()
@@ -91,18 +221,24 @@ class MulticoreInterface:
 			"num_active_workers": self._num_workers-len(self._available_worker_list)}
 	
 	def pymw_master_read(self, loc):
-		return self._output_objs[loc]
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
 	
 	def pymw_master_write(self, output, loc):
 		self._input_objs[loc] = output
 	
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
+	
 	def pymw_worker_read(options):
-		return pickle.Unpickler(sys.stdin).load()
+		# Pickles are binary, so use the underlying byte stream in Python 3
+		return pickle.Unpickler(getattr(sys.stdin, "buffer", sys.stdin)).load()
 	
 	def pymw_worker_write(output, options):
 		if "file_input" in options:
-			outfile = open(sys.argv[2], 'w')
+			outfile = open(sys.argv[2], 'wb')
 			pickle.Pickler(outfile).dump(output[0])
 			outfile.close()
 			output[0]=None
-		print((pickle.dumps(output)))
+		_pymw_send_record("O", pickle.dumps(output))
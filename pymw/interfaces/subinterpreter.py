@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+"""Provide an interface which runs PyMW tasks in subinterpreters of the master,
+for parallelism without starting processes on CPython 3.12 and later.
+"""
+
+import logging
+import os
+import pickle
+import sys
+import threading
+
+from pymw.pymw import pymw_read_script
+from .multicore import MulticoreInterface
+
+# The low level subinterpreter module is _interpreters from Python 3.13, and _xxsubinterpreters in 3.12
+# Subinterpreters of earlier versions share the GIL, so they are not used
+_interpreters = None
+if sys.version_info >= (3, 12):
+	try:
+		import _interpreters
+	except ImportError:
+		try:
+			import _xxsubinterpreters as _interpreters
+		except ImportError:
+			pass
+
+# Loads a worker script in its own namespace, without running its last line, which calls the worker function
+_LOAD_CODE = """
+import sys
+if "_pymw_scripts" not in globals(): _pymw_scripts = {}
+_pymw_ns = {"__name__": "__pymw_worker__", "__builtins__": __builtins__}
+exec(compile(_pymw_source, _pymw_script, "exec"), _pymw_ns)
+_pymw_scripts[_pymw_script] = _pymw_ns
+"""
+
+# The worker manager prints the traceback of a failed task to stderr, so it is captured for the error
+_RUN_CODE = """
+import io
+_pymw_ns = _pymw_scripts[_pymw_script]
+_pymw_ns["_pymw_input"] = _pymw_input
+_pymw_ns["_pymw_output_fd"] = _pymw_output_fd
+sys.argv = ["", _pymw_input_arg, _pymw_output_arg]
+_pymw_stderr = sys.stderr
+sys.stderr = io.StringIO()
+try:
+	exec(_pymw_call, _pymw_ns)
+except SystemExit:
+	raise Exception(sys.stderr.getvalue())
+finally:
+	sys.stderr = _pymw_stderr
+	del _pymw_ns["_pymw_input"]
+"""
+
+def _create_interpreter():
+	if sys.version_info[:2] == (3, 12):
+		# Python 3.12 only gives subinterpreters their own GIL when asked to
+		return _interpreters.create(isolated=True)
+	return _interpreters.create()
+
+def _run_code(interp_id, code, shared):
+	"""Runs code in the __main__ module of a subinterpreter, with the shareable
+	values in shared bound in it.  Raises an Exception if the code fails."""
+	if hasattr(_interpreters, "exec"):
+		# Python 3.13 and later return a description of the exception instead of raising it
+		exc_info = _interpreters.exec(interp_id, code, shared)
+		if exc_info is not None:
+			raise Exception("Task failed in subinterpreter\n"+(getattr(exc_info, "errdisplay", None) or exc_info.formatted))
+	else:
+		try:
+			_interpreters.run_string(interp_id, code, shared)
+		except _interpreters.RunFailedError as e:
+			raise Exception("Task failed in subinterpreter\n"+str(e))
+
+class Worker:
+	"""Represents a worker in the subinterpreter interface, which keeps a
+	subinterpreter and the worker scripts loaded in it."""
+	def __init__(self, worker_num=0):
+		self._worker_num = worker_num
+		self._interp_id = _create_interpreter()
+		# Python 3.12 can't destroy a subinterpreter whose threading module was
+		# first imported by another thread, so import it in the thread which cleans up
+		_run_code(self._interp_id, "import threading", {})
+		self._scripts = set()
+
+	def __str__(self):
+		return "subinterpreter"+str(self._worker_num)
+
+	def _cleanup(self):
+		if self._interp_id is None: return
+		try:
+			_interpreters.destroy(self._interp_id)
+		except Exception:
+			pass
+		self._interp_id = None
+
+class SubinterpreterInterface:
+	"""Runs tasks in a pool of subinterpreters of the master process, each with
+	its own GIL, so they run in parallel without starting processes.  The worker
+	script of each task function is loaded into a subinterpreter once, and the
+	pickled input and output are passed as bytes and over a pipe.
+	Subinterpreters share the working directory of the master, where the worker
+	scripts unpack data file archives, so tasks with data files are rejected.
+	Modules which don't support subinterpreters (including many extension
+	modules) can't be used by tasks.  Running tasks
+	can't be stopped, so only queued tasks can be cancelled.
+	Without subinterpreter support (before Python 3.12), a MulticoreInterface
+	is created instead."""
+
+	def __new__(cls, num_workers=1, python_loc=sys.executable):
+		if _interpreters is None:
+			logging.info("Subinterpreters are not supported, using the multicore interface")
+			return MulticoreInterface(num_workers=num_workers, python_loc=python_loc)
+		return object.__new__(cls)
+
+	def __init__(self, num_workers=1, python_loc=sys.executable):
+		self._num_workers = num_workers
+		self._worker_list = [Worker(worker_num) for worker_num in range(num_workers)]
+		self._available_worker_list = list(self._worker_list)
+		self._input_objs = {}
+		self._output_objs = {}
+
+	def get_available_workers(self):
+		return list(self._available_worker_list)
+
+	def reserve_worker(self, worker):
+		self._available_worker_list.remove(worker)
+
+	def worker_finished(self, worker):
+		self._available_worker_list.append(worker)
+
+	# Loads the worker script of a task into the subinterpreter of the worker,
+	# and returns the last line of the script, which runs the task
+	def _load_script(self, task, worker):
+		source, call_line = pymw_read_script(task._executable_name)
+		if task._executable_name not in worker._scripts:
+			_run_code(worker._interp_id, _LOAD_CODE, {"_pymw_source": source, "_pymw_script": task._executable_name})
+			worker._scripts.add(task._executable_name)
+		return call_line
+
+	def execute_task(self, task, worker):
+		if not hasattr(task._raw_exec, '__call__'):
+			raise Exception("SubinterpreterInterface can only execute function tasks")
+		if task._data_file_zip:
+			raise Exception("SubinterpreterInterface can't execute tasks with data files")
+		call_line = self._load_script(task, worker)
+
+		# The output is read while the task runs, so a large output can't fill the pipe
+		out_r, out_w = os.pipe()
+		output = []
+		def read_output():
+			out_file = os.fdopen(out_r, "rb")
+			output.append(out_file.read())
+			out_file.close()
+		read_thread = threading.Thread(target=read_output)
+		read_thread.start()
+		try:
+			_run_code(worker._interp_id, _RUN_CODE,
+					  {"_pymw_script": task._executable_name, "_pymw_call": call_line,
+					   "_pymw_input": self._input_objs[task._input_arg], "_pymw_output_fd": out_w,
+					   "_pymw_input_arg": task._input_arg, "_pymw_output_arg": task._output_arg})
+		finally:
+			os.close(out_w)
+			read_thread.join()
+		if not output[0]:
+			raise Exception("Task did not write an output in subinterpreter")
+		self._output_objs[task._output_arg] = pickle.loads(output[0])
+
+		task.task_finished()	# notify the task
+
+	def _cleanup(self):
+		for worker in self._worker_list:
+			worker._cleanup()
+
+	def get_status(self):
+		return {"num_total_workers" : self._num_workers,
+			"num_active_workers": self._num_workers-len(self._available_worker_list)}
+
+	def pymw_master_read(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+
+	def pymw_master_write(self, output, loc):
+		# Bytes can be shared with subinterpreters, so the input is pickled once
+		self._input_objs[loc] = pickle.dumps(output, 2)
+
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
+
+	def pymw_worker_read(options):
+		return pickle.loads(_pymw_input)
+
+	def pymw_worker_write(output, options):
+		import os
+		# The master closes the pipe once the task is done
+		out_file = os.fdopen(_pymw_output_fd, "wb", closefd=False)
+		pickle.Pickler(out_file, 2).dump(output)
+		out_file.close()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+"""Provide an interface which passes the tasks of a master on to sub-masters,
+separate processes which each run a master with its own interface.
+"""
+
+import itertools
+import logging
+import multiprocessing
+import pickle
+import threading
+import time
+
+from pymw.pymw import PyMW_CallbackInterface, PyMW_Master, PyMW_LazyResult, WorkerLostException
+
+# Messages are pickled tuples sent over multiprocessing pipes.  The master sends
+# ("tasks", [(task_id, func, input_data, submit_options), ...]), ("cancel", task_id)
+# and ("quit",).  Sub-masters send ("hello", num_workers) once their interface is
+# created and ("done", [(task_id, error, output, stdout, stderr), ...]), where error
+# is None, the pickled exception or its message if it can't be pickled, and output
+# is the pickled result.
+
+def _pickle_error(err):
+	try:
+		return pickle.dumps(err, 2)
+	except Exception:
+		return str(err)
+
+def _send_results(conn, send_lock, master, task_ids, tasks, lock):
+	"""Sends the results of the tasks of a sub-master as they finish, with all the
+	tasks which finished in the meantime in one message, and forgets the tasks."""
+	while True:
+		finished = [master._finished_tasks.pop(blocking=True)]
+		while True:
+			task = master._finished_tasks.pop()
+			if not task: break
+			finished.append(task)
+		lock.acquire()
+		finished = [(task_ids.pop(task, None), task) for task in finished]
+		for task_id, task in finished: tasks.pop(task_id, None)
+		lock.release()
+		results = []
+		for task_id, task in finished:
+			if task_id is None: continue
+			if task._error:
+				results.append((task_id, _pickle_error(task._error), None, "", ""))
+				continue
+			output = master._task_result(task)
+			if isinstance(output, PyMW_LazyResult): output = output.get_bytes()
+			else: output = pickle.dumps(output, 2)
+			results.append((task_id, None, output, getattr(task, "_stdout", ""), getattr(task, "_stderr", "")))
+		# The results are sent on, so the master doesn't need to keep the tasks
+		for task_id, task in finished:
+			if task_id is not None: master._forget_task(task)
+		send_lock.acquire()
+		try:
+			conn.send(("done", results))
+		except (IOError, OSError):
+			return
+		finally:
+			send_lock.release()
+
+def _submaster_main(conn, index, start_time, interface_factory, num_workers):
+	"""Runs a master with the interface made by interface_factory in a sub-master
+	process, which submits the batches of tasks it gets and sends back their results."""
+	from pymw.interfaces import multicore
+	if interface_factory: interface = interface_factory()
+	else: interface = multicore.MulticoreInterface(num_workers=num_workers)
+	# Results are sent on pickled, so they are never unpickled here
+	master = PyMW_Master(interface, lazy_results=True)
+	# Sub-masters share the tasks directory, so their task names must differ
+	master._start_time_str = start_time+"_"+str(index)
+	try:
+		num_workers = interface.get_status()["num_total_workers"]
+	except Exception:
+		pass
+
+	send_lock, lock = threading.Lock(), threading.Lock()
+	# The id of each submitted task, and each task by its id
+	task_ids, tasks = {}, {}
+	conn.send(("hello", num_workers))
+	results_thread = threading.Thread(target=_send_results, args=(conn, send_lock, master, task_ids, tasks, lock))
+	results_thread.daemon = True
+	results_thread.start()
+
+	while True:
+		try:
+			msg = conn.recv()
+		except (EOFError, IOError, OSError):
+			break
+		if msg[0] == "tasks":
+			errors = []
+			for task_id, func, input_data, submit_options in msg[1]:
+				lock.acquire()
+				try:
+					task = master.submit_task(func, input_data=input_data, **submit_options)
+					task_ids[task], tasks[task_id] = task_id, task
+				except Exception as e:
+					errors.append((task_id, _pickle_error(e), None, "", ""))
+				finally:
+					lock.release()
+			if errors:
+				send_lock.acquire()
+				conn.send(("done", errors))
+				send_lock.release()
+		elif msg[0] == "cancel":
+			lock.acquire()
+			task = tasks.pop(msg[1], None)
+			lock.release()
+			if task: master.cancel(task)
+		elif msg[0] == "quit":
+			break
+	# The master cleans up its task files and interface when the process exits
+
+class SubMaster:
+	"""A sub-master process, and the tasks sent to it."""
+	def __init__(self, index, conn, process):
+		self.index = index
+		self._conn = conn
+		self._process = process
+		self._alive = True
+		self._num_workers = 0
+		self._num_tasks = 0
+		self._free_slots = []
+		self._outbox = []
+		self._outbox_cond = threading.Condition()
+		self._send_lock = threading.Lock()
+
+	def _send(self, msg):
+		self._send_lock.acquire()
+		try:
+			self._conn.send(msg)
+		finally:
+			self._send_lock.release()
+
+class Worker:
+	"""A slot for a task on a sub-master."""
+	def __init__(self, submaster, slot):
+		self._submaster = submaster
+		self._slot = slot
+
+	def __str__(self):
+		return "submaster"+str(self._submaster.index)+":"+str(self._slot)
+
+class SubMasterInterface(PyMW_CallbackInterface):
+	"""Passes tasks on to num_submasters sub-master processes, which each run a
+	master with the interface returned by interface_factory (a MulticoreInterface
+	with num_workers workers by default), so the scheduling, worker scripts and
+	task files of thousands of workers are spread over several processes.
+	interface_factory is called in each sub-master, so it must be picklable, like
+	a class or a functools.partial of one, and it can be a list with a factory for
+	each sub-master, for example to give each a different subset of the workers.
+	Each sub-master gets up to queue_depth tasks per worker, and the tasks started
+	while a batch is being sent go in the next batch.  Results are sent back in
+	batches as tasks finish, and are delivered when the task finishes.
+	Tasks are sent to the sub-masters pickled by reference, so task functions must be
+	importable there, and the main script must be guarded by if __name__ == "__main__".
+	If a sub-master exits, its tasks fail with a WorkerLostException and are retried."""
+
+	pymw_in_process = True
+
+	def __init__(self, num_submasters=2, num_workers=1, interface_factory=None, queue_depth=2):
+		if isinstance(interface_factory, (list, tuple)):
+			factories = list(interface_factory)
+		else:
+			factories = [interface_factory] * num_submasters
+		self._queue_depth = queue_depth
+		self._lock = threading.Lock()
+		# The task, worker, whether it was cancelled and the function to call when it finishes
+		# of each running task by its id
+		self._running = {}
+		self._task_ids = itertools.count()
+		self._input_objs = {}
+		self._output_objs = {}
+		self._closed = False
+		self._submasters = []
+		ctx = multiprocessing.get_context("spawn")
+		start_time = "%d_%x" % (time.time(), id(self))
+		for index, factory in enumerate(factories):
+			conn, child_conn = ctx.Pipe()
+			process = ctx.Process(target=_submaster_main, args=(child_conn, index, start_time, factory, num_workers))
+			process.daemon = True
+			process.start()
+			child_conn.close()
+			submaster = SubMaster(index, conn, process)
+			self._submasters.append(submaster)
+			for target in (self._send_loop, self._recv_loop):
+				thread = threading.Thread(target=target, args=(submaster,))
+				thread.daemon = True
+				thread.start()
+
+	# Sends the tasks started on a sub-master in batches
+	def _send_loop(self, submaster):
+		while True:
+			submaster._outbox_cond.acquire()
+			while not submaster._outbox and submaster._alive: submaster._outbox_cond.wait()
+			batch, submaster._outbox = submaster._outbox, []
+			submaster._outbox_cond.release()
+			if not batch: return
+			try:
+				submaster._send(("tasks", batch))
+			except (IOError, OSError) as e:
+				self._submaster_lost(submaster, str(e))
+				return
+
+	def _recv_loop(self, submaster):
+		while True:
+			try:
+				msg = submaster._conn.recv()
+			except (EOFError, IOError, OSError):
+				break
+			if msg[0] == "hello":
+				self._lock.acquire()
+				submaster._num_workers = msg[1]
+				submaster._free_slots = [Worker(submaster, slot) for slot in range(msg[1] * self._queue_depth)]
+				self._lock.release()
+			elif msg[0] == "done":
+				for result in msg[1]: self._task_done(*result)
+		self._submaster_lost(submaster, "sub-master exited")
+
+	def _task_done(self, task_id, error, output, stdout, stderr):
+		self._lock.acquire()
+		running = self._running.pop(task_id, None)
+		if running: running[1]._submaster._num_tasks += 1
+		self._lock.release()
+		if not running: return
+		task, worker, cancelled, finish_func = running
+		if cancelled:
+			finish_func(Exception("Task was cancelled"))
+		elif isinstance(error, bytes):
+			try:
+				finish_func(pickle.loads(error))
+			except Exception as e:
+				finish_func(Exception("Could not unpickle task error: "+str(e)))
+		elif error is not None:
+			finish_func(Exception(error))
+		else:
+			if not task._lazy_result: output = pickle.loads(output)
+			self._output_objs[task._output_arg] = [output, stdout, stderr]
+			finish_func()
+
+	def _submaster_lost(self, submaster, reason):
+		self._lock.acquire()
+		was_alive, submaster._alive = submaster._alive, False
+		submaster._free_slots = []
+		lost_tasks = [(task_id, running) for task_id, running in self._running.items()
+					  if running[1]._submaster is submaster]
+		for task_id, running in lost_tasks: del self._running[task_id]
+		self._lock.release()
+		# Wake up the send thread, so it exits
+		submaster._outbox_cond.acquire()
+		submaster._outbox = []
+		submaster._outbox_cond.notify()
+		submaster._outbox_cond.release()
+		if not was_alive or self._closed: return
+		logging.warning("Lost sub-master "+str(submaster.index)+": "+reason)
+		for task_id, (task, worker, cancelled, finish_func) in lost_tasks:
+			if cancelled: finish_func(Exception("Task was cancelled"))
+			else: finish_func(WorkerLostException("Worker "+str(worker)+" was lost: "+reason))
+
+	def get_available_workers(self):
+		# Free slots are offered alternating between sub-masters, the one with the most free slots first
+		self._lock.acquire()
+		try:
+			slot_lists = sorted([submaster._free_slots for submaster in self._submasters], key=len, reverse=True)
+			return [worker for slots in itertools.zip_longest(*slot_lists) for worker in slots if worker]
+		finally:
+			self._lock.release()
+
+	def reserve_worker(self, worker):
+		self._lock.acquire()
+		worker._submaster._free_slots.remove(worker)
+		self._lock.release()
+
+	def worker_finished(self, worker):
+		self._lock.acquire()
+		if worker._submaster._alive: worker._submaster._free_slots.append(worker)
+		self._lock.release()
+
+	# Queues a task for the next batch of its sub-master, and finish_func is called
+	# with the error, if any, once it is done
+	def _start_task(self, task, worker, finish_func):
+		if not hasattr(task._raw_exec, '__call__'):
+			raise Exception("SubMasterInterface can only execute function tasks")
+		submaster = worker._submaster
+		task_id = next(self._task_ids)
+		self._lock.acquire()
+		try:
+			if not submaster._alive: raise WorkerLostException("Worker "+str(worker)+" was lost")
+			self._running[task_id] = [task, worker, False, finish_func]
+		finally:
+			self._lock.release()
+		submaster._outbox_cond.acquire()
+		submaster._outbox.append((task_id, task._raw_exec, self._input_objs.get(task._input_arg),
+								  task._submit_options))
+		submaster._outbox_cond.notify()
+		submaster._outbox_cond.release()
+
+	def cancel_task(self, task, worker):
+		self._lock.acquire()
+		task_ids = [task_id for task_id, running in self._running.items() if running[0] is task]
+		for task_id in task_ids: self._running[task_id][2] = True
+		self._lock.release()
+		for task_id in task_ids:
+			try:
+				worker._submaster._send(("cancel", task_id))
+			except (IOError, OSError):
+				pass
+
+	def _cleanup(self):
+		self._closed = True
+		for submaster in self._submasters:
+			try:
+				submaster._send(("quit",))
+			except (IOError, OSError):
+				pass
+		for submaster in self._submasters:
+			submaster._process.join(10)
+			if submaster._process.is_alive(): submaster._process.terminate()
+
+	def get_status(self):
+		self._lock.acquire()
+		try:
+			submasters = [submaster for submaster in self._submasters if submaster._alive]
+			num_total_workers = sum([submaster._num_workers for submaster in submasters])
+			num_running = [len([1 for running in self._running.values() if running[1]._submaster is submaster])
+						   for submaster in submasters]
+			return {"num_total_workers": num_total_workers,
+					"num_active_workers": sum([min(running, submaster._num_workers)
+											   for submaster, running in zip(submasters, num_running)]),
+					"submasters": [{"pid": submaster._process.pid, "num_workers": submaster._num_workers,
+									"num_running": running, "num_tasks": submaster._num_tasks}
+								   for submaster, running in zip(submasters, num_running)]}
+		finally:
+			self._lock.release()
+
+	def pymw_master_read(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+
+	def pymw_master_write(self, output, loc):
+		self._input_objs[loc] = output
+
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
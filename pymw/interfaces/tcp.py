@@ -0,0 +1,530 @@
+#!/usr/bin/env python
+"""Provide an interface which runs PyMW tasks on worker agents connected to
+the master over TCP, and the worker agent which is started on each machine.
+"""
+
+import binascii
+import hashlib
+import ipaddress
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Listener
+from optparse import OptionParser
+
+from pymw.pymw import PyMW_CallbackInterface, WorkerLostException, pymw_decode_record_header, pymw_run_script
+
+# Messages are pickled tuples sent over multiprocessing connections.  The master sends
+# ("welcome", heartbeat_interval), ("file", hash, data), ("run", slot, task_id, script_hash,
+# [(archive_hash, archive_name), ...], input_data), ("cancel", task_id) and ("quit",).
+# Agents send ("hello", info), ("heartbeat",), ("record", task_id, record_type, data)
+# for streamed records and ("done", task_id, status, output_or_error).
+
+# Whether host only accepts connections from the local machine
+def _is_loopback(host):
+	try:
+		return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+	except (socket.error, ValueError):
+		return False
+
+# Returns the key agents authenticate with, from PYMW_AUTHKEY or the file named by PYMW_AUTHKEY_FILE
+def _read_authkey(authkey_file=None):
+	authkey_file = authkey_file or os.environ.get("PYMW_AUTHKEY_FILE")
+	if authkey_file:
+		key_file = open(authkey_file, "rb")
+		try:
+			return key_file.read().strip()
+		finally:
+			key_file.close()
+	authkey = os.environ.get("PYMW_AUTHKEY")
+	if authkey: return authkey.encode()
+	return None
+
+def _total_memory():
+	try:
+		return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+	except (AttributeError, ValueError, OSError):
+		return None
+
+class _RecordWriter:
+	"""Takes the place of the stdout of a slot process, and sends the records the
+	worker script writes to it to the agent as they are completed."""
+	def __init__(self, conn, task_id):
+		self._conn = conn
+		self._task_id = task_id
+		self._data = b""
+
+	def write(self, data):
+		self._data += data
+		while len(self._data) >= 11:
+			record_type, length = pymw_decode_record_header(self._data[:11])
+			if len(self._data) < 11+length: break
+			self._conn.send(("record", self._task_id, record_type, self._data[11:11+length]))
+			self._data = self._data[11+length:]
+
+	def flush(self):
+		pass
+
+def _slot_main(conn, slot_dir):
+	"""Runs the tasks an agent sends to one of its slots, loading each worker
+	script once.  Tasks run in the slot directory, where their archives are copied."""
+	os.chdir(slot_dir)
+	# The worker manager streams results to the record writer
+	os.environ["PYMW_STREAM"] = "1"
+	scripts = {}
+	while True:
+		try:
+			task_id, script_path, archives, input_data = conn.recv()
+		except (EOFError, OSError):
+			break
+		for archive_path, archive_name in archives:
+			if not os.path.exists(archive_name): shutil.copyfile(archive_path, archive_name)
+		sys.__stdout__ = _RecordWriter(conn, task_id)
+		status, output = pymw_run_script(scripts, script_path, input_data)
+		if status == 0:
+			try:
+				output = pickle.dumps(output, 2)
+			except Exception:
+				status, output = 1, traceback.format_exc()
+		conn.send(("done", task_id, status, output))
+
+class _Slot:
+	"""A persistent process of an agent, which runs one task at a time.  The
+	process is started when the first task arrives and again after it is killed."""
+	def __init__(self, send_func, slot_dir):
+		self._send = send_func
+		self._dir = slot_dir
+		self._process = None
+		self._conn = None
+		self._task_id = None
+
+	def run(self, task_id, script_path, archives, input_data):
+		if not self._process or not self._process.is_alive(): self._start()
+		self._task_id = task_id
+		self._conn.send((task_id, script_path, archives, input_data))
+
+	def _start(self):
+		# Spawned processes don't inherit the threads and connection of the agent
+		context = multiprocessing.get_context("spawn")
+		self._conn, child_conn = context.Pipe()
+		self._process = context.Process(target=_slot_main, args=(child_conn, self._dir))
+		self._process.daemon = True
+		self._process.start()
+		child_conn.close()
+		forward_thread = threading.Thread(target=self._forward, args=(self._conn,))
+		forward_thread.daemon = True
+		forward_thread.start()
+
+	# Passes the messages of the slot process on to the master until the process exits
+	def _forward(self, conn):
+		while True:
+			try:
+				msg = conn.recv()
+			except (EOFError, OSError):
+				break
+			if msg[0] == "done": self._task_id = None
+			self._send(msg)
+		# A killed process was already replaced, and its task reported by kill
+		if conn is self._conn and self._task_id is not None:
+			task_id, self._task_id = self._task_id, None
+			self._send(("done", task_id, 1, "Worker process exited"))
+
+	def kill(self):
+		task_id, self._task_id = self._task_id, None
+		if self._process and self._process.is_alive():
+			self._process.kill()
+			self._process.join()
+		if task_id is not None: self._send(("done", task_id, 1, "Worker process was killed"))
+
+def run_agent(address, cores=None, authkey=None, cache_dir=None, connect_timeout=60):
+	"""Connects to the master at address, a (host, port) tuple, and runs the tasks it
+	sends on cores slot processes until the master closes the connection.  Worker
+	scripts and archives are kept in cache_dir by content hash, so they are only sent
+	once.  The agent keeps trying to connect for connect_timeout seconds."""
+	if not cores: cores = multiprocessing.cpu_count()
+	start_time = time.time()
+	while True:
+		try:
+			conn = Client(address, authkey=authkey)
+			break
+		except (IOError, OSError):
+			if time.time() - start_time > connect_timeout: raise
+			time.sleep(0.5)
+	send_lock = threading.Lock()
+	def send_func(msg):
+		send_lock.acquire()
+		try:
+			conn.send(msg)
+		except (IOError, OSError):
+			pass
+		finally:
+			send_lock.release()
+
+	work_dir = tempfile.mkdtemp()
+	if not cache_dir: cache_dir = os.path.join(work_dir, "cache")
+	if not os.path.exists(cache_dir): os.makedirs(cache_dir)
+	slots = []
+	for slot_num in range(cores):
+		slot_dir = os.path.join(work_dir, str(slot_num))
+		os.mkdir(slot_dir)
+		slots.append(_Slot(send_func, slot_dir))
+
+	send_func(("hello", {"host": socket.gethostname(), "cores": cores, "memory": _total_memory()}))
+	stopped = threading.Event()
+	def heartbeat(interval):
+		while not stopped.wait(interval):
+			send_func(("heartbeat",))
+	try:
+		while True:
+			try:
+				msg = conn.recv()
+			except (EOFError, OSError):
+				break
+			if msg[0] == "welcome":
+				heartbeat_thread = threading.Thread(target=heartbeat, args=(msg[1],))
+				heartbeat_thread.daemon = True
+				heartbeat_thread.start()
+			elif msg[0] == "file":
+				cache_file = open(os.path.join(cache_dir, msg[1]), "wb")
+				cache_file.write(msg[2])
+				cache_file.close()
+			elif msg[0] == "run":
+				slot_num, task_id, script_hash, archives, input_data = msg[1:]
+				archives = [(os.path.join(cache_dir, archive_hash), archive_name) for archive_hash, archive_name in archives]
+				slots[slot_num].run(task_id, os.path.join(cache_dir, script_hash), archives, input_data)
+			elif msg[0] == "cancel":
+				for slot in slots:
+					if slot._task_id == msg[1]: slot.kill()
+			elif msg[0] == "quit":
+				break
+	finally:
+		stopped.set()
+		for slot in slots: slot.kill()
+		conn.close()
+		shutil.rmtree(work_dir, ignore_errors=True)
+
+def agent_main(args=None):
+	"""Runs a worker agent with the options given on the command line."""
+	parser = OptionParser(usage="usage: %prog [options] host[:port]")
+	parser.add_option("-c", "--cores", dest="cores", default="0",
+			help="number of tasks to run at a time (default: number of CPUs)", metavar="N")
+	parser.add_option("-d", "--cache_dir", dest="cache_dir", default="",
+			help="directory to keep worker scripts and archives in", metavar="DIR")
+	parser.add_option("-t", "--connect_timeout", dest="connect_timeout", default="60",
+			help="seconds to keep trying to connect to the master", metavar="SECONDS")
+	parser.add_option("-k", "--authkey_file", dest="authkey_file", default="",
+			help="file holding the key of the master (default: $PYMW_AUTHKEY_FILE)", metavar="FILE")
+	options, args = parser.parse_args(args)
+	if len(args) != 1: parser.error("the address of the master is required")
+	host, sep, port = args[0].partition(":")
+	# The shared key is taken from a file or the environment, so it doesn't show in the process list
+	authkey = _read_authkey(options.authkey_file or None)
+	run_agent((host, int(port or SocketInterface.DEFAULT_PORT)), cores=int(options.cores), authkey=authkey,
+			  cache_dir=options.cache_dir or None, connect_timeout=float(options.connect_timeout))
+
+class Agent:
+	"""Represents a worker agent connected to the master, with its cores and memory."""
+	def __init__(self, conn, info):
+		self._conn = conn
+		self._send_lock = threading.Lock()
+		self.host = info.get("host")
+		self.cores = info["cores"]
+		self.memory = info.get("memory")
+		self._files = set()
+		self._alive = True
+		self._workers = [Worker(self, slot) for slot in range(self.cores)]
+
+	def _send(self, msg):
+		self._send_lock.acquire()
+		try:
+			self._conn.send(msg)
+		finally:
+			self._send_lock.release()
+
+class Worker:
+	"""Represents one core of a worker agent."""
+	def __init__(self, agent, slot):
+		self._agent = agent
+		self._slot = slot
+
+	def __str__(self):
+		return str(self._agent.host)+":"+str(self._slot)
+
+class SocketInterface(PyMW_CallbackInterface):
+	"""Runs tasks on worker agents which connect to the master over TCP, with one
+	worker per core the agent advertises.  Agents are started on each machine with
+	the pymw-worker script and can join at any time.  Each core of an agent has a
+	persistent process which loads the worker script of each function once, and
+	the scripts and data file archives are sent to each agent once per content hash.
+	Agents send a heartbeat every heartbeat_interval seconds, and an agent which
+	sends nothing for heartbeat_timeout seconds or disconnects is dropped.  Its
+	running tasks fail with a WorkerLostException, and are retried on other workers.
+	Messages are pickled, so agents have to authenticate with a key.  Without an
+	authkey, like multiprocessing managers, the interface generates a random one,
+	available as the authkey attribute and written to authkey_file (a new temp
+	file by default), which only the user can read and which is removed on cleanup.
+	Agents read the key from the file named by their PYMW_AUTHKEY_FILE environment
+	variable or --authkey_file option, or from their PYMW_AUTHKEY variable.
+	Passing authkey=False accepts agents without a key, which is only allowed
+	on the loopback interface."""
+
+	DEFAULT_PORT = 7700
+
+	def __init__(self, port=DEFAULT_PORT, host="127.0.0.1", authkey=None, heartbeat_interval=1.0, heartbeat_timeout=5.0,
+				 authkey_file=None):
+		generated = authkey is None
+		if authkey is False:
+			if not _is_loopback(host):
+				raise Exception("SocketInterface requires an authkey to listen on "+repr(host))
+			authkey = None
+		elif generated:
+			authkey = binascii.hexlify(os.urandom(32))
+		self.authkey = self._authkey = authkey
+		# The key is written to a file only the user can read, and a generated temp file is removed on cleanup
+		self.authkey_file = None
+		self._remove_authkey_file = generated and not authkey_file
+		if authkey and authkey_file:
+			key_fd = os.open(authkey_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+			os.chmod(authkey_file, 0o600)
+		elif generated:
+			key_fd, authkey_file = tempfile.mkstemp(prefix="pymw_authkey_")
+		if authkey and authkey_file:
+			os.write(key_fd, authkey)
+			os.close(key_fd)
+			self.authkey_file = authkey_file
+		self._heartbeat_interval = heartbeat_interval
+		self._heartbeat_timeout = heartbeat_timeout
+		self._listener = Listener((host, port), authkey=authkey)
+		self.address = self._listener.address
+		self._lock = threading.Lock()
+		self._agents = []
+		self._available_worker_list = []
+		# The task, worker, whether it was cancelled and the function to call when it finishes
+		# of each running task by its id
+		self._running = {}
+		self._task_ids = itertools.count()
+		# Content hash of each file by its name and modification time
+		self._file_hashes = {}
+		self._input_objs = {}
+		self._output_objs = {}
+		self._closed = False
+		accept_thread = threading.Thread(target=self._accept_agents)
+		accept_thread.daemon = True
+		accept_thread.start()
+
+	def _accept_agents(self):
+		while not self._closed:
+			try:
+				conn = self._listener.accept()
+			except Exception as e:
+				if self._closed: break
+				logging.warning("Could not accept worker agent: "+str(e))
+				continue
+			if self._closed:
+				conn.close()
+				break
+			agent_thread = threading.Thread(target=self._agent_loop, args=(conn,))
+			agent_thread.daemon = True
+			agent_thread.start()
+
+	def _agent_loop(self, conn):
+		try:
+			if not conn.poll(self._heartbeat_timeout): raise Exception("no hello message")
+			msg = conn.recv()
+			if msg[0] != "hello": raise Exception("unexpected message "+str(msg[0]))
+			agent = Agent(conn, msg[1])
+			agent._send(("welcome", self._heartbeat_interval))
+		except Exception as e:
+			logging.warning("Worker agent did not connect: "+str(e))
+			conn.close()
+			return
+		self._lock.acquire()
+		self._agents.append(agent)
+		self._available_worker_list.extend(agent._workers)
+		self._lock.release()
+		logging.info("Worker agent "+str(agent.host)+" connected with "+str(agent.cores)+" cores")
+
+		while True:
+			try:
+				if not conn.poll(self._heartbeat_timeout):
+					reason = "no heartbeat for "+str(self._heartbeat_timeout)+" seconds"
+					break
+				msg = conn.recv()
+			except (EOFError, IOError, OSError):
+				reason = "connection closed"
+				break
+			if msg[0] == "record":
+				self._lock.acquire()
+				running = self._running.get(msg[1])
+				self._lock.release()
+				if running: running[0].stream_record(msg[2], msg[3])
+			elif msg[0] == "done":
+				self._task_done(*msg[1:])
+		self._agent_lost(agent, reason)
+
+	def _task_done(self, task_id, status, data):
+		self._lock.acquire()
+		running = self._running.pop(task_id, None)
+		self._lock.release()
+		if not running: return
+		task, worker, cancelled, finish_func = running
+		if cancelled:
+			finish_func(Exception("Task was cancelled"))
+		elif status != 0:
+			finish_func(Exception(data))
+		else:
+			self._output_objs[task._output_arg] = pickle.loads(data)
+			finish_func()
+
+	def _agent_lost(self, agent, reason):
+		self._lock.acquire()
+		agent._alive = False
+		if agent in self._agents: self._agents.remove(agent)
+		self._available_worker_list = [worker for worker in self._available_worker_list if worker._agent is not agent]
+		lost_tasks = [(task_id, running) for task_id, running in self._running.items() if running[1]._agent is agent]
+		for task_id, running in lost_tasks: del self._running[task_id]
+		self._lock.release()
+		try:
+			agent._conn.close()
+		except (IOError, OSError):
+			pass
+		if self._closed: return
+		logging.warning("Lost worker agent "+str(agent.host)+": "+reason)
+		for task_id, (task, worker, cancelled, finish_func) in lost_tasks:
+			if cancelled: finish_func(Exception("Task was cancelled"))
+			else: finish_func(WorkerLostException("Worker "+str(worker)+" was lost: "+reason))
+
+	def get_available_workers(self):
+		self._lock.acquire()
+		try:
+			return list(self._available_worker_list)
+		finally:
+			self._lock.release()
+
+	def reserve_worker(self, worker):
+		self._lock.acquire()
+		self._available_worker_list.remove(worker)
+		self._lock.release()
+
+	def worker_finished(self, worker):
+		self._lock.acquire()
+		if worker._agent._alive: self._available_worker_list.append(worker)
+		self._lock.release()
+
+	# Sends a file to an agent unless it already has the same contents, and returns the content hash
+	def _send_file(self, agent, file_name):
+		file_stat = os.stat(file_name)
+		file_key = (file_name, file_stat.st_mtime, file_stat.st_size)
+		file_hash, data = self._file_hashes.get(file_key), None
+		if file_hash is None:
+			data_file = open(file_name, "rb")
+			data = data_file.read()
+			data_file.close()
+			file_hash = self._file_hashes[file_key] = hashlib.sha1(data).hexdigest()
+		if file_hash not in agent._files:
+			if data is None:
+				data_file = open(file_name, "rb")
+				data = data_file.read()
+				data_file.close()
+			agent._send(("file", file_hash, data))
+			agent._files.add(file_hash)
+		return file_hash
+
+	# Sends a task to its agent, and finish_func is called with the error, if any, once it is done
+	def _start_task(self, task, worker, finish_func):
+		if not hasattr(task._raw_exec, '__call__'):
+			raise Exception("SocketInterface can only execute function tasks")
+		agent = worker._agent
+		task_id = next(self._task_ids)
+		self._lock.acquire()
+		try:
+			if not agent._alive: raise WorkerLostException("Worker "+str(worker)+" was lost")
+			self._running[task_id] = [task, worker, False, finish_func]
+		finally:
+			self._lock.release()
+		try:
+			script_hash = self._send_file(agent, task._executable_name)
+			archives = [(self._send_file(agent, zip_file), os.path.basename(zip_file))
+						for zip_file in (task._data_file_zip, task._modules_file_zip) if zip_file]
+			agent._send(("run", worker._slot, task_id, script_hash, archives, self._input_objs[task._input_arg]))
+		except (EOFError, IOError, OSError) as e:
+			# Unless the agent thread already failed the task, it is failed here
+			self._lock.acquire()
+			running = self._running.pop(task_id, None)
+			self._lock.release()
+			if running: raise WorkerLostException("Worker "+str(worker)+" was lost: "+str(e))
+
+	def cancel_task(self, task, worker):
+		self._lock.acquire()
+		task_ids = [task_id for task_id, running in self._running.items() if running[0] is task]
+		for task_id in task_ids: self._running[task_id][2] = True
+		self._lock.release()
+		for task_id in task_ids:
+			try:
+				worker._agent._send(("cancel", task_id))
+			except (IOError, OSError):
+				pass
+
+	def _cleanup(self):
+		self._closed = True
+		self._lock.acquire()
+		agents = list(self._agents)
+		self._lock.release()
+		for agent in agents:
+			try:
+				agent._send(("quit",))
+			except (IOError, OSError):
+				pass
+		# Wake up the thread accepting agents, so it sees the interface is closed
+		host, port = self.address
+		if host in ("", "0.0.0.0"): host = "127.0.0.1"
+		try:
+			socket.create_connection((host, port), timeout=1).close()
+		except (IOError, OSError):
+			pass
+		self._listener.close()
+		if self._remove_authkey_file:
+			try:
+				os.remove(self.authkey_file)
+			except OSError:
+				pass
+
+	def get_status(self):
+		self._lock.acquire()
+		try:
+			num_total_workers = sum([agent.cores for agent in self._agents])
+			return {"num_total_workers": num_total_workers,
+					"num_active_workers": num_total_workers-len(self._available_worker_list),
+					"agents": [{"host": agent.host, "cores": agent.cores, "memory": agent.memory} for agent in self._agents]}
+		finally:
+			self._lock.release()
+
+	def pymw_master_read(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+
+	def pymw_master_write(self, output, loc):
+		self._input_objs[loc] = pickle.dumps(output, 2)
+
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
+
+	def pymw_worker_read(options):
+		return pickle.loads(_pymw_input)
+
+	def pymw_worker_write(output, options):
+		global _pymw_output
+		_pymw_output = output
+
+if __name__ == "__main__":
+	agent_main()
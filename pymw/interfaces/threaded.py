@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""Provide an interface which calls PyMW task functions in threads of the master.
+"""
+
+import threading
+import types
+
+# The task executed by each thread, for the worker calls of task functions
+_current = threading.local()
+
+class TaskCancelled(Exception):
+	pass
+
+def pymw_emit_result(result):
+	task = _current.task
+	if task._thread_cancelled: raise TaskCancelled("Task was cancelled")
+	_current.num_results += 1
+	task.emit_result(result)
+
+def pymw_set_progress(prog_ratio):
+	task = _current.task
+	if task._thread_cancelled: raise TaskCancelled("Task was cancelled")
+	task.set_progress(min(max(prog_ratio, 0.0), 1.0))
+
+class ThreadInterface:
+	"""Calls task functions directly in the thread the master executes each task
+	in, with num_workers tasks running at a time.  Nothing is pickled and no
+	worker script is generated, so this suits tasks which release the GIL, such
+	as NumPy, zlib and I/O heavy tasks, and free-threaded Python builds.
+	Tasks get the input objects themselves rather than copies, their stdout and
+	stderr are not captured and results are never lazy, since nothing is pickled.
+	Running tasks can't be killed, so cancelled tasks stop at their next call to
+	pymw_emit_result or pymw_set_progress."""
+
+	pymw_in_process = True
+
+	def __init__(self, num_workers=1):
+		self._num_workers = num_workers
+		self._available_worker_list = list(range(num_workers))
+		self._worker_lock = threading.Lock()
+		self._input_objs = {}
+		self._output_objs = {}
+
+	def get_available_workers(self):
+		self._worker_lock.acquire()
+		try:
+			return list(self._available_worker_list)
+		finally:
+			self._worker_lock.release()
+
+	def reserve_worker(self, worker):
+		self._worker_lock.acquire()
+		self._available_worker_list.remove(worker)
+		self._worker_lock.release()
+
+	def worker_finished(self, worker):
+		self._worker_lock.acquire()
+		self._available_worker_list.append(worker)
+		self._worker_lock.release()
+
+	def execute_task(self, task, worker):
+		func = task._raw_exec
+		if not hasattr(func, '__call__'):
+			raise Exception("ThreadInterface can only execute function tasks")
+		task._thread_cancelled = False
+		# Task functions call the worker functions of this module, unless their module defines its own
+		func_globals = getattr(func, "__globals__", None)
+		if func_globals is not None:
+			func_globals.setdefault("pymw_emit_result", pymw_emit_result)
+			func_globals.setdefault("pymw_set_progress", pymw_set_progress)
+
+		_current.task = task
+		_current.num_results = 0
+		try:
+			result = func(*(self._input_objs[task._input_arg] or ()))
+			res_list = isinstance(result, types.GeneratorType)
+			if res_list:
+				for item in result: pymw_emit_result(item)
+			else:
+				pymw_emit_result(result)
+			# The result is the list of emitted results, unless a single result was emitted by a function
+			if res_list or _current.num_results != 1: task._stream_result = "list"
+			else: task._stream_result = "item"
+		finally:
+			_current.task = None
+		if task._thread_cancelled:
+			raise TaskCancelled("Task was cancelled")
+		self._output_objs[task._output_arg] = [None, "", ""]
+
+		task.task_finished()	# notify the task
+
+	def cancel_task(self, task, worker):
+		task._thread_cancelled = True
+
+	def get_status(self):
+		return {"num_total_workers" : self._num_workers,
+			"num_active_workers": self._num_workers-len(self._available_worker_list)}
+
+	def pymw_master_read(self, loc):
+		# Results are only read once, so don't keep them
+		return self._output_objs.pop(loc)
+
+	def pymw_master_write(self, output, loc):
+		self._input_objs[loc] = output
+
+	def pymw_master_release(self, loc):
+		# The task was delivered, so it won't run again
+		self._input_objs.pop(loc, None)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+"""Provide a journal of PyMW task submissions, dispatches and completions,
+so a computation can be resumed after the master is restarted.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import threading
+
+class PyMW_Journal:
+	"""Append-only log of the tasks of a PyMW_Master, stored in file_name.
+	Each record is a line of tab separated fields: the record type, the task
+	name and a value (the input hash, worker or output file of the task).
+	Results of finished tasks are kept in the output files the interface left
+	them in, and results held in memory are appended to file_name+".results",
+	where the record of the task refers to them by offset.  If resume is
+	True, the records of an existing journal are loaded and new records are
+	appended to it, otherwise the journal is started over.
+	Records written within flush_interval seconds of each other are flushed
+	together by a background thread (group commit), so they survive a crash
+	of the master unless it crashes in between, in which case the tasks whose
+	records were lost are executed again.  With a flush_interval of 0, each
+	record is flushed as it is written.  If sync is True the records are
+	also synced to disk, so they survive a crash of the machine.
+	The master keeps the journaled output files on cleanup, so they can be
+	restored, until close(completed=True) marks the run as completed."""
+
+	VERSION = "1"
+
+	SUBMITTED = "S"
+	DISPATCHED = "D"
+	FINISHED = "F"
+	FAILED = "E"
+
+	def __init__(self, file_name, resume=False, sync=False, flush_interval=0.1):
+		self._file_name = file_name
+		self._results_file_name = file_name+".results"
+		self._sync = sync
+		self._flush_interval = flush_interval
+		self._lock = threading.Condition()
+		# Whether records were written since the last flush, and whether the run completed
+		self._dirty = False
+		self._completed = False
+		self._start_time_str = None
+		# State of each journaled task, as [input hash, record type, output file]
+		self._records = {}
+		self._stats = {"restored": 0, "reattached": 0, "records": 0}
+		if resume and os.path.exists(file_name):
+			self._load()
+			self._journal_file = open(file_name, "a")
+			self._results_file = open(self._results_file_name, "ab")
+		else:
+			self._journal_file = open(file_name, "w")
+			self._results_file = open(self._results_file_name, "wb")
+		if flush_interval > 0:
+			self._flush_thread = threading.Thread(target=self._flush_loop)
+			self._flush_thread.daemon = True
+			self._flush_thread.start()
+
+	def _load(self):
+		journal_file = open(self._file_name, "r")
+		for line in journal_file:
+			# Ignore a record that was only partly written when the master stopped
+			if not line.endswith("\n"): break
+			fields = line[:-1].split("\t")
+			if len(fields) != 3: continue
+			record_type, task_name, value = fields
+			if record_type == "V":
+				self._start_time_str = value
+			elif record_type == self.SUBMITTED:
+				self._records[task_name] = [value, record_type, None]
+			elif task_name in self._records:
+				self._records[task_name][1] = record_type
+				if record_type == self.FINISHED: self._records[task_name][2] = value
+		journal_file.close()
+
+	def _write(self, record_type, task_name, value):
+		value = str(value).replace("\t", " ").replace("\n", " ")
+		self._lock.acquire()
+		try:
+			# Executions may still finish while the master is cleaning up
+			if self._journal_file.closed: return
+			self._journal_file.write(record_type+"\t"+task_name+"\t"+value+"\n")
+			self._stats["records"] += 1
+			if self._flush_interval <= 0:
+				self._flush()
+			elif not self._dirty:
+				self._dirty = True
+				self._lock.notify()
+		finally:
+			self._lock.release()
+
+	# Flushes the records written since the last flush together, once they are flush_interval old
+	def _flush_loop(self):
+		self._lock.acquire()
+		try:
+			while not self._journal_file.closed:
+				if not self._dirty:
+					self._lock.wait()
+					continue
+				self._lock.wait(self._flush_interval)
+				if self._journal_file.closed: break
+				self._flush()
+		finally:
+			self._lock.release()
+
+	# Results are flushed before the records referring to them
+	# Must be called with the lock held
+	def _flush(self):
+		for flush_file in (self._results_file, self._journal_file):
+			flush_file.flush()
+			if self._sync: os.fsync(flush_file.fileno())
+		self._dirty = False
+
+	def get_start_time(self):
+		"""Returns the start time string of the journaled master, or None for a new journal."""
+		return self._start_time_str
+
+	def start(self, start_time_str):
+		"""Records the start time string the master uses in task names."""
+		self._start_time_str = start_time_str
+		self._write("V", self.VERSION, start_time_str)
+
+	def get_input_hash(self, input_data):
+		"""Returns a hash of the task input, used to check that a resumed task is unchanged."""
+		try:
+			return hashlib.sha1(pickle.dumps(input_data, 2)).hexdigest()
+		except (pickle.PicklingError, TypeError, AttributeError):
+			return "-"
+
+	def get_task_state(self, task_name, input_hash):
+		"""Returns the last record type and output file of a task in the loaded journal,
+		or None, None if the task wasn't journaled with the same input."""
+		record = self._records.get(task_name)
+		if not record or record[0] != input_hash or input_hash == "-":
+			return None, None
+		return record[1], record[2]
+
+	def task_submitted(self, task_name, input_hash):
+		self._write(self.SUBMITTED, task_name, input_hash)
+
+	def task_dispatched(self, task_name, worker):
+		self._write(self.DISPATCHED, task_name, worker)
+
+	def task_done(self, task):
+		"""Records a delivered task.  The result of a finished task is appended to the
+		results file if the interface didn't leave it in the output file or streamed
+		it instead, so it can be restored."""
+		if task._task_state is not task.TASK_FINISHED:
+			self._write(self.FAILED, task._task_name, task._error)
+			return
+		if not task._stream_result and os.path.exists(task._output_arg):
+			self._write(self.FINISHED, task._task_name, task._output_arg)
+			return
+		try:
+			result_str = pickle.dumps((task._output_data, getattr(task, "_stdout", None),
+									   getattr(task, "_stderr", None)), 2)
+		except (pickle.PicklingError, TypeError, AttributeError) as e:
+			logging.warning("Could not keep result of task "+str(task)+": "+str(e))
+			return
+		# The result is written before its record, and results are flushed first, so the record never
+		# survives a crash without its result
+		self._lock.acquire()
+		try:
+			if self._results_file.closed: return
+			offset = self._results_file.tell()
+			self._results_file.write(result_str)
+		finally:
+			self._lock.release()
+		self._write(self.FINISHED, task._task_name, "#"+str(offset)+"+"+str(len(result_str)))
+
+	def read_result(self, output):
+		"""Returns the result recorded for a finished task in the loaded journal, as
+		(output data, stdout, stderr), if it was kept in the results file.  Returns
+		None if it was kept in an output file."""
+		if not output.startswith("#"): return None
+		offset, length = [int(field) for field in output[1:].split("+")]
+		self._lock.acquire()
+		try:
+			if not self._results_file.closed: self._results_file.flush()
+		finally:
+			self._lock.release()
+		results_file = open(self._results_file_name, "rb")
+		try:
+			results_file.seek(offset)
+			return pickle.loads(results_file.read(length))
+		finally:
+			results_file.close()
+
+	def task_restored(self, reattached=False):
+		self._lock.acquire()
+		if reattached: self._stats["reattached"] += 1
+		else: self._stats["restored"] += 1
+		self._lock.release()
+
+	def get_stats(self):
+		"""Returns the number of tasks restored from finished outputs, the number of tasks
+		reattached to the interface and the number of records written."""
+		self._lock.acquire()
+		stats = dict(self._stats)
+		self._lock.release()
+		return stats
+
+	def is_completed(self):
+		"""Returns True if the journaled run was marked as completed."""
+		return self._completed
+
+	def close(self, completed=False):
+		"""Flushes and closes the journal.  If completed is True, the run is marked as
+		completed, so its results file is deleted and the master deletes the output
+		files of its tasks on cleanup (unless it keeps its files)."""
+		self._lock.acquire()
+		try:
+			if not self._journal_file.closed:
+				self._flush()
+				self._journal_file.close()
+				self._results_file.close()
+			if completed and not self._completed:
+				self._completed = True
+				try:
+					os.remove(self._results_file_name)
+				except OSError:
+					pass
+			self._lock.notify()
+		finally:
+			self._lock.release()
@@ -7,10 +7,13 @@ __date__ = "10 April 2008"
 
 import atexit
 
+import copy
 import pickle
 import errno
+import heapq
 import logging
 import inspect
+import io
 import os
 import signal
 import sys
@@ -21,6 +24,10 @@ import time
 import traceback
 import zipfile
 from .interfaces import generic
+from .estimator import PyMW_RuntimeEstimator
+from .cache import PyMW_ResultCache
+from .journal import PyMW_Journal
+from .result_store import PyMW_ResultStore
 
 if sys.version_info[0] > 2:
 	from io import StringIO
@@ -94,6 +101,250 @@ class PyMW_List:
 		if n != 0: return True
 		else: return False
 
+class PyMW_QueueView:
+	"""The items of a PyMW_TaskQueue in dispatch order, as a read-only sequence.
+	The heap is only ordered as far as the items are read, so matchers which
+	look at the first few tasks don't sort the whole queue."""
+	def __init__(self, heap, length):
+		self._heap = heap
+		self._length = length
+		self._items = []
+		# Heap positions to visit next, ordered by their entries
+		self._frontier = []
+		if heap: self._frontier.append((heap[0][0], 0))
+	
+	# Orders items until there are more than index of them, or the heap is exhausted
+	def _extend(self, index):
+		heap, frontier = self._heap, self._frontier
+		while len(self._items) <= index and frontier:
+			key, pos = heapq.heappop(frontier)
+			entry = heap[pos]
+			if entry[2]: self._items.append(entry[1])
+			for child in (2*pos+1, 2*pos+2):
+				if child < len(heap): heapq.heappush(frontier, (heap[child][0], child))
+	
+	def __len__(self):
+		return self._length
+	
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(len(self)))]
+		if index < 0: index += len(self)
+		if index < 0 or index >= len(self): raise IndexError("queue index out of range")
+		self._extend(index)
+		if index >= len(self._items): raise IndexError("queue index out of range")
+		return self._items[index]
+	
+	def __iter__(self):
+		index = 0
+		while True:
+			self._extend(index)
+			if index >= len(self._items): return
+			yield self._items[index]
+			index += 1
+	
+	def __contains__(self, item):
+		for queued_item in self:
+			if queued_item is item: return True
+		return False
+	
+	def count(self, item):
+		return int(item in self)
+	
+	def index(self, item):
+		for index, queued_item in enumerate(self):
+			if queued_item is item: return index
+		raise ValueError("item is not queued")
+	
+	def __eq__(self, other):
+		try:
+			return list(self) == list(other)
+		except TypeError:
+			return False
+	
+	def __ne__(self, other):
+		return not self == other
+
+class PyMW_TaskQueue:
+	"""A queue of tasks waiting to be scheduled, ordered by priority and/or deadline.
+	Tasks are kept in a heap with lazy deletion, so the next task to dispatch and the
+	removal of any specific task are cheap even for very large queues.
+	It supports the same atomic operations as PyMW_List."""
+	
+	POLICY_FIFO = "fifo"
+	POLICY_PRIORITY = "priority"
+	POLICY_DEADLINE = "deadline"
+	
+	def __init__(self, policy=POLICY_PRIORITY):
+		if policy not in (self.POLICY_FIFO, self.POLICY_PRIORITY, self.POLICY_DEADLINE):
+			raise ValueError("Unknown queue policy "+str(policy))
+		self._policy = policy
+		self._lock = threading.Lock()
+		self._add_event = threading.Condition(self._lock)
+		self._heap = []
+		self._entries = {}
+		self._num_removed = 0
+		self._next_seq = 0
+		self._num_queued = {}
+		self._wait_stats = {}
+		self._listeners = []
+	
+	def __len__(self):
+		return len(self._entries)
+	
+	# Heap entries are [sort key, item, valid flag]
+	# The sequence number in the sort key keeps equal keys in submission order
+	def _sort_key(self, item):
+		self._next_seq += 1
+		if self._policy == self.POLICY_FIFO:
+			return (self._next_seq,)
+		priority = getattr(item, "_priority", 0)
+		deadline = getattr(item, "_deadline", None)
+		if deadline is None: deadline = float("inf")
+		if self._policy == self.POLICY_DEADLINE:
+			return (deadline, -priority, self._next_seq)
+		return (-priority, deadline, self._next_seq)
+	
+	# Must be called with the lock held
+	def _remove_entry(self, item):
+		entry = self._entries.pop(item)
+		entry[2] = False
+		priority = getattr(item, "_priority", 0)
+		self._num_queued[priority] -= 1
+		if self._num_queued[priority] == 0: del self._num_queued[priority]
+		self._num_removed += 1
+		for listener in self._listeners: listener.task_removed(item)
+		# Rebuild the heap if most of it is made up of removed entries
+		if self._num_removed > 64 and self._num_removed > len(self._entries):
+			self._heap = [e for e in self._heap if e[2]]
+			heapq.heapify(self._heap)
+			self._num_removed = 0
+	
+	# Returns the heap entry of the next item to dispatch, or None if the queue is empty
+	# Must be called with the lock held
+	def _head_entry(self):
+		while self._heap and not self._heap[0][2]:
+			heapq.heappop(self._heap)
+			self._num_removed -= 1
+		if self._heap: return self._heap[0]
+		return None
+	
+	# Must be called with the lock held
+	def _record_wait(self, item):
+		try:
+			wait_time = time.time() - item._times["submit_time"]
+		except (AttributeError, KeyError):
+			return
+		stats = self._wait_stats.setdefault(getattr(item, "_priority", 0), [0, 0.0, 0.0])
+		stats[0] += 1
+		stats[1] += wait_time
+		stats[2] = max(stats[2], wait_time)
+	
+	def get_data(self, max_items=None):
+		"""Returns the queued items in dispatch order.  If max_items is specified,
+		a list of at most that many items is returned, which only orders the top
+		of the heap.  Otherwise a PyMW_QueueView of a snapshot of the queue is
+		returned, which is only sorted as it is read."""
+		self._lock.acquire()
+		try:
+			if max_items == 1:
+				head = self._head_entry()
+				if head: return [head[1]]
+				return []
+			if max_items is not None:
+				return PyMW_QueueView(self._heap, len(self._entries))[:max_items]
+			return PyMW_QueueView(list(self._heap), len(self._entries))
+		finally:
+			self._lock.release()
+	
+	def append(self, item):
+		"""Atomically adds an item to the queue and notifies any waiting threads."""
+		self._add_event.acquire()
+		if item in self._entries: self._remove_entry(item)
+		entry = [self._sort_key(item), item, True]
+		self._entries[item] = entry
+		priority = getattr(item, "_priority", 0)
+		self._num_queued[priority] = self._num_queued.get(priority, 0) + 1
+		heapq.heappush(self._heap, entry)
+		for listener in self._listeners: listener.task_added(item)
+		self._add_event.notify_all()
+		self._add_event.release()
+	
+	def add_listener(self, listener):
+		"""Registers an object whose task_added(item) and task_removed(item) methods are
+		called whenever an item enters or leaves the queue.  The items already in the
+		queue are passed to task_added.  The methods are called with the queue lock held."""
+		self._lock.acquire()
+		try:
+			self._listeners.append(listener)
+			for e in sorted([e for e in self._heap if e[2]]):
+				listener.task_added(e[1])
+		finally:
+			self._lock.release()
+	
+	def remove(self, item):
+		"""Removes an item from the queue without dispatching it.
+		Returns True if the item was in the queue."""
+		self._lock.acquire()
+		try:
+			if item not in self._entries: return False
+			self._remove_entry(item)
+			return True
+		finally:
+			self._lock.release()
+	
+	def pop(self, blocking=False):
+		"""Waits for any item to appear in the queue, and pops off the next one to dispatch."""
+		return self.pop_specific([], blocking)
+	
+	def pop_specific(self, item_list=[], blocking=False):
+		"""Waits for any item from item_list to appear, and pops it off.
+		An empty item_list indicates the next item in dispatch order."""
+		self._add_event.acquire()
+		try:
+			while True:
+				found_entry = None
+				if len(item_list) > 0:
+					for item in item_list:
+						if item in self._entries:
+							found_entry = self._entries[item]
+							break
+				else:
+					found_entry = self._head_entry()
+				
+				if found_entry:
+					self._remove_entry(found_entry[1])
+					self._record_wait(found_entry[1])
+					return found_entry[1]
+				
+				if blocking: self._add_event.wait()
+				else: return None
+		finally:
+			self._add_event.release()
+	
+	def contains(self, item):
+		"""Checks if the queue contains the specified item."""
+		self._lock.acquire()
+		found = item in self._entries
+		self._lock.release()
+		return found
+	
+	def get_wait_stats(self):
+		"""Returns a dictionary mapping each task priority to the number of queued tasks
+		and statistics about how long dispatched tasks of that priority waited in the queue."""
+		self._lock.acquire()
+		try:
+			wait_stats = {}
+			for priority in set(self._num_queued) | set(self._wait_stats):
+				num_tasks, total_wait, max_wait = self._wait_stats.get(priority, [0, 0.0, 0.0])
+				if num_tasks > 0: mean_wait = total_wait / num_tasks
+				else: mean_wait = 0.0
+				wait_stats[priority] = {"num_queued": self._num_queued.get(priority, 0),
+										"num_dispatched": num_tasks, "mean_wait": mean_wait, "max_wait": max_wait}
+			return wait_stats
+		finally:
+			self._lock.release()
+
 class TaskException(Exception):
 	"""Represents an exception caused by a task failure."""
 	def __init__(self, value):
@@ -101,6 +352,18 @@ class TaskException(Exception):
 	def __str__(self):
 		return repr(self.param)
 
+class TaskTimeoutException(TaskException):
+	"""Represents a task that was stopped because it ran longer than its timeout."""
+	pass
+
+class TaskCancelledException(TaskException):
+	"""Represents a task that was cancelled before it finished."""
+	pass
+
+class WorkerLostException(TaskException):
+	"""Represents a task whose worker stopped responding or disconnected while it ran."""
+	pass
+
 class InterfaceException(Exception):
 	"""Represents an exception caused by an interface failure."""
 	def __init__(self, value, detail_str=None):
@@ -112,6 +375,139 @@ class InterfaceException(Exception):
 	def __str__(self):
 		return repr(self.param)+"\n"+repr(self.details)
 
+class PyMW_CallbackInterface:
+	"""Base of interfaces which start tasks without blocking.  Subclasses define
+	_start_task(task, worker, finish_func), which calls finish_func with the
+	error, if any, once the task is done."""
+	def start_task(self, task, worker):
+		self._start_task(task, worker, task.task_finished)
+	
+	def execute_task(self, task, worker):
+		done = threading.Event()
+		task_err = []
+		def finish_func(err=None):
+			task_err.append(err)
+			done.set()
+		self._start_task(task, worker, finish_func)
+		done.wait()
+		if task_err[0]: raise task_err[0]
+		task.task_finished()	# notify the task
+
+# Workers stream records to the master, each a type character, the length of the data as
+# 10 digits and the data.  The record and worker script functions are copied into the worker
+# scripts of interfaces whose workers don't have PyMW installed.
+def pymw_encode_record(record_type, data):
+	"""Returns a record with the given type and data."""
+	return (record_type+"%010d" % len(data)).encode("ascii")+data
+
+def pymw_decode_record_header(header):
+	"""Returns the type and data length of the 11 byte header of a record.
+	Raises ValueError if header isn't a record header."""
+	if len(header) != 11: raise ValueError("incomplete record header")
+	return header[:1].decode(), int(header[1:])
+
+def pymw_read_record(stream_file):
+	"""Reads a record from stream_file, and returns its type and data, or None
+	at the end of the stream.  Raises ValueError if the stream has other data."""
+	header = stream_file.read(11)
+	if not header: return None
+	record_type, length = pymw_decode_record_header(header)
+	return record_type, stream_file.read(length)
+
+def pymw_read_script(script_path):
+	"""Returns the source of a worker script without its last line, which runs
+	the task, and the last line."""
+	script_file = open(script_path, "r")
+	script_lines = script_file.readlines()
+	script_file.close()
+	return "".join(script_lines[:-1]), script_lines[-1]
+
+def pymw_run_script(scripts, script_path, input_data):
+	"""Runs a task with the worker script at script_path in the process of the worker.
+	Each script is loaded once into its own namespace, which is kept in scripts by
+	its path.  The worker calls of interfaces running tasks this way read the input
+	from _pymw_input and write the output to _pymw_output in the namespace.
+	Returns 0 and the output of the task, or 1 and its error."""
+	if script_path not in scripts:
+		source, call_line = pymw_read_script(script_path)
+		namespace = {"__name__": "__pymw_worker__"}
+		try:
+			exec(compile(source, script_path, "exec"), namespace)
+			scripts[script_path] = (namespace, call_line)
+		except Exception:
+			scripts[script_path] = traceback.format_exc()
+	script = scripts[script_path]
+	if isinstance(script, str): return 1, script
+	# The worker manager prints the traceback of a failed task to stderr and exits
+	namespace, call_line = script
+	namespace["_pymw_input"] = input_data
+	old_stderr = sys.stderr
+	sys.stderr = io.StringIO()
+	sys.argv = [script_path]
+	try:
+		exec(call_line, namespace)
+		return 0, namespace.pop("_pymw_output", None)
+	except BaseException:
+		return 1, sys.stderr.getvalue() or traceback.format_exc()
+	finally:
+		sys.stderr = old_stderr
+		namespace.pop("_pymw_input", None)
+
+class PyMW_RetryPolicy:
+	"""Describes how tasks which fail are retried.
+	A task is executed at most max_attempts times.  After its n-th failure it is
+	queued again after backoff*factor**(n-1) seconds, but no more than max_backoff.
+	Only errors which are instances of one of the retry_on classes are retried."""
+	def __init__(self, max_attempts=3, backoff=1.0, factor=2.0, max_backoff=60.0, retry_on=(Exception,)):
+		self.max_attempts = max_attempts
+		self.backoff = backoff
+		self.factor = factor
+		self.max_backoff = max_backoff
+		self.retry_on = tuple(retry_on)
+	
+	def should_retry(self, task_err, num_failures):
+		"""Returns True if a task that failed num_failures times with task_err should be retried."""
+		return num_failures < self.max_attempts and isinstance(task_err, self.retry_on)
+	
+	def get_delay(self, num_failures):
+		"""Returns the number of seconds to wait before retrying a task that failed num_failures times."""
+		return min(self.backoff * self.factor ** (num_failures - 1), self.max_backoff)
+
+class PyMW_LazyResult:
+	"""The result of a task, which is only unpickled when get() is first called.
+	It holds either the pickled result, or the name of a file and the offset
+	and length of the pickled result in it.  A lazy result passed in the input
+	of another task is sent to the worker as it is, without being unpickled
+	and pickled again by the master."""
+	def __init__(self, data=None, file_name=None, offset=0, length=-1):
+		self._data = data
+		self._file_name = file_name
+		self._offset = offset
+		self._length = length
+		self._decoded = False
+		self._value = None
+	
+	def get_bytes(self):
+		"""Returns the pickled result."""
+		if self._data is not None: return self._data
+		data_file = open(self._file_name, "rb")
+		try:
+			data_file.seek(self._offset)
+			return data_file.read(self._length)
+		finally:
+			data_file.close()
+	
+	def get(self):
+		"""Returns the result, unpickling it the first time."""
+		if not self._decoded:
+			self._value = pickle.loads(self.get_bytes())
+			self._decoded = True
+		return self._value
+	
+	# Pickles as a call to unpickle the result, so the worker receives the result itself
+	def __reduce__(self):
+		return (pickle.loads, (self.get_bytes(),))
+
 class PyMW_Task:
 	"""Represents a task to be executed."""
 	
@@ -122,7 +518,8 @@ class PyMW_Task:
 	
 	def __init__(self, task_name, executable, executable_name, finished_queue, store_data_func, get_result_func,
 				 input_data=None, input_arg=None, output_arg=None, file_loc="tasks",
-				 data_file_zip=None, modules_file_zip=None, file_input=False, raw_exec=None):
+				 data_file_zip=None, modules_file_zip=None, file_input=False, raw_exec=None,
+				 priority=0, deadline=None, cost=None, retry_policy=None, timeout=None, keep_output=False):
 		# Make sure executable is valid
 		if not isinstance(executable, bytes) \
 			and not hasattr(executable, '__call__') \
@@ -131,6 +528,10 @@ class PyMW_Task:
 		
 		self.executable = executable
 		self.input_data = input_data
+		if hasattr(executable, '__call__'):
+			self._func_name = executable.__module__+"."+executable.__name__
+		else:
+			self._func_name = str(executable)
 		self._finished_queue = finished_queue
 		self._executable_name = executable_name
 		self._output_data = None
@@ -140,7 +541,27 @@ class PyMW_Task:
 		self._file_input = file_input
 		self._data_file_zip = data_file_zip
 		self._modules_file_zip = modules_file_zip
+		# Names of the data this task needs, which interfaces can report as cached on workers
+		# Module archives are read from the master, so only the data archive is held by workers
+		self._data_keys = tuple([os.path.basename(zip_file) for zip_file in (data_file_zip,) if zip_file])
 		self._raw_exec = raw_exec
+		self._priority = priority
+		self._cost = cost
+		# Speculative copies refer to the task they duplicate, which is done once any copy delivers
+		self._primary = None
+		self._spec_done = False
+		self._retry_policy = retry_policy
+		# Maximum number of seconds each execution of the task may take
+		self._timeout = timeout
+		self._timed_out = False
+		# Key of the task result in the result cache, if it should be cached
+		self._cache_key = None
+		# Whether the output of the task was moved to the result store, and whether it was fetched
+		self._result_stored = False
+		self._result_fetched = False
+		# Whether the worker sends the output pickled, so it is only unpickled when used
+		self._lazy_result = False
+		self._init_stream()
 
 		# Set the input and output file locations
 		if input_arg:
@@ -155,16 +576,22 @@ class PyMW_Task:
 		else:
 			self._output_arg = file_loc + "/out_" + self._task_name + ".dat"
 
-		# Remove any old output files
-		try:
-			os.remove(self._output_arg)
-		except:
-			pass
+		# Remove any old output files, unless they belong to a task resumed from a journal
+		if not keep_output:
+			try:
+				os.remove(self._output_arg)
+			except:
+				pass
 		
 		self._task_state = self.TASK_SUBMITTED
 		
 		# Task time bookkeeping
-		self._times = {"submit_time": time.time(), "execute_time": 0, "finish_time": 0}
+		# Failed executions are recorded as [execute time, finish time, worker, error]
+		self._times = {"submit_time": time.time(), "execute_time": 0, "finish_time": 0, "failures": []}
+		
+		# The deadline is given in seconds relative to the submission time
+		if deadline is not None: self._deadline = self._times["submit_time"] + deadline
+		else: self._deadline = None
 
 	def __str__(self):
 		return self._task_name
@@ -177,17 +604,107 @@ class PyMW_Task:
 				"input_arg": self._input_arg, "output_arg": self._output_arg,
 				"times": self._times, "state": self._task_state}
 	
+	# Results emitted by the worker are kept for PyMW_Master.stream() until the task is delivered
+	# If the worker streamed its result, the result is built from the items of the last execution
+	# Items are numbered from the start of the stream, and _stream_base is the number of the first kept item
+	def _init_stream(self):
+		self._stream_cond = threading.Condition()
+		self._stream_items = []
+		self._stream_base = 0
+		self._stream_start = 0
+		self._stream_result = None
+		self._stream_done = False
+		# Progress reported by the worker, streamed or read from a side file next to the output file
+		self._progress = 0.0
+		self._progress_streamed = False
+	
+	def _start_stream(self):
+		self._stream_cond.acquire()
+		self._stream_start = self._stream_base + len(self._stream_items)
+		self._stream_result = None
+		self._progress = 0.0
+		self._stream_cond.release()
+	
+	def _streamed_result(self):
+		self._stream_cond.acquire()
+		items = self._stream_items[self._stream_start - self._stream_base:]
+		self._stream_cond.release()
+		if self._stream_result == "list": return items
+		if items: return items[0]
+		return None
+	
+	# Puts the task in the finished queue, and ends its stream
+	# The emitted results are dropped, since the result of the task holds those of the last execution
+	def _deliver(self):
+		self._finished_queue.append(self)
+		self._stream_cond.acquire()
+		self._stream_base += len(self._stream_items)
+		self._stream_items = []
+		self._stream_done = True
+		self._stream_cond.notify_all()
+		self._stream_cond.release()
+	
+	def stream_record(self, record_type, data):
+		"""This is called by interfaces which stream records from the worker
+		while the task runs.  "R" records are emitted results, "S" records
+		tell whether the task result is the list of emitted results or one result
+		and "P" records report the progress of the task."""
+		if record_type == "P":
+			self.set_progress(float(data))
+		elif record_type == "R":
+			if self._lazy_result: self.emit_result(PyMW_LazyResult(data))
+			else: self.emit_result(pickle.loads(data))
+		elif record_type == "S":
+			self._stream_result = data.decode()
+	
+	def emit_result(self, item):
+		"""Adds a result emitted by the worker to the stream of the task.
+		Interfaces running tasks in the master process call this directly."""
+		self._stream_cond.acquire()
+		self._stream_items.append(item)
+		self._stream_cond.notify_all()
+		self._stream_cond.release()
+	
+	def set_progress(self, progress):
+		"""Sets the progress of the running task, as reported by the worker."""
+		self._progress = progress
+		self._progress_streamed = True
+	
+	def read_stream(self, stream_file):
+		"""Reads the records a worker writes to its stdout until stream_file is closed.
+		Returns the data of the "O" (output) record, or None if there was none."""
+		output = None
+		while True:
+			try:
+				record = pymw_read_record(stream_file)
+			except ValueError:
+				logging.warning("Task "+str(self)+" wrote unexpected data to stdout")
+				stream_file.read()
+				return output
+			if record is None: return output
+			record_type, data = record
+			if record_type == "O": output = data
+			else: self.stream_record(record_type, data)
+	
 	def task_finished(self, task_err=None, result=None):
 		"""This must be called by the interface class when the
 		task finishes execution.  The result of execution should
 		be in the file indicated by output_arg."""
 
+		# A speculative copy already delivered the result of this task,
+		# so this execution only has to give back its worker
+		if self._spec_done:
+			self._finish_func(self)
+			return
+		
 		self._error = task_err
 		if task_err:
 			logging.info("Task "+str(self)+" had an error")
 		elif not result:
 			try:
 				self._output_data, self._stdout, self._stderr = self._get_result_func(self._output_arg)
+				if self._stream_result: self._output_data = self._streamed_result()
+				elif self._lazy_result: self._output_data = PyMW_LazyResult(self._output_data)
 			except:
 				self._output_data = None
 				self._error = Exception("Error reading task result "+self._output_arg)
@@ -205,11 +722,13 @@ class PyMW_Task:
 		self._times["finish_time"] = time.time()
 		if self._error: self._task_state = self.TASK_ERROR
 		else: self._task_state = self.TASK_FINISHED
-		self._finished_queue.append(self)
+		# Let the scheduler handle tasks it dispatched, otherwise the task is done
 		try:
-			self._worker_finish_func(self._assigned_worker)
-		except:
-			pass
+			finish_func = self._finish_func
+		except AttributeError:
+			finish_func = None
+		if finish_func: finish_func(self)
+		else: self._deliver()
 
 	def get_total_time(self):
 		"""Get the time from task submission to completion.
@@ -229,30 +748,105 @@ class PyMW_Task:
 			return None
 
 	def get_progress(self):
-		"""Get the progress of the task, as represented by a double between 0 and 1."""
+		"""Get the progress of the task, as represented by a double between 0 and 1.
+		Running tasks report their progress with pymw_set_progress."""
 		if self._task_state is self.TASK_FINISHED: return 1.0
-		elif self._task_state is self.TASK_SUBMITTED: return 0.0
-		else: return 0.0
+		elif self._task_state is not self.TASK_RUNNING: return 0.0
+		# Workers of interfaces which don't stream records write the progress to a side file
+		if not self._progress_streamed:
+			try:
+				progress_file = open(self._output_arg+".progress", "r")
+				self._progress = float(progress_file.read())
+				progress_file.close()
+			except (IOError, OSError, ValueError):
+				pass
+		return self._progress
 	
-	def cleanup(self, delete_files):
-		try:
-			if delete_files:
-				os.remove(self._input_arg)
-				os.remove(self._output_arg)
-		except OSError:
-			pass
+	def cleanup(self, delete_files, keep_output=False):
+		if not delete_files: return
+		# Interfaces passing data in memory have no input file, but may have a journaled output file
+		file_names = [self._input_arg, self._output_arg+".progress"]
+		if not keep_output: file_names.append(self._output_arg)
+		for file_name in file_names:
+			try:
+				os.remove(file_name)
+			except OSError:
+				pass
 
 		
 class PyMW_Scheduler:
 	"""Takes tasks submitted by user and sends them to the master-worker interface.
-	This is done in a separate thread to allow for asynchronous program execution."""
-	def __init__(self, task_queue, interface, task_match_func):
+	This is done in a separate thread to allow for asynchronous program execution.
+	If speculative_factor is given, once the queue is empty and workers are idle, tasks running
+	longer than speculative_factor times the mean plus one standard deviation of the execution
+	time of their function are copied to other workers, up to max_speculative_copies times.
+	The first copy to finish delivers the result and the others are cancelled.
+	Failed tasks are retried according to their PyMW_RetryPolicy, or retry_policy if they
+	have none.  Without either, tasks whose worker was lost are retried right away, up to
+	3 attempts.  If blacklist_rate is given, workers that failed more than this fraction of
+	at least blacklist_min_tasks executions are no longer matched with tasks, as long as
+	the other workers fail at most this fraction of their executions, so tasks that fail
+	everywhere don't blacklist any worker.  If only blacklisted workers are available
+	and no task is running, they are used anyway.
+	Matchers are passed the first match_window queued tasks, or DEFAULT_MATCH_WINDOW
+	tasks if they have no match_window attribute.  A match_window of None passes a
+	PyMW_QueueView of the whole queue."""
+	
+	# Number of queued tasks passed to matchers without a match_window
+	DEFAULT_MATCH_WINDOW = 1024
+	# Number of finished tasks of a function needed before its tasks can be speculated on
+	SPECULATION_MIN_SAMPLES = 3
+	# Retries of tasks whose worker was lost, when no retry policy is set
+	LOST_WORKER_RETRY_POLICY = PyMW_RetryPolicy(max_attempts=3, backoff=0)
+	
+	def __init__(self, task_queue, interface, task_match_func, estimator=None,
+				 speculative_factor=None, max_speculative_copies=1,
+				 retry_policy=None, blacklist_rate=None, blacklist_min_tasks=5, result_cache=None, journal=None,
+				 result_store=None):
 		self._task_queue = task_queue
 		self._interface = interface
+		self._estimator = estimator
+		self._result_cache = result_cache
+		self._journal = journal
+		self._result_store = result_store
 		self._running = False
+		# Tasks staged on busy workers, in the order they will run
+		self._prefetched = {}
+		# Running executions of each task, including speculative copies
+		self._speculative_factor = speculative_factor
+		self._max_speculative_copies = max_speculative_copies
+		self._running_tasks = {}
+		self._running_lock = threading.Lock()
+		self._spec_stats = {"launched": 0, "won": 0, "wasted": 0, "wasted_time": 0.0}
+		# Executions and failures of each worker, and the time each blacklisted worker was blacklisted
+		self._retry_policy = retry_policy
+		self._blacklist_rate = blacklist_rate
+		self._blacklist_min_tasks = blacklist_min_tasks
+		self._worker_stats = {}
+		self._blacklist = {}
+		# Executions and failures of the workers which aren't blacklisted, workers which failed too
+		# often while the others didn't succeed enough to blame them, and the number of running executions
+		self._total_stats = [0, 0]
+		self._blacklist_suspects = set()
+		self._num_running = 0
+		self._num_retries = 0
+		self._pending_retries = 0
+		# Heap of [timeout time, sequence number, task, valid flag] for running tasks with a timeout
+		self._timeouts = []
+		self._timeout_seq = 0
+		self._timeout_cond = threading.Condition()
+		self._watchdog_running = False
+		self._num_timeouts = 0
 		self._interface_worker_lock = threading.Condition()
-		if task_match_func: self._task_matcher = task_match_func
-		else: self._task_matcher = self._default_task_match_func
+		if task_match_func:
+			self._task_matcher = task_match_func
+			# Matchers that keep their own task index only need the head of the queue
+			self._match_window = getattr(task_match_func, "match_window", self.DEFAULT_MATCH_WINDOW)
+			if hasattr(task_match_func, "attach"): task_match_func.attach(self)
+		else:
+			self._task_matcher = self._default_task_match_func
+			# The default matcher only looks at the first task, so don't bother copying the whole queue
+			self._match_window = 1
 	
 	def _start_scheduler(self):
 		if not self._running:
@@ -265,6 +859,11 @@ class PyMW_Scheduler:
 		return task_list[0], worker_list[0]
 	
 	def _worker_finished(self, worker):
+		# Matchers waiting for busy workers stop waiting for this one
+		try:
+			self._task_matcher.worker_finished(worker)
+		except AttributeError:
+			pass
 		self._interface_worker_lock.acquire()
 		try:
 			self._interface.worker_finished(worker)
@@ -273,24 +872,406 @@ class PyMW_Scheduler:
 		self._interface_worker_lock.notify()
 		self._interface_worker_lock.release()
 	
+	# Called by a dispatched task when it finishes
+	# If a task was prefetched on the worker it starts right away, otherwise the worker is returned
+	def _task_finished(self, task):
+		self._running_lock.acquire()
+		self._num_running -= 1
+		self._running_lock.release()
+		primary = task._primary or task
+		lost = primary._spec_done
+		if self._stop_timeout(task) and not lost:
+			task._error = TaskTimeoutException("Task "+str(task)+" did not finish within "+str(task._timeout)+" seconds")
+			task._task_state = task.TASK_ERROR
+		
+		if self._speculative_factor:
+			deliver, cancel_list = self._resolve_execution(task, primary)
+		else:
+			deliver, cancel_list = not lost, []
+		
+		# Executions of tasks that were already delivered by a speculative copy or
+		# cancelled by the user were probably stopped, so don't count them
+		if not lost: self._record_execution(task, primary)
+		if deliver and primary._task_state is primary.TASK_ERROR and self._retry_task(primary):
+			deliver = False
+		
+		if deliver and self._estimator and task._task_state is task.TASK_FINISHED:
+			try:
+				self._estimator.record(task, task._assigned_worker, task.get_execution_time())
+			except Exception as e:
+				logging.error("Runtime estimator failed to record task "+str(task)+": "+str(e))
+		if deliver and self._result_cache and primary._cache_key and primary._task_state is primary.TASK_FINISHED:
+			self._result_cache.put(primary._cache_key, (primary._output_data, primary._stdout, primary._stderr))
+		if deliver and self._journal: self._journal.task_done(primary)
+		if deliver and self._result_store is not None: self._store_result(primary)
+		if deliver: self._release_input(primary)
+		if deliver: primary._deliver()
+		for cancel_task in cancel_list:
+			self._cancel_execution(cancel_task)
+		
+		# The results of speculative copies have been read, so remove their output
+		if task is not primary:
+			try:
+				os.remove(task._output_arg)
+			except OSError:
+				pass
+		
+		worker = task._assigned_worker
+		self._interface_worker_lock.acquire()
+		staged_tasks = self._prefetched.get(worker)
+		if staged_tasks:
+			next_task = staged_tasks.pop(0)
+			if not staged_tasks: del self._prefetched[worker]
+			# Wake up the scheduler so it can stage another task on this worker
+			self._interface_worker_lock.notify()
+		else:
+			next_task = None
+		self._interface_worker_lock.release()
+		
+		if next_task: self._run_task(next_task, worker)
+		else: self._worker_finished(worker)
+	
+	# Interfaces keeping the task input in memory can drop it once the task is delivered
+	def _release_input(self, task):
+		try:
+			self._interface.pymw_master_release(task._input_arg)
+		except AttributeError:
+			pass
+	
+	# Decides what to do with a finished execution of a task that may have speculative copies
+	# Returns whether to deliver the task, and the other executions to cancel
+	def _resolve_execution(self, task, primary):
+		self._running_lock.acquire()
+		try:
+			executions = self._running_tasks.get(primary, [])
+			if task in executions: executions.remove(task)
+			if not executions: self._running_tasks.pop(primary, None)
+			
+			# Another execution already delivered the result
+			if primary._spec_done:
+				self._spec_stats["wasted"] += 1
+				self._spec_stats["wasted_time"] += time.time() - task._times["execute_time"]
+				return False, []
+			
+			# The first successful execution wins, otherwise the last failure is delivered
+			if task._task_state is task.TASK_FINISHED or not executions:
+				primary._spec_done = True
+				if task is not primary:
+					self._spec_stats["won"] += 1
+					primary._output_data = task._output_data
+					primary._stdout = getattr(task, "_stdout", None)
+					primary._stderr = getattr(task, "_stderr", None)
+					primary._error = task._error
+					primary._task_state = task._task_state
+					primary._times["finish_time"] = task._times["finish_time"]
+					logging.info("Speculative copy "+str(task)+" finished first")
+				return True, list(executions)
+			
+			# This execution failed, but another one may still succeed
+			return False, []
+		finally:
+			self._running_lock.release()
+	
+	# Move the output of a delivered task to the result store, so it isn't held in memory
+	def _store_result(self, task):
+		if task._task_state is not task.TASK_FINISHED: return
+		try:
+			if isinstance(task._output_data, PyMW_LazyResult):
+				self._result_store.put_bytes(task._task_name, task._output_data.get_bytes())
+			else:
+				self._result_store.put(task._task_name, task._output_data)
+		except Exception as e:
+			logging.error("Could not store result of task "+str(task)+": "+str(e))
+			return
+		task._output_data = None
+		task._result_stored = True
+	
+	# Stop a losing execution through the interface
+	# If the interface can't cancel tasks, the result is discarded when it finishes
+	def _cancel_execution(self, task):
+		try:
+			self._interface.cancel_task(task, task._assigned_worker)
+		except AttributeError:
+			pass
+		except Exception as e:
+			logging.error("Could not cancel task "+str(task)+": "+str(e))
+	
+	# If a running task is taking much longer than usual for its function,
+	# start a copy of it on an idle worker.  Returns the copy and worker, or None, None
+	def _speculate_task(self, worker_list):
+		if not self._speculative_factor or not self._estimator: return None, None
+		now = time.time()
+		best = None
+		self._running_lock.acquire()
+		try:
+			for primary, executions in self._running_tasks.items():
+				if primary._spec_done or len(executions) > self._max_speculative_copies: continue
+				stats = self._estimator.get_task_stats(primary)
+				if not stats or stats[2] < self.SPECULATION_MIN_SAMPLES: continue
+				
+				# Measure from the most recent execution so copies aren't started all at once
+				start_time = max([execution._times["execute_time"] for execution in executions])
+				if not start_time: continue
+				overrun = (now - start_time) / (self._speculative_factor * (stats[0] + stats[1]))
+				if overrun <= 1 or (best and overrun <= best[0]): continue
+				
+				# Don't copy a task whose progress shows it will finish before a copy would
+				remaining = [(now - execution._times["execute_time"]) * (1 - progress) / progress
+							 for execution, progress in [(e, e.get_progress()) for e in executions] if progress > 0]
+				if remaining and min(remaining) < stats[0]: continue
+				
+				# Don't copy a task to a worker already running it
+				busy_workers = [execution._assigned_worker for execution in executions]
+				idle_workers = [worker for worker in worker_list if worker is None or worker not in busy_workers]
+				if idle_workers: best = overrun, primary, idle_workers[0], len(executions)
+		finally:
+			self._running_lock.release()
+		if not best: return None, None
+		
+		overrun, primary, worker, copy_num = best
+		spec_task = copy.copy(primary)
+		spec_task._primary = primary
+		spec_task._task_name = primary._task_name+"_spec"+str(copy_num)
+		spec_task._output_arg = primary._output_arg+"_spec"+str(copy_num)
+		spec_task._times = dict(primary._times)
+		spec_task._times["execute_time"] = time.time()
+		spec_task._output_data = None
+		spec_task._error = None
+		spec_task._unstage_worker = None
+		spec_task._timeout_entry = None
+		spec_task._init_stream()
+		spec_task._assigned_worker = worker
+		try:
+			self._interface.reserve_worker(worker)
+		except:
+			pass
+		self._spec_stats["launched"] += 1
+		logging.info("Started speculative copy "+str(spec_task)+" on worker "+str(worker))
+		return spec_task, worker
+	
+	def get_speculation_stats(self):
+		"""Returns the number of speculative copies launched, copies which delivered
+		their task result first, executions that lost and the seconds spent on them."""
+		self._running_lock.acquire()
+		stats = dict(self._spec_stats)
+		self._running_lock.release()
+		return stats
+	
+	# Update the failure statistics of the worker that ran an execution of a task,
+	# and blacklist the worker if it fails too often
+	def _record_execution(self, task, primary):
+		worker = task._assigned_worker
+		failed = task._task_state is task.TASK_ERROR
+		self._running_lock.acquire()
+		try:
+			if failed:
+				primary._times["failures"].append([task._times["execute_time"], task._times["finish_time"],
+												   str(worker), str(task._error)])
+			# Interfaces without individual workers use None, which is never blacklisted
+			if worker is None: return
+			stats = self._worker_stats.setdefault(worker, [0, 0])
+			stats[0] += 1
+			if failed: stats[1] += 1
+			if worker in self._blacklist or self._blacklist_rate is None: return
+			self._total_stats[0] += 1
+			if failed: self._total_stats[1] += 1
+			self._check_blacklist(worker)
+			# Successes on other workers may show that the failures of suspects are their own
+			if not failed:
+				for suspect in list(self._blacklist_suspects): self._check_blacklist(suspect)
+		finally:
+			self._running_lock.release()
+	
+	# Blacklists a worker which fails too often, if the other workers mostly succeed
+	# Must be called with the running lock held
+	def _check_blacklist(self, worker):
+		stats = self._worker_stats[worker]
+		if stats[0] < self._blacklist_min_tasks or stats[1] <= self._blacklist_rate * stats[0]:
+			self._blacklist_suspects.discard(worker)
+			return
+		other_runs, other_failures = self._total_stats[0] - stats[0], self._total_stats[1] - stats[1]
+		if other_runs == other_failures or other_failures > self._blacklist_rate * other_runs:
+			self._blacklist_suspects.add(worker)
+			return
+		self._blacklist_suspects.discard(worker)
+		self._blacklist[worker] = time.time()
+		self._total_stats[0] -= stats[0]
+		self._total_stats[1] -= stats[1]
+		logging.warning("Blacklisted worker "+str(worker)+" after "+str(stats[1])+" failures in "+
+						str(stats[0])+" tasks")
+	
+	# If the retry policy allows it, queue a failed task again after the backoff delay
+	# Returns true if the task will be retried
+	def _retry_task(self, task):
+		policy = task._retry_policy or self._retry_policy
+		# Tasks of lost workers are retried right away, even without a retry policy
+		if not policy and isinstance(task._error, WorkerLostException): policy = self.LOST_WORKER_RETRY_POLICY
+		num_failures = len(task._times["failures"])
+		if not policy or not policy.should_retry(task._error, num_failures): return False
+		
+		delay = policy.get_delay(num_failures)
+		task._spec_done = False
+		task._task_state = task.TASK_SUBMITTED
+		task._output_data = None
+		self._running_lock.acquire()
+		self._num_retries += 1
+		self._pending_retries += 1
+		self._running_lock.release()
+		logging.info("Retrying task "+str(task)+" in "+str(delay)+" seconds after "+str(num_failures)+" failures")
+		retry_timer = threading.Timer(delay, self._requeue_task, [task])
+		retry_timer.daemon = True
+		retry_timer.start()
+		return True
+	
+	def _requeue_task(self, task):
+		self._interface_worker_lock.acquire()
+		# A task cancelled while waiting for its retry has already been delivered
+		if not task._spec_done: self._task_queue.append(task)
+		self._running_lock.acquire()
+		self._pending_retries -= 1
+		self._running_lock.release()
+		self._interface_worker_lock.notify()
+		self._interface_worker_lock.release()
+		self._start_scheduler()
+	
+	def cancel_task(self, task):
+		"""Cancels a task that has not finished yet.  Queued and prefetched tasks are
+		removed, running tasks are stopped through the interface if it supports it.
+		The task is delivered right away with a TaskCancelledException.
+		Returns True if the task was cancelled, or False if it had already finished."""
+		unstage_worker = None
+		self._interface_worker_lock.acquire()
+		try:
+			queued = self._task_queue.remove(task)
+			if not queued:
+				for worker, staged_tasks in list(self._prefetched.items()):
+					if task in staged_tasks:
+						staged_tasks.remove(task)
+						if not staged_tasks: del self._prefetched[worker]
+						unstage_worker = worker
+			
+			self._running_lock.acquire()
+			try:
+				# Tasks that were delivered, or are neither queued, waiting to retry or running, are done
+				if task._spec_done or (task._task_state in (task.TASK_FINISHED, task.TASK_ERROR) and not queued):
+					return False
+				task._spec_done = True
+				executions = self._running_tasks.pop(task, [])
+			finally:
+				self._running_lock.release()
+		finally:
+			self._interface_worker_lock.release()
+		
+		logging.info("Cancelling task "+str(task))
+		task._error = TaskCancelledException("Task "+str(task)+" was cancelled")
+		task._task_state = task.TASK_ERROR
+		task._times["finish_time"] = time.time()
+		task._deliver()
+		
+		if unstage_worker is not None:
+			try:
+				self._interface.unstage_task(task, unstage_worker)
+			except Exception as e:
+				logging.error("Could not cancel staging of task "+str(task)+": "+str(e))
+		elif not queued:
+			# Stop the running executions, which give back their workers when they finish
+			for execution in executions or [task]:
+				self._cancel_execution(execution)
+		return True
+	
+	# Start watching an execution of a task which has a timeout
+	def _start_timeout(self, task):
+		if not task._timeout: return
+		if not hasattr(self._interface, "cancel_task"):
+			logging.warning("Interface can't cancel tasks, so the timeout of task "+str(task)+" is ignored")
+			return
+		self._timeout_cond.acquire()
+		self._timeout_seq += 1
+		task._timeout_entry = [time.time()+task._timeout, self._timeout_seq, task, True]
+		heapq.heappush(self._timeouts, task._timeout_entry)
+		if not self._watchdog_running:
+			self._watchdog_running = True
+			watchdog_thread = threading.Thread(target=self._timeout_watchdog)
+			watchdog_thread.daemon = True
+			watchdog_thread.start()
+		self._timeout_cond.notify()
+		self._timeout_cond.release()
+	
+	# Stop watching an execution of a task, and return whether it timed out
+	def _stop_timeout(self, task):
+		self._timeout_cond.acquire()
+		timeout_entry = getattr(task, "_timeout_entry", None)
+		if timeout_entry: timeout_entry[3] = False
+		timed_out = task._timed_out
+		task._timed_out = False
+		self._timeout_cond.release()
+		return timed_out
+	
+	# Waits for the earliest timeout and cancels the task if it is still running
+	# The thread exits when there are no more running tasks with a timeout
+	def _timeout_watchdog(self):
+		self._timeout_cond.acquire()
+		while True:
+			while self._timeouts and not self._timeouts[0][3]:
+				heapq.heappop(self._timeouts)
+			if not self._timeouts:
+				self._watchdog_running = False
+				break
+			wait_time = self._timeouts[0][0] - time.time()
+			if wait_time > 0:
+				self._timeout_cond.wait(wait_time)
+				continue
+			
+			timed_out_task = heapq.heappop(self._timeouts)[2]
+			timed_out_task._timed_out = True
+			self._num_timeouts += 1
+			self._timeout_cond.release()
+			logging.warning("Task "+str(timed_out_task)+" timed out after "+str(timed_out_task._timeout)+" seconds")
+			self._cancel_execution(timed_out_task)
+			self._timeout_cond.acquire()
+		self._timeout_cond.release()
+	
+	def get_retry_stats(self):
+		"""Returns the number of task retries, timeouts and tasks waiting to be retried,
+		and the time at which each blacklisted worker was blacklisted."""
+		self._running_lock.acquire()
+		stats = {"retries": self._num_retries, "timeouts": self._num_timeouts, "pending_retries": self._pending_retries,
+				 "blacklisted_workers": dict([(str(worker), self._blacklist[worker]) for worker in self._blacklist])}
+		self._running_lock.release()
+		return stats
+	
 	# Returns true if the scheduler should continue running
 	def _should_scheduler_run(self):
-		return (len(self._task_queue) > 0)
+		return (len(self._task_queue) > 0 or len(self._prefetched) > 0 or self._pending_retries > 0 or
+				(self._speculative_factor and len(self._running_tasks) > 0))
 	
 	# Get a list of workers available on this interface
 	def _get_worker_list(self):
+		# Interfaces which route tasks between several backends use the queue length
+		try:
+			self._interface.set_queue_length(len(self._task_queue))
+		except AttributeError:
+			pass
 		try:
 			worker_list = self._interface.get_available_workers()
 			if not type(worker_list)==list: worker_list = [None]
 		except:
 			worker_list = [None]
+		if self._blacklist:
+			usable_list = [worker for worker in worker_list if worker not in self._blacklist]
+			# Blacklisted workers are only used if no other worker could free up
+			self._running_lock.acquire()
+			num_running = self._num_running
+			self._running_lock.release()
+			if usable_list or num_running > 0: worker_list = usable_list
 		return worker_list
 	
 	# Match a worker from the list with a task
 	# If we couldn't find the task/worker in the list, the task matcher returned an invalid value
-	def _match_worker_and_task(self, task_list, worker_list):
+	def _match_worker_and_task(self, task_list, worker_list, match_func=None):
+		if match_func is None: match_func = self._task_matcher
 		try:
-			matched_task, matched_worker = self._task_matcher(task_list, worker_list)
+			matched_task, matched_worker = match_func(task_list, worker_list)
 		except:
 			matched_worker = worker_list[0]
 			matched_task = task_list[0]
@@ -306,12 +1287,62 @@ class PyMW_Scheduler:
 
 		# Reserve the worker with the interface
 		matched_task._assigned_worker = matched_worker
-		matched_task._worker_finish_func = self._worker_finished
+		matched_task._finish_func = self._task_finished
 		try:
 			self._interface.reserve_worker(matched_worker)
 		except:
 			pass
 	
+	# If the interface supports prefetching, stage the next task on a busy worker
+	# so it can start as soon as the worker finishes its current task
+	# Returns true if a task was staged
+	def _prefetch_task(self):
+		if len(self._task_queue) == 0: return False
+		try:
+			prefetch_depths = self._interface.get_prefetch_workers()
+		except AttributeError:
+			return False
+		worker_list = [worker for worker in prefetch_depths if worker not in self._blacklist
+					   and len(self._prefetched.get(worker, ())) < prefetch_depths[worker]]
+		if not worker_list: return False
+		
+		# Matchers with a prefetch method treat the busy workers differently from idle ones
+		task_list = self._task_queue.get_data(self._match_window)
+		match_func = getattr(self._task_matcher, "prefetch", self._task_matcher)
+		matched_task, matched_worker = self._match_worker_and_task(task_list, worker_list, match_func)
+		if not matched_task: return False
+		if not self._task_queue.pop_specific(item_list=[matched_task]): return False
+		
+		matched_task._assigned_worker = matched_worker
+		matched_task._finish_func = self._task_finished
+		try:
+			self._interface.stage_task(matched_task, matched_worker)
+		except Exception as e:
+			# Staging is only an optimization, so the task will be staged when it executes
+			logging.error("Could not stage task "+str(matched_task)+": "+str(e))
+		self._prefetched.setdefault(matched_worker, []).append(matched_task)
+		logging.info("Prefetched task "+str(matched_task)+" on worker "+str(matched_worker))
+		return True
+	
+	# Move a prefetched task to the first idle worker, taking the task which would start last
+	# from the worker with the most staged tasks.  Returns the task and worker, or None, None
+	def _steal_prefetched_task(self, worker_list):
+		if not self._prefetched: return None, None
+		worker = worker_list[0]
+		staged_worker = max(self._prefetched, key=lambda w: len(self._prefetched[w]))
+		stolen_task = self._prefetched[staged_worker].pop()
+		if not self._prefetched[staged_worker]: del self._prefetched[staged_worker]
+		
+		# The staging is cancelled by the executor thread, since it may have to wait for it to finish
+		stolen_task._unstage_worker = staged_worker
+		stolen_task._assigned_worker = worker
+		try:
+			self._interface.reserve_worker(worker)
+		except:
+			pass
+		logging.info("Moved prefetched task "+str(stolen_task)+" to idle worker "+str(worker))
+		return stolen_task, worker
+	
 	# Lets the interface know that no workers matched, and checks if it should try again immediately
 	# Otherwise, it waits until a worker has finished or 1 second has passed (whichever is first)
 	def _wait_for_worker(self):
@@ -351,10 +1382,20 @@ class PyMW_Scheduler:
 			# If none are available, then wait a little and try again
 			worker_list = self._get_worker_list()
 			if len(worker_list) == 0:
-				self._wait_for_worker()
+				if not self._prefetch_task(): self._wait_for_worker()
 				self._interface_worker_lock.release()
 				continue
-			task_list = self._task_queue.get_data()
+			
+			# If the queue is empty, an idle worker takes over a prefetched task
+			# or runs a speculative copy of a straggling task
+			if len(self._task_queue) == 0:
+				next_task, next_worker = self._steal_prefetched_task(worker_list)
+				if not next_task: next_task, next_worker = self._speculate_task(worker_list)
+				if not next_task: self._wait_for_worker()
+				self._interface_worker_lock.release()
+				if next_task: self._run_task(next_task, next_worker)
+				continue
+			task_list = self._task_queue.get_data(self._match_window)
 			
 			# Try to match one of the tasks with one of the workers
 			# If no suitable match is found, wait a little and try again
@@ -374,25 +1415,54 @@ class PyMW_Scheduler:
 			finally:
 				self._interface_worker_lock.release()
 
-			# Wait until other tasks have been submitted and the thread count decreases,
-			# otherwise we might pass the process resource limitations
-			while threading.activeCount() > 100:
-				time.sleep(0.1)
-			
-			# Execute the task on the interface with the given worker
-			logging.info("Executing task "+str(matched_task))
-			task_thread = threading.Thread(target=self._task_executor,
-										   args=(self._interface.execute_task, matched_task, matched_worker))
-			task_thread.start()
+			self._run_task(matched_task, matched_worker)
 		
 		logging.info("PyMW_Scheduler finished")
 		self._running = False
 	
+	# Execute the task on the interface with the given worker in a new thread,
+	# unless the interface can start it without blocking
+	def _run_task(self, task, worker):
+		try:
+			start_task_func = self._interface.start_task
+		except AttributeError:
+			start_task_func = None
+		
+		# Wait until other tasks have been submitted and the thread count decreases,
+		# otherwise we might pass the process resource limitations
+		while not start_task_func and threading.active_count() > 100:
+			time.sleep(0.1)
+		
+		self._running_lock.acquire()
+		self._num_running += 1
+		if self._speculative_factor: self._running_tasks.setdefault(task._primary or task, []).append(task)
+		self._running_lock.release()
+		
+		logging.info("Executing task "+str(task))
+		if start_task_func:
+			self._task_executor(start_task_func, task, worker)
+			return
+		task_thread = threading.Thread(target=self._task_executor,
+									   args=(self._interface.execute_task, task, worker))
+		task_thread.start()
+	
 	# Use this wrapper function to catch any interface exceptions,
 	# otherwise we can get hanging threads
 	def _task_executor(self, execute_task_func, next_task, worker):
 		try:
+			# Cancel the staging of a prefetched task that was moved to another worker
+			unstage_worker = getattr(next_task, "_unstage_worker", None)
+			if unstage_worker is not None:
+				next_task._unstage_worker = None
+				try:
+					self._interface.unstage_task(next_task, unstage_worker)
+				except Exception as e:
+					logging.error("Could not cancel staging of task "+str(next_task)+": "+str(e))
 			next_task._times["execute_time"] = time.time()
+			next_task._task_state = next_task.TASK_RUNNING
+			next_task._start_stream()
+			if self._journal: self._journal.task_dispatched((next_task._primary or next_task)._task_name, worker)
+			self._start_timeout(next_task)
 			execute_task_func(next_task, worker)
 		except Exception as e:
 			next_task.task_finished(e)
@@ -402,7 +1472,11 @@ class PyMW_Scheduler:
 
 class PyMW_Master:
 	"""Provides functions for users to submit tasks to the underlying interface."""
-	def __init__(self, interface=None, loglevel=logging.CRITICAL, delete_files=True, scheduler_func=None):
+	def __init__(self, interface=None, loglevel=logging.CRITICAL, delete_files=True, scheduler_func=None,
+				 queue_policy=PyMW_TaskQueue.POLICY_PRIORITY, estimator=None,
+				 speculative_factor=None, max_speculative_copies=1,
+				 retry_policy=None, blacklist_rate=None, blacklist_min_tasks=5, result_cache=None,
+				 journal=None, resume=None, result_store=None, lazy_results=False):
 		logging.basicConfig(level=loglevel, format="%(asctime)s %(levelname)s %(message)s")
 
 		if interface:
@@ -416,7 +1490,9 @@ class PyMW_Master:
 		
 		self._start_time_str = str(int(time.time()))
 		self._submitted_tasks = []
-		self._queued_tasks = PyMW_List()
+		# Set of the submitted tasks, so checking task lists costs O(1) per task
+		self._submitted_task_set = set()
+		self._queued_tasks = PyMW_TaskQueue(queue_policy)
 		self._finished_tasks = PyMW_List()
 		
 		self._delete_files = delete_files
@@ -437,7 +1513,40 @@ class PyMW_Master:
 		except OSError as e:
 			if e.errno != errno.EEXIST: raise
 
-		self._scheduler = PyMW_Scheduler(self._queued_tasks, self._interface, scheduler_func)
+		# The runtime estimator learns task execution times, and can be used by scheduler_func
+		if estimator: self._estimator = estimator
+		else: self._estimator = PyMW_RuntimeEstimator()
+		
+		# Results of tasks with the same functions, modules, data files and input are reused
+		# result_cache can be a PyMW_ResultCache or the name of a cache directory
+		if result_cache and not isinstance(result_cache, PyMW_ResultCache):
+			result_cache = PyMW_ResultCache(result_cache)
+		self._result_cache = result_cache
+		
+		# Tasks are journaled so the computation can be resumed if the master is restarted
+		# Resumed masters reuse the start time of the journal, so tasks get the same names
+		# journal can be a PyMW_Journal, which the program closes with completed=True when it is done
+		if isinstance(journal, PyMW_Journal): self._journal = journal
+		elif resume: self._journal = PyMW_Journal(resume, resume=True)
+		elif journal: self._journal = PyMW_Journal(journal)
+		else: self._journal = None
+		if self._journal:
+			if self._journal.get_start_time(): self._start_time_str = self._journal.get_start_time()
+			else: self._journal.start(self._start_time_str)
+		
+		# Outputs of finished tasks are kept on disk in result_store until get_result reads them
+		# result_store can be a PyMW_ResultStore or the name of a directory, which is removed on cleanup
+		self._own_result_store = result_store is not None and not isinstance(result_store, PyMW_ResultStore)
+		if self._own_result_store: result_store = PyMW_ResultStore(result_store)
+		self._result_store = result_store
+		
+		# With lazy_results, get_result returns a PyMW_LazyResult which unpickles the result when used
+		self._lazy_results = lazy_results
+		
+		self._scheduler = PyMW_Scheduler(self._queued_tasks, self._interface, scheduler_func, self._estimator,
+										 speculative_factor, max_speculative_copies,
+										 retry_policy, blacklist_rate, blacklist_min_tasks, result_cache, self._journal,
+										 result_store)
 		atexit.register(self._cleanup, None, None)
 		#signal.signal(signal.SIGKILL, self._cleanup)
 	
@@ -449,7 +1558,7 @@ class PyMW_Master:
 		
 		# If the interface doesn't provide methods for communicating with the workers, use default functions
 		all_funcs = (main_func,)+dep_funcs
-		all_funcs += (self._pymw_worker_manager, self.pymw_emit_result, )
+		all_funcs += (self._pymw_worker_manager, self.pymw_emit_result, pymw_encode_record, self._pymw_send_record, self.pymw_set_progress, )
 		try:
 			all_funcs += (self._interface.pymw_worker_read, self._interface.pymw_worker_write)
 		except AttributeError:
@@ -472,7 +1581,7 @@ class PyMW_Master:
 			func_sources = [textwrap.dedent(inspect.getsource(func)) for func in all_funcs]
 			self._function_source[func_hash] = [main_func.__name__, func_sources, file_name]
 		else:
-			return
+			return func_hash
 
 		# Create an archive of required modules
 		self._archive_files(modules, True)
@@ -486,8 +1595,10 @@ class PyMW_Master:
 		run_options = {}
 		if file_input: run_options["file_input"] = True
 		if data_file_zip_name: run_options["arch_file"] = data_file_zip_name
+		if self._lazy_results: run_options["raw_result"] = True
 		func_file.write("_pymw_worker_manager("+func_data[0]+", "+repr(run_options)+")\n")
 		func_file.close()
+		return func_hash
 		
 	def _archive_files(self, data_files, is_modules=False):
 		if len(data_files) == 0: return None
@@ -535,14 +1646,23 @@ class PyMW_Master:
 				raise TaskException("Function requires either a task, a list of tasks, or None")
 		
 		# Check that the task(s) have been submitted before
-		submit_intersect = set(self._submitted_tasks) & set(task_list)
-		if len(submit_intersect) != len(task_list):
-			raise TaskException("Task has not been submitted")
+		for t in task_list:
+			if t not in self._submitted_task_set:
+				raise TaskException("Task has not been submitted")
 		
-	def submit_task(self, executable, input_data=None, modules=(), dep_funcs=(), data_files=(), input_from_file=False):
+	def submit_task(self, executable, input_data=None, modules=(), dep_funcs=(), data_files=(), input_from_file=False,
+					priority=0, deadline=None, cost=None, retry_policy=None, timeout=None):
 		"""Creates and submits a task to the internal list for execution.
 		Returns the created task for later use.
-		executable can be either a filename (Python script) or a function."""
+		executable can be either a filename (Python script) or a function.
+		Tasks with a higher priority are dispatched first.  deadline is the number
+		of seconds after submission by which the task should be finished, and is
+		used to order tasks under the "deadline" queue policy.
+		cost is a hint of the execution time of the task on an average worker,
+		used by schedulers until the runtime estimator has learned better.
+		retry_policy is a PyMW_RetryPolicy for this task, overriding that of the master.
+		If an execution of the task takes more than timeout seconds, it is stopped and
+		fails with a TaskTimeoutException, after which it may be retried."""
 		
 		# Check if the executable is a Python function or a script
 		if hasattr(executable, '__call__'):
@@ -580,8 +1700,15 @@ class PyMW_Master:
 			mod_arch_file_name = None
 		
 		# Setup the necessary files
-		if hasattr(executable, '__call__'):
-			self._setup_exec_file(exec_file_name, executable, modules, dep_funcs, input_from_file, zip_arch_file_name)
+		# Interfaces which call functions in the master process don't need a worker script,
+		# except for the function sources in the result cache key
+		try:
+			in_process = self._interface.pymw_in_process
+		except AttributeError:
+			in_process = False
+		func_hash = None
+		if hasattr(executable, '__call__') and (not in_process or self._result_cache):
+			func_hash = self._setup_exec_file(exec_file_name, executable, modules, dep_funcs, input_from_file, zip_arch_file_name)
 		
 		try:
 			store_func = self._interface.pymw_master_write
@@ -590,19 +1717,119 @@ class PyMW_Master:
 			store_func = self.pymw_master_write
 			get_result_func = self.pymw_master_read
 		
+		# Look up the result in the cache, keyed by the task and dependent function sources
+		# Tasks reading their input from files aren't cached, since the file contents may change
+		cache_key, cache_hit = None, False
+		if self._result_cache and func_hash is not None and not input_from_file:
+			func_sources = self._function_source[func_hash][1][:1+len(dep_funcs)]
+			cache_key = self._result_cache.get_key(func_sources, modules, data_files, input_data)
+			if cache_key: cache_hit, cached_result = self._result_cache.get(cache_key)
+		# A resumed task that already finished is restored from its output file,
+		# and one that is still running on the interface is reattached to it
+		journal_state = None
+		if self._journal and not cache_hit:
+			input_hash = self._journal.get_input_hash(input_data)
+			journal_state, journal_output = self._journal.get_task_state(task_name, input_hash)
+			if journal_state == PyMW_Journal.FINISHED:
+				cache_hit, cached_result = self._read_journaled_result(journal_output, get_result_func)
+				if not cache_hit: journal_state = None
+		# Restored tasks don't need their input stored
+		if cache_hit: store_func = self._store_nothing
+		
 		new_task = PyMW_Task(task_name=task_name, executable=executable, executable_name=exec_file_name,
 							 store_data_func=store_func, get_result_func=get_result_func,
 							 finished_queue=self._finished_tasks, input_data=input_data,
 							 file_loc=self._task_dir_name, data_file_zip=zip_arch_file,
 							 modules_file_zip=mod_arch_file, file_input=input_from_file,
-							 raw_exec=executable)
+							 raw_exec=executable, priority=priority, deadline=deadline, cost=cost,
+							 retry_policy=retry_policy, timeout=timeout, keep_output=journal_state is not None)
 		
+		new_task._lazy_result = self._lazy_results
+		# Interfaces which pass tasks on to other masters submit them with the same options
+		new_task._submit_options = {"modules": modules, "dep_funcs": dep_funcs, "data_files": data_files,
+									"input_from_file": input_from_file}
 		self._submitted_tasks.append(new_task)
+		self._submitted_task_set.add(new_task)
+		if journal_state == PyMW_Journal.FINISHED:
+			self._journal.task_restored()
+		elif journal_state == PyMW_Journal.DISPATCHED and self._reattach_task(new_task):
+			return new_task
+		if cache_hit:
+			logging.info("Restored result of task "+str(new_task))
+			new_task._output_data, new_task._stdout, new_task._stderr = cached_result
+			if self._lazy_results: new_task._output_data = PyMW_LazyResult(pickle.dumps(new_task._output_data, 2))
+			new_task._error = None
+			new_task._task_state = new_task.TASK_FINISHED
+			new_task._times["execute_time"] = new_task._times["finish_time"] = time.time()
+			if self._result_store is not None: self._scheduler._store_result(new_task)
+			new_task._deliver()
+			return new_task
+		new_task._cache_key = cache_key
+		if self._journal: self._journal.task_submitted(task_name, input_hash)
 		self._queued_tasks.append(item=new_task)
 		self._scheduler._start_scheduler()
 		
 		return new_task
 		
+	# Returns True and the result of a journaled task from its output file,
+	# or False, None if the output can't be read
+	def _read_journaled_result(self, output_file, get_result_func):
+		for read_func in (self._journal.read_result, get_result_func, self.pymw_master_read):
+			try:
+				result = read_func(output_file)
+				if result is None: continue
+				output_data, stdout, stderr = result
+				return True, (output_data, stdout, stderr)
+			except Exception:
+				pass
+		return False, None
+	
+	# Lets the interface watch a task that was running when the previous master stopped
+	# Returns False if the interface can't reattach to the task
+	def _reattach_task(self, task):
+		try:
+			reattach_func = self._interface.reattach_task
+		except AttributeError:
+			return False
+		task._finish_func = self._reattached_task_finished
+		task._times["execute_time"] = time.time()
+		task._task_state = task.TASK_RUNNING
+		try:
+			reattached = reattach_func(task)
+		except Exception as e:
+			logging.error("Could not reattach task "+str(task)+": "+str(e))
+			reattached = False
+		if not reattached:
+			del task._finish_func
+			task._task_state = task.TASK_SUBMITTED
+			return False
+		logging.info("Reattached task "+str(task))
+		self._journal.task_restored(reattached=True)
+		return True
+	
+	def _reattached_task_finished(self, task):
+		self._journal.task_done(task)
+		if self._result_store is not None: self._scheduler._store_result(task)
+		task._deliver()
+	
+	def cancel(self, task):
+		"""Cancels a task or a list of tasks.  Queued tasks are removed from the queue
+		and running tasks are stopped if the interface supports it.  get_result raises
+		a TaskCancelledException for cancelled tasks.
+		Returns the number of tasks that were cancelled, excluding already finished tasks."""
+		if type(task)==list:
+			task_list = task
+		else:
+			task_list = [task]
+		
+		# Check that the task(s) are of type PyMW_Task and have been submitted before
+		self._check_task_list(task_list)
+		
+		num_cancelled = 0
+		for cancel_task in task_list:
+			if self._scheduler.cancel_task(cancel_task): num_cancelled += 1
+		return num_cancelled
+	
 	def get_result(self, task=None, blocking=True):
 		"""Gets the result of the executed task.
 		If task is None, return the result of the next finished task.
@@ -623,15 +1850,85 @@ class PyMW_Master:
 		
 		if not my_task:
 			return None, None
+		my_task._result_fetched = True
 
 		if my_task._error:
 			raise my_task._error
 		
-		return my_task, my_task._output_data
+		return my_task, self._task_result(my_task)
 	
-	def get_progress(self, task):
-		if not task:
-			task_list = []
+	# Drops a task whose result was passed on, so masters running many tasks don't keep them all
+	def _forget_task(self, task):
+		self._submitted_task_set.discard(task)
+		try:
+			self._submitted_tasks.remove(task)
+		except ValueError:
+			pass
+		task.cleanup(self._delete_files)
+	
+	def _task_result(self, task):
+		if task._result_stored and self._lazy_results:
+			file_name, offset, length = self._result_store.get_location(task._task_name)
+			return PyMW_LazyResult(file_name=file_name, offset=offset, length=length)
+		elif task._result_stored:
+			return self._result_store.get(task._task_name)
+		return task._output_data
+	
+	def stream(self, task):
+		"""Yields the results a task emits with pymw_emit_result as soon as the interface
+		delivers them.  Generator functions emit each item they yield, and other functions
+		their result.  The generic, multicore and MPI interfaces stream results while the task
+		runs, with other interfaces the result of the task is yielded when it finishes.
+		Results emitted by failed executions of a retried task are also yielded, unless the
+		task was delivered before they were read.  Once the task is delivered its emitted
+		results are only kept in its result, which the rest of the stream is read from.
+		If the task fails, its error is raised after the emitted results.
+		Unlike get_result, the task stays in the finished queue."""
+		self._check_task_list([task])
+		# Number of the next item in the stream of the task
+		next_item = 0
+		while True:
+			task._stream_cond.acquire()
+			try:
+				while next_item >= task._stream_base + len(task._stream_items) and not task._stream_done:
+					task._stream_cond.wait()
+				if not task._stream_base <= next_item < task._stream_base + len(task._stream_items): break
+				item = task._stream_items[next_item - task._stream_base]
+			finally:
+				task._stream_cond.release()
+			next_item += 1
+			yield item
+		
+		if task._error: raise task._error
+		if task._stream_result is None:
+			yield self._task_result(task)
+		elif next_item < task._stream_base:
+			# The streamed result holds the items of the last execution
+			result = self._task_result(task)
+			if isinstance(result, PyMW_LazyResult): result = result.get()
+			if task._stream_result == "item": result = [result]
+			for item in result[max(next_item - task._stream_start, 0):]:
+				yield item
+	
+	def iter_results(self, task_list=None):
+		"""Yields (task, result) pairs as tasks finish, until all the tasks in task_list
+		(by default all submitted tasks whose results weren't fetched yet) are done.
+		Like get_result, raises the error of a task that failed."""
+		if task_list is None:
+			task_list = [task for task in self._submitted_tasks if not task._result_fetched]
+		else:
+			task_list = list(task_list)
+		while task_list:
+			my_task, result = self.get_result(task_list)
+			task_list.remove(my_task)
+			yield my_task, result
+	
+	def get_progress(self, task=None):
+		"""Returns a list of the progress of each task, between 0 and 1.
+		task can be a task or a list of tasks, and if it is None the progress of
+		all submitted tasks is returned, in the order they were submitted."""
+		if task is None:
+			task_list = list(self._submitted_tasks)
 		elif type(task)==list:
 			task_list = task
 		else:
@@ -652,18 +1949,34 @@ class PyMW_Master:
 		self._scheduler._interface_worker_lock.release()
 		if not type(status)==dict: status = {"interface_status": "error"}
 		status["tasks"] = self._submitted_tasks
+		status["queue_wait"] = self._queued_tasks.get_wait_stats()
+		status["speculation"] = self._scheduler.get_speculation_stats()
+		status["retries"] = self._scheduler.get_retry_stats()
+		if self._result_cache: status["result_cache"] = self._result_cache.get_stats()
+		if self._journal: status["journal"] = self._journal.get_stats()
+		if self._result_store is not None: status["result_store"] = self._result_store.get_stats()
 		return status
 
 	def _cleanup(self, signum, frame):
 		self._scheduler._exit()
 		
+		if self._journal: self._journal.close()
+		if self._own_result_store: self._result_store.close(self._delete_files)
+		
+		try:
+			self._estimator.save()
+		except Exception as e:
+			logging.error("Could not save runtime model: "+str(e))
+		
 		try:
 			self._interface._cleanup()
 		except AttributeError:
 			pass
 		
+		# Until the journaled run is completed, output files are kept so a resumed master can restore them
+		keep_output = self._journal is not None and not self._journal.is_completed()
 		for task in self._submitted_tasks:
-			task.cleanup(self._delete_files)
+			task.cleanup(self._delete_files, keep_output)
 		
 		if self._delete_files:
 			for exec_file in self._function_source:
@@ -697,6 +2010,9 @@ class PyMW_Master:
 		infile.close()
 		return obj
 	
+	def _store_nothing(self, output, loc):
+		pass
+	
 	def pymw_master_write(self, output, loc):
 		import os
 		outfile = open(loc, 'wb')
@@ -720,15 +2036,48 @@ class PyMW_Master:
 		outfile.close()
 
 	def pymw_set_progress(prog_ratio):
-		return
+		global _pymw_progress_time
+		import time
+		# Updates are sent at most every 0.2 seconds, except for the last one
+		now = time.time()
+		if now - _pymw_progress_time < 0.2 and prog_ratio < 1: return
+		_pymw_progress_time = now
+		progress_str = "%.4f" % min(max(prog_ratio, 0.0), 1.0)
+		if _pymw_stream_file:
+			_pymw_send_record("P", progress_str.encode("ascii"))
+		elif len(sys.argv) > 2:
+			# Write the progress next to the output file, replacing it atomically
+			# Condor and BOINC jobs run in their own directory, so the master never sees this file
+			import os
+			progress_file = open(sys.argv[2]+".progress.tmp", "w")
+			progress_file.write(progress_str)
+			progress_file.close()
+			os.rename(sys.argv[2]+".progress.tmp", sys.argv[2]+".progress")
 	
 	def pymw_emit_result(result):
 		global _res_array
-		_res_array.append(result)
+		# Results are sent right away if the interface streams them, otherwise they are kept
+		if _pymw_stream_file:
+			_pymw_send_record("R", pickle.dumps(result, 2))
+			_res_array.append(None)
+		else:
+			_res_array.append(result)
+	
+	def _pymw_send_record(record_type, data):
+		_pymw_stream_file.write(pymw_encode_record(record_type, data))
+		_pymw_stream_file.flush()
 	
 	def _pymw_worker_manager(func_name_to_call, options):
-		global _res_array
+		global _res_array, _res_list, _pymw_stream_file, _pymw_progress_time
+		import os
 		_res_array = []
+		_res_list = False
+		_pymw_progress_time = 0
+		# Interfaces which read the stdout of the worker set PYMW_STREAM to have results streamed
+		if os.environ.get("PYMW_STREAM"):
+			_pymw_stream_file = getattr(sys.__stdout__, "buffer", sys.__stdout__)
+		else:
+			_pymw_stream_file = None
 		try:
 			# Redirect stdout and stderr
 			old_stdout = sys.stdout
@@ -761,8 +2110,20 @@ class PyMW_Master:
 			sys.stdout = old_stdout
 			sys.stderr = old_stderr
 			# The interface is responsible for cleanup, so don't bother deleting the archive files
-			# TODO: modify this to deal with other options (multiple results, etc)
-			pymw_worker_write([_res_array[0], out_str, err_str], options)
+			# The result is the list of emitted results, unless a single result was emitted by a function
+			multiple_results = _res_list or len(_res_array) != 1
+			if _pymw_stream_file:
+				# The master builds the result from the streamed results
+				if multiple_results: _pymw_send_record("S", b"list")
+				else: _pymw_send_record("S", b"item")
+				result = None
+			elif multiple_results:
+				result = _res_array
+			else:
+				result = _res_array[0]
+			# A raw result is pickled separately, so the master can pass it on without unpickling it
+			if "raw_result" in options and not _pymw_stream_file: result = pickle.dumps(result, 2)
+			pymw_worker_write([result, out_str, err_str], options)
 		except Exception as e:
 			sys.stdout = old_stdout
 			sys.stderr = old_stderr
@@ -770,13 +2131,19 @@ class PyMW_Master:
 			exit(e)
 		
 	def pymw_worker_func(func_name_to_call, options):
+		global _res_list
 		# Get the input data
 		input_data = pymw_worker_read(options)
 		if not input_data: input_data = ()
 		# Execute the worker function
 		result = func_name_to_call(*input_data)
-		# Output the result
-		pymw_emit_result(result)
+		# Generator functions emit each result they yield, otherwise output the result
+		import types
+		if isinstance(result, types.GeneratorType):
+			_res_list = True
+			for item in result: pymw_emit_result(item)
+		else:
+			pymw_emit_result(result)
 
 class PyMW_MapReduce:
 	def __init__(self, master):
@@ -816,6 +2183,7 @@ class PyMW_MapReduce:
 										   file_loc=self._task_dir_name)
 		
 		self._master._submitted_tasks.append(new_maintask)
+		self._master._submitted_task_set.add(new_maintask)
 		#start mapreduce_thread 
 		thread1 = threading.Thread(target=self.mapreduce_thread, args=(new_maintask, exec_map, exec_reduce, num_worker, input_data, modules, dep_funcs,red_worker,file_input))
 		thread1.start()
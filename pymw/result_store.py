@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""Provide an on-disk store for PyMW task results, so large result sets
+don't have to fit in memory.
+"""
+
+import collections
+import os
+import pickle
+import shutil
+import threading
+
+class PyMW_ResultStore:
+	"""Keeps task results in segment files in store_dir.  Results are appended
+	to the current segment until it grows beyond segment_bytes, and an index
+	file next to each segment records the key, offset and length of each result.
+	Results can be looked up by key, or iterated over in the order they were
+	stored while only one result at a time is held in memory.
+	If store_dir already contains a store, its results are kept."""
+
+	def __init__(self, store_dir, segment_bytes=1<<26):
+		self._store_dir = store_dir
+		self._segment_bytes = segment_bytes
+		self._lock = threading.Lock()
+		# Location of each result as (segment number, offset, length), in the order they were stored
+		self._index = collections.OrderedDict()
+		# Number of results in each segment which haven't been removed
+		self._segment_counts = {}
+		self._num_bytes = 0
+		if not os.path.exists(store_dir): os.makedirs(store_dir)
+
+		segment_nums = [int(file_name[4:-4]) for file_name in os.listdir(store_dir)
+						if file_name.startswith("seg_") and file_name.endswith(".idx")]
+		for segment_num in sorted(segment_nums):
+			self._load_index(segment_num)
+		for segment_num in segment_nums:
+			if self._segment_counts[segment_num] == 0: self._delete_segment(segment_num)
+		if segment_nums: self._segment_num = max(segment_nums) + 1
+		else: self._segment_num = 0
+		self._segment_file = None
+		self._index_file = None
+
+	def _segment_name(self, segment_num, ext):
+		return os.path.join(self._store_dir, "seg_%06d.%s" % (segment_num, ext))
+
+	# Index records are "key offset length" lines, where a removed result has offset -1
+	def _load_index(self, segment_num):
+		self._segment_counts[segment_num] = 0
+		index_file = open(self._segment_name(segment_num, "idx"), "r")
+		for line in index_file:
+			if not line.endswith("\n"): break
+			key, offset, length = line[:-1].rsplit(" ", 2)
+			offset, length = int(offset), int(length)
+			if key in self._index:
+				# A removed result, or one replaced by a later segment
+				self._drop(key, False)
+			if offset >= 0:
+				self._index[key] = (segment_num, offset, length)
+				self._segment_counts[segment_num] += 1
+				self._num_bytes += length
+		index_file.close()
+
+	# Opens a new segment if there is none or the current one is full
+	# Must be called with the lock held
+	def _open_segment(self):
+		if self._segment_file and self._segment_file.tell() < self._segment_bytes: return
+		if self._segment_file:
+			self._segment_file.close()
+			self._index_file.close()
+			self._segment_num += 1
+		self._segment_file = open(self._segment_name(self._segment_num, "dat"), "ab")
+		self._index_file = open(self._segment_name(self._segment_num, "idx"), "a")
+		self._segment_counts.setdefault(self._segment_num, 0)
+
+	# Must be called with the lock held
+	def _drop(self, key, delete_empty=True):
+		segment_num, offset, length = self._index.pop(key)
+		self._num_bytes -= length
+		self._segment_counts[segment_num] -= 1
+		# Delete segments without any results left, unless they are still being written
+		if delete_empty and self._segment_counts[segment_num] == 0 and \
+				not (self._segment_file and segment_num == self._segment_num):
+			self._delete_segment(segment_num)
+
+	def _delete_segment(self, segment_num):
+		del self._segment_counts[segment_num]
+		for ext in ("dat", "idx"):
+			try:
+				os.remove(self._segment_name(segment_num, ext))
+			except OSError:
+				pass
+
+	def put(self, key, result):
+		"""Stores result under key, replacing any result already stored under it."""
+		self.put_bytes(key, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+
+	def put_bytes(self, key, result_str):
+		"""Stores an already pickled result under key."""
+		key = str(key)
+		self._lock.acquire()
+		try:
+			self._open_segment()
+			offset = self._segment_file.tell()
+			self._segment_file.write(result_str)
+			self._segment_file.flush()
+			self._index_file.write("%s %d %d\n" % (key, offset, len(result_str)))
+			self._index_file.flush()
+			if key in self._index: self._drop(key)
+			self._index[key] = (self._segment_num, offset, len(result_str))
+			self._segment_counts[self._segment_num] += 1
+			self._num_bytes += len(result_str)
+		finally:
+			self._lock.release()
+
+	def get(self, key):
+		"""Returns the result stored under key.  Raises KeyError if there is none."""
+		file_name, offset, length = self.get_location(key)
+		segment_file = open(file_name, "rb")
+		try:
+			segment_file.seek(offset)
+			return pickle.loads(segment_file.read(length))
+		finally:
+			segment_file.close()
+
+	def get_location(self, key):
+		"""Returns the segment file name, offset and length of the pickled result stored under key.
+		Raises KeyError if there is none."""
+		self._lock.acquire()
+		try:
+			segment_num, offset, length = self._index[str(key)]
+		finally:
+			self._lock.release()
+		return self._segment_name(segment_num, "dat"), offset, length
+
+	def remove(self, key):
+		"""Removes the result stored under key.  Segments are deleted once all their results are removed."""
+		key = str(key)
+		self._lock.acquire()
+		try:
+			if key not in self._index: return
+			# Removals are recorded in the index of the segment holding the result
+			segment_num = self._index[key][0]
+			if self._index_file and segment_num == self._segment_num:
+				self._index_file.write("%s -1 0\n" % key)
+				self._index_file.flush()
+			else:
+				index_file = open(self._segment_name(segment_num, "idx"), "a")
+				index_file.write("%s -1 0\n" % key)
+				index_file.close()
+			self._drop(key)
+		finally:
+			self._lock.release()
+
+	def __contains__(self, key):
+		return str(key) in self._index
+
+	def __len__(self):
+		return len(self._index)
+
+	def keys(self):
+		"""Returns the keys of the stored results, in the order they were stored."""
+		self._lock.acquire()
+		try:
+			return list(self._index.keys())
+		finally:
+			self._lock.release()
+
+	def iter_results(self):
+		"""Yields (key, result) pairs in the order the results were stored.
+		Results stored during the iteration are not included."""
+		for key in self.keys():
+			try:
+				yield key, self.get(key)
+			except KeyError:
+				pass
+
+	def get_stats(self):
+		"""Returns the number of stored results, their total size in bytes and the number of segments."""
+		self._lock.acquire()
+		try:
+			return {"num_results": len(self._index), "num_bytes": self._num_bytes,
+					"num_segments": len(self._segment_counts)}
+		finally:
+			self._lock.release()
+
+	def close(self, delete=False):
+		"""Closes the store, and deletes its directory if delete is True."""
+		self._lock.acquire()
+		try:
+			if self._segment_file:
+				self._segment_file.close()
+				self._index_file.close()
+				self._segment_file = self._index_file = None
+			if delete: shutil.rmtree(self._store_dir, ignore_errors=True)
+		finally:
+			self._lock.release()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+"""Provide task matching heuristics for use as the PyMW_Master scheduler_func.
+"""
+
+import bisect
+import heapq
+import math
+import threading
+import time
+
+class PyMW_Matcher:
+	"""Base class for task matchers that keep their own index of queued tasks.
+	Tasks are grouped into classes of tasks with the same function, input size bucket
+	and (roughly) the same cost hint, which are expected to take the same time.  The
+	index is updated as tasks enter and leave the queue, so choosing a match costs
+	time proportional to the number of task classes and idle workers rather than the
+	number of queued tasks.
+	Execution times come from the PyMW_RuntimeEstimator of the master, unless another
+	estimator is given.  If speed_func is given, it is called with a worker and should
+	return the relative speed of the worker, and execution times are estimated as the
+	average worker estimate divided by the worker speed.
+	When there are more than exact_limit class/worker pairs, the execution time of a
+	class on a worker is approximated by the class estimate scaled by the worker speed.
+	Like the batch mode heuristics, matchers take the expected ready time of busy workers
+	into account: a task is held back if one of the lookahead busy workers that will be
+	ready soonest is expected to finish it earlier than the idle worker it would get.
+	A worker which overran its expected ready time is expected to take as long again,
+	and workers the scheduler reports as finished are no longer waited for.
+	Tasks staged on busy workers are matched through prefetch, which extends the
+	expected ready time of the worker instead of restarting it.
+	The base class gives the class whose first task was submitted first to its fastest
+	idle worker, and subclasses implement other heuristics by overriding _rank.
+	clock returns the current time, and should be replaced when simulating."""
+
+	match_window = 1
+
+	def __init__(self, estimator=None, speed_func=None, exact_limit=4096, clock=time.time, lookahead=32):
+		self._estimator = estimator
+		self._speed_func = speed_func
+		self._exact_limit = exact_limit
+		self._clock = clock
+		self._lookahead = lookahead
+		self._lock = threading.Lock()
+		self._classes = {}
+		self._task_class = {}
+		self._next_seq = 0
+		# Expected ready times of the workers this matcher gave tasks to
+		self._busy = {}
+		self._busy_heap = []
+
+	def attach(self, scheduler):
+		"""Called by PyMW_Scheduler to connect the matcher to the task queue."""
+		if self._estimator is None: self._estimator = scheduler._estimator
+		scheduler._task_queue.add_listener(self)
+
+	# Cost hints are grouped in buckets with about 10% resolution
+	def _class_key(self, task):
+		if self._estimator: size_bucket = self._estimator.get_size_bucket(task)
+		else: size_bucket = None
+		cost = task._cost
+		if cost is not None and cost > 0: cost = int(round(math.log(cost)*8))
+		return task._func_name, size_bucket, cost
+
+	def task_added(self, task):
+		if not hasattr(task, "_func_name"): return
+		key = self._class_key(task)
+		self._lock.acquire()
+		try:
+			# Each class is a heap of tasks, longest cost hint first, then submission order
+			task_class = self._classes.setdefault(key, [[], 0])
+			cost = task._cost or 0
+			self._next_seq += 1
+			heapq.heappush(task_class[0], (-cost, self._next_seq, task))
+			task_class[1] += 1
+			self._task_class[task] = key
+		finally:
+			self._lock.release()
+
+	def task_removed(self, task):
+		self._lock.acquire()
+		try:
+			key = self._task_class.pop(task, None)
+			if key is None: return
+			task_class = self._classes[key]
+			task_class[1] -= 1
+			if task_class[1] == 0: del self._classes[key]
+		finally:
+			self._lock.release()
+
+	# Returns the first task of a class which is still queued
+	# Must be called with the lock held
+	def _class_head(self, key):
+		task_heap = self._classes[key][0]
+		while self._task_class.get(task_heap[0][2]) != key:
+			heapq.heappop(task_heap)
+		return task_heap[0][2]
+
+	def _speed(self, worker):
+		if self._speed_func: return self._speed_func(worker)
+		if self._estimator: return 1.0/self._estimator.get_worker_factor(worker)
+		return 1.0
+
+	def _estimate(self, task, worker=None):
+		if self._speed_func:
+			est = self._base_estimate(task)
+			if worker is not None: est /= self._speed_func(worker)
+			return est
+		est = None
+		if self._estimator: est = self._estimator.estimate(task, worker)
+		if est is None:
+			est = task._cost or 1.0
+			if worker is not None: est /= self._speed(worker)
+		return est
+
+	def _base_estimate(self, task):
+		est = None
+		if self._estimator: est = self._estimator.estimate(task)
+		if est is None: est = task._cost or 1.0
+		return est
+
+	# Returns a dictionary of the estimated execution time of each class on each worker
+	# With a speed_func the estimates are separable, so the base estimate is only computed once per class
+	def _class_estimates(self, heads, worker_list):
+		if not self._speed_func and len(heads)*len(worker_list) <= self._exact_limit:
+			return dict([(key, [self._estimate(heads[key], worker) for worker in worker_list]) for key in heads])
+		speeds = [self._speed(worker) for worker in worker_list]
+		estimates = {}
+		for key in heads:
+			base = self._base_estimate(heads[key])
+			estimates[key] = [base/speed for speed in speeds]
+		return estimates
+
+	# Returns True if a busy worker is expected to finish the task sooner than exec_time
+	# from now, even after finishing the task it is running
+	# Must be called with the lock held
+	def _should_wait(self, task, exec_time, now):
+		for ready_time, seq, worker in heapq.nsmallest(self._lookahead, self._busy_heap):
+			if self._busy.get(worker) != ready_time: continue
+			# Workers which overran their estimate are expected to take as long again
+			if ready_time < now: wait_time = now - ready_time
+			else: wait_time = ready_time - now
+			if wait_time >= exec_time: continue
+			if wait_time + self._estimate(task, worker) < exec_time: return True
+		return False
+
+	def worker_finished(self, worker):
+		"""Called by PyMW_Scheduler when a worker finishes its task, so tasks no longer
+		wait for it, even if it isn't listed as idle again."""
+		self._lock.acquire()
+		self._busy.pop(worker, None)
+		self._lock.release()
+
+	def __call__(self, task_list, worker_list):
+		return self._match(worker_list, prefetch=False)
+
+	def prefetch(self, task_list, worker_list):
+		"""Called by PyMW_Scheduler to match a task to be staged on one of the busy
+		workers in worker_list.  The task starts once the worker finishes its queued
+		tasks, so its execution time is added to the expected ready time of the worker."""
+		return self._match(worker_list, prefetch=True)
+
+	def _match(self, worker_list, prefetch):
+		self._lock.acquire()
+		try:
+			now = self._clock()
+			if not prefetch:
+				for worker in worker_list:
+					self._busy.pop(worker, None)
+			heads = dict([(key, self._class_head(key)) for key in self._classes])
+			if len(heads) == 0 or len(worker_list) == 0:
+				return None, None
+			for key, worker, exec_time in self._rank(heads, worker_list):
+				# Staged tasks don't hold back, since the worker they go to is busy itself
+				if not prefetch and self._lookahead and self._should_wait(heads[key], exec_time, now): continue
+				# Remember when the worker is expected to be ready again
+				ready_time = now
+				if prefetch: ready_time = max(self._busy.get(worker, now), now)
+				self._busy[worker] = ready_time + exec_time
+				self._next_seq += 1
+				heapq.heappush(self._busy_heap, (ready_time + exec_time, self._next_seq, worker))
+				if len(self._busy_heap) > 2*len(self._busy) + 64:
+					self._busy_heap = [e for e in self._busy_heap if self._busy.get(e[2]) == e[0]]
+					heapq.heapify(self._busy_heap)
+				return heads[key], worker
+			return None, None
+		finally:
+			self._lock.release()
+
+	def _rank(self, heads, worker_list):
+		"""Returns a list of (task class key, worker, estimated execution time) tuples
+		in order of preference, given a dictionary of the first task of each class
+		and a list of idle workers."""
+		best = _best_workers(self._class_estimates(heads, worker_list))
+		best.sort(key=lambda b: heads[b[0]]._times["submit_time"])
+		return [(key, worker_list[w_ind], exec_time) for key, w_ind, exec_time in best]
+
+def _min_index(values):
+	return min(range(len(values)), key=values.__getitem__)
+
+# Returns the best worker for each class as (class key, worker index, execution time)
+def _best_workers(estimates):
+	best = []
+	for key in estimates:
+		w_ind = _min_index(estimates[key])
+		best.append((key, w_ind, estimates[key][w_ind]))
+	return best
+
+class MinMinMatcher(PyMW_Matcher):
+	"""Matches the task with the smallest minimum execution time to the worker achieving it."""
+	def _rank(self, heads, worker_list):
+		best = _best_workers(self._class_estimates(heads, worker_list))
+		best.sort(key=lambda b: b[2])
+		return [(key, worker_list[w_ind], exec_time) for key, w_ind, exec_time in best]
+
+class MaxMinMatcher(PyMW_Matcher):
+	"""Matches the task with the largest minimum execution time to the worker achieving it."""
+	def _rank(self, heads, worker_list):
+		best = _best_workers(self._class_estimates(heads, worker_list))
+		best.sort(key=lambda b: -b[2])
+		return [(key, worker_list[w_ind], exec_time) for key, w_ind, exec_time in best]
+
+class SufferageMatcher(PyMW_Matcher):
+	"""Matches the task that would suffer most from not getting its best worker,
+	measured as the difference between its best and second best execution time.
+	Ties (such as when only one worker is idle) go to the longest task."""
+	def _rank(self, heads, worker_list):
+		estimates = self._class_estimates(heads, worker_list)
+		ranked = []
+		for key, w_ind, exec_time in _best_workers(estimates):
+			if len(worker_list) > 1: sufferage = sorted(estimates[key])[1] - exec_time
+			else: sufferage = 0
+			ranked.append((sufferage, exec_time, key, w_ind))
+		ranked.sort(key=lambda r: (-r[0], -r[1]))
+		return [(key, worker_list[w_ind], exec_time) for sufferage, exec_time, key, w_ind in ranked]
+
+class LPTMatcher(PyMW_Matcher):
+	"""Longest processing time first: matches the task with the longest average
+	execution time to the worker that would finish it soonest."""
+	def _rank(self, heads, worker_list):
+		estimates = self._class_estimates(heads, worker_list)
+		ranked = []
+		for key in sorted(heads, key=lambda k: -self._base_estimate(heads[k])):
+			w_ind = _min_index(estimates[key])
+			ranked.append((key, worker_list[w_ind], estimates[key][w_ind]))
+		return ranked
+
+class SpeedProportionalMatcher(PyMW_Matcher):
+	"""Matches workers to tasks in proportion to their speed.  Queued task classes are
+	ranked by execution time and each idle worker gets a task from the class whose rank
+	corresponds to the rank of the worker speed among all workers seen so far, so fast
+	workers get the long tasks and slow workers the short ones."""
+	def __init__(self, estimator=None, speed_func=None, exact_limit=4096, clock=time.time, lookahead=0):
+		PyMW_Matcher.__init__(self, estimator, speed_func, exact_limit, clock, lookahead)
+		self._known_speeds = []
+		self._known_workers = set()
+
+	def _rank(self, heads, worker_list):
+		for worker in worker_list:
+			if worker not in self._known_workers:
+				self._known_workers.add(worker)
+				bisect.insort(self._known_speeds, self._speed(worker))
+		# Pick the fastest idle worker and find its speed rank
+		speeds = [self._speed(worker) for worker in worker_list]
+		w_ind = max(range(len(speeds)), key=speeds.__getitem__)
+		# Workers with equal speeds share the middle of their rank range
+		rank = (bisect.bisect_left(self._known_speeds, speeds[w_ind]) + bisect.bisect_right(self._known_speeds, speeds[w_ind]) - 1)/2.0
+		if len(self._known_speeds) > 1: quantile = rank/float(len(self._known_speeds)-1)
+		else: quantile = 1.0
+		ordered_keys = sorted(heads, key=lambda k: self._base_estimate(heads[k]))
+		key = ordered_keys[min(int(round(quantile*(len(ordered_keys)-1))), len(ordered_keys)-1)]
+		return [(key, worker_list[w_ind], self._estimate(heads[key], worker_list[w_ind]))]
+
+class LocalityMatcher:
+	"""Prefers matching tasks to workers that already hold the data they need.
+	Interfaces report the data held by a worker through an optional
+	get_worker_data(worker) method, and tasks list the data they need in _data_keys.
+	If no idle worker holds the data of a task but a busy worker does, the task
+	waits up to delay seconds for that worker (delay scheduling) before it is sent
+	to a cold worker, and the next of the first window queued tasks is considered
+	instead.  Tasks without data, or whose data no worker holds yet, are matched
+	immediately."""
+
+	def __init__(self, delay=1.0, clock=time.time, window=64):
+		self.match_window = window
+		self._delay = delay
+		self._clock = clock
+		self._lock = threading.Lock()
+		self._interface = None
+		self._next_seq = 0
+		# Queued tasks needing each data key, as heaps in queue order
+		self._key_tasks = {}
+		self._queued = {}
+		# Workers each data key was last seen on, and the data each worker was last seen with
+		self._holders = {}
+		self._worker_keys = {}
+		# Time at which each task started waiting for a local worker
+		self._wait_start = {}
+
+	def attach(self, scheduler):
+		"""Called by PyMW_Scheduler to connect the matcher to the task queue and interface."""
+		self._interface = scheduler._interface
+		scheduler._task_queue.add_listener(self)
+
+	def task_added(self, task):
+		keys = getattr(task, "_data_keys", ())
+		self._lock.acquire()
+		try:
+			self._next_seq += 1
+			self._queued[task] = self._next_seq
+			for key in keys:
+				heapq.heappush(self._key_tasks.setdefault(key, []), (self._next_seq, task))
+		finally:
+			self._lock.release()
+
+	def task_removed(self, task):
+		self._lock.acquire()
+		try:
+			self._queued.pop(task, None)
+			self._wait_start.pop(task, None)
+		finally:
+			self._lock.release()
+
+	# Returns the first queued task needing key, or None
+	# Must be called with the lock held
+	def _first_task(self, key):
+		task_heap = self._key_tasks.get(key)
+		while task_heap and self._queued.get(task_heap[0][1]) != task_heap[0][0]:
+			heapq.heappop(task_heap)
+		if not task_heap:
+			self._key_tasks.pop(key, None)
+			return None
+		return task_heap[0][1]
+
+	def _update_worker_data(self, worker, keys):
+		for key in self._worker_keys.get(worker, ()):
+			if key not in keys: self._holders.get(key, set()).discard(worker)
+		for key in keys:
+			self._holders.setdefault(key, set()).add(worker)
+		self._worker_keys[worker] = set(keys)
+
+	def _get_worker_data(self, worker):
+		try:
+			return set(self._interface.get_worker_data(worker))
+		except Exception:
+			return set()
+
+	def __call__(self, task_list, worker_list):
+		if len(task_list) == 0 or len(worker_list) == 0: return None, None
+		worker_data = [(worker, self._get_worker_data(worker)) for worker in worker_list]
+		self._lock.acquire()
+		try:
+			# Match the oldest task that has its data on an idle worker
+			best = None
+			for worker, keys in worker_data:
+				self._update_worker_data(worker, keys)
+				for key in keys:
+					task = self._first_task(key)
+					if task is not None and (best is None or self._queued[task] < best[0]):
+						best = self._queued[task], task, worker
+			if best:
+				return self._assign(best[1], best[2])
+			
+			# Otherwise tasks wait for a busy worker holding their data, up to the delay,
+			# and the first task which doesn't wait goes to the worker holding the least data
+			now = self._clock()
+			for task in task_list:
+				keys = getattr(task, "_data_keys", ())
+				held_elsewhere = [key for key in keys if self._holders.get(key)]
+				if held_elsewhere:
+					wait_start = self._wait_start.setdefault(task, now)
+					if now - wait_start < self._delay: continue
+				cold_worker = min(worker_data, key=lambda wd: len(wd[1]))[0]
+				return self._assign(task, cold_worker)
+			return None, None
+		finally:
+			self._lock.release()
+
+	# The worker will hold the task data once it has run the task
+	# Must be called with the lock held
+	def _assign(self, task, worker):
+		keys = self._worker_keys.setdefault(worker, set())
+		for key in getattr(task, "_data_keys", ()):
+			keys.add(key)
+			self._holders.setdefault(key, set()).add(worker)
+		return task, worker
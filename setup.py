@@ -14,6 +14,7 @@ setup(name='pymw',
       license="MIT License",
       platforms=["any"],
       packages=['pymw', 'pymw.interfaces'],
+      scripts=['scripts/pymw-worker'],
       package_dir={'pymw': 'pymw'},
       package_data={'pymw': ['interfaces/pymw_run.exe',] },
      )
@@ -0,0 +1,123 @@
+import pickle
+import sys
+import zipfile
+import traceback
+import io
+def err_worker():
+	return 0/0
+def _pymw_worker_manager(func_name_to_call, options):
+	global _res_array, _res_list, _pymw_stream_file, _pymw_progress_time
+	import os
+	_res_array = []
+	_res_list = False
+	_pymw_progress_time = 0
+	# Interfaces which read the stdout of the worker set PYMW_STREAM to have results streamed
+	if os.environ.get("PYMW_STREAM"):
+		_pymw_stream_file = getattr(sys.__stdout__, "buffer", sys.__stdout__)
+	else:
+		_pymw_stream_file = None
+	try:
+		# Redirect stdout and stderr
+		old_stdout = sys.stdout
+		old_stderr = sys.stderr
+
+		if sys.version_info[0] > 2:
+			sys.stdout = io.StringIO()
+			sys.stderr = io.StringIO()
+		else:
+			sys.stdout = StringIO.StringIO()
+			sys.stderr = StringIO.StringIO()
+
+		# If there is a zip file, unzip the contents
+		if "arch_file" in options:
+			data_arch = zipfile.PyZipFile(file=options["arch_file"], mode='r')
+			archive_files = data_arch.namelist()
+			for file_name in archive_files:
+				decompressed_file = open(file_name, "wb")
+				decompressed_file.write(data_arch.read(file_name))
+				decompressed_file.close()
+			data_arch.close()
+		# Call the worker function
+		pymw_worker_func(func_name_to_call, options)
+		# Get any stdout/stderr printed during the worker execution
+		out_str = sys.stdout.getvalue()
+		err_str = sys.stderr.getvalue()
+		sys.stdout.close()
+		sys.stderr.close()
+		# Revert stdout/stderr to originals
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		# The interface is responsible for cleanup, so don't bother deleting the archive files
+		# The result is the list of emitted results, unless a single result was emitted by a function
+		multiple_results = _res_list or len(_res_array) != 1
+		if _pymw_stream_file:
+			# The master builds the result from the streamed results
+			if multiple_results: _pymw_send_record("S", b"list")
+			else: _pymw_send_record("S", b"item")
+			result = None
+		elif multiple_results:
+			result = _res_array
+		else:
+			result = _res_array[0]
+		# A raw result is pickled separately, so the master can pass it on without unpickling it
+		if "raw_result" in options and not _pymw_stream_file: result = pickle.dumps(result, 2)
+		pymw_worker_write([result, out_str, err_str], options)
+	except Exception as e:
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		traceback.print_exc()
+		exit(e)
+def pymw_emit_result(result):
+	global _res_array
+	# Results are sent right away if the interface streams them, otherwise they are kept
+	if _pymw_stream_file:
+		_pymw_send_record("R", pickle.dumps(result, 2))
+		_res_array.append(None)
+	else:
+		_res_array.append(result)
+def pymw_encode_record(record_type, data):
+	"""Returns a record with the given type and data."""
+	return (record_type+"%010d" % len(data)).encode("ascii")+data
+def _pymw_send_record(record_type, data):
+	_pymw_stream_file.write(pymw_encode_record(record_type, data))
+	_pymw_stream_file.flush()
+def pymw_set_progress(prog_ratio):
+	global _pymw_progress_time
+	import time
+	# Updates are sent at most every 0.2 seconds, except for the last one
+	now = time.time()
+	if now - _pymw_progress_time < 0.2 and prog_ratio < 1: return
+	_pymw_progress_time = now
+	progress_str = "%.4f" % min(max(prog_ratio, 0.0), 1.0)
+	if _pymw_stream_file:
+		_pymw_send_record("P", progress_str.encode("ascii"))
+	elif len(sys.argv) > 2:
+		# Write the progress next to the output file, replacing it atomically
+		import os
+		progress_file = open(sys.argv[2]+".progress.tmp", "w")
+		progress_file.write(progress_str)
+		progress_file.close()
+		os.rename(sys.argv[2]+".progress.tmp", sys.argv[2]+".progress")
+def pymw_worker_read(options):
+	return pickle.loads(_pymw_input)
+def pymw_worker_write(output, options):
+	import os
+	# The master closes the pipe once the task is done
+	out_file = os.fdopen(_pymw_output_fd, "wb", closefd=False)
+	pickle.Pickler(out_file, 2).dump(output)
+	out_file.close()
+def pymw_worker_func(func_name_to_call, options):
+	global _res_list
+	# Get the input data
+	input_data = pymw_worker_read(options)
+	if not input_data: input_data = ()
+	# Execute the worker function
+	result = func_name_to_call(*input_data)
+	# Generator functions emit each result they yield, otherwise output the result
+	import types
+	if isinstance(result, types.GeneratorType):
+		_res_list = True
+		for item in result: pymw_emit_result(item)
+	else:
+		pymw_emit_result(result)
+_pymw_worker_manager(err_worker, {})
@@ -0,0 +1,83 @@
+import pickle
+import sys
+import zipfile
+import traceback
+import io
+def flaky_worker(counter_file, num_failures):
+	import os
+	if os.path.exists("bad_worker"):
+		raise Exception("bad worker")
+	counter = open(counter_file, "a+")
+	counter.seek(0)
+	num_runs = len(counter.read())
+	counter.write("x")
+	counter.close()
+	if num_runs < num_failures:
+		raise Exception("flaky failure")
+	return num_runs
+def _pymw_worker_manager(func_name_to_call, options):
+	global _res_array
+	_res_array = []
+	try:
+		# Redirect stdout and stderr
+		old_stdout = sys.stdout
+		old_stderr = sys.stderr
+
+		if sys.version_info[0] > 2:
+			sys.stdout = io.StringIO()
+			sys.stderr = io.StringIO()
+		else:
+			sys.stdout = StringIO.StringIO()
+			sys.stderr = StringIO.StringIO()
+
+		# If there is a zip file, unzip the contents
+		if "arch_file" in options:
+			data_arch = zipfile.PyZipFile(file=options["arch_file"], mode='r')
+			archive_files = data_arch.namelist()
+			for file_name in archive_files:
+				decompressed_file = open(file_name, "wb")
+				decompressed_file.write(data_arch.read(file_name))
+				decompressed_file.close()
+			data_arch.close()
+		# Call the worker function
+		pymw_worker_func(func_name_to_call, options)
+		# Get any stdout/stderr printed during the worker execution
+		out_str = sys.stdout.getvalue()
+		err_str = sys.stderr.getvalue()
+		sys.stdout.close()
+		sys.stderr.close()
+		# Revert stdout/stderr to originals
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		# The interface is responsible for cleanup, so don't bother deleting the archive files
+		# TODO: modify this to deal with other options (multiple results, etc)
+		pymw_worker_write([_res_array[0], out_str, err_str], options)
+	except Exception as e:
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		traceback.print_exc()
+		exit(e)
+def pymw_emit_result(result):
+	global _res_array
+	_res_array.append(result)
+def pymw_worker_read(options):
+	infile = open(sys.argv[1], 'rb')
+	obj = pickle.Unpickler(infile).load()
+	infile.close()
+	return obj
+def pymw_worker_write(output, options):
+	import os
+	outfile = open(sys.argv[2], 'wb')
+	pickle.Pickler(outfile).dump(output)
+	outfile.flush()
+	os.fsync(outfile.fileno())
+	outfile.close()
+def pymw_worker_func(func_name_to_call, options):
+	# Get the input data
+	input_data = pymw_worker_read(options)
+	if not input_data: input_data = ()
+	# Execute the worker function
+	result = func_name_to_call(*input_data)
+	# Output the result
+	pymw_emit_result(result)
+_pymw_worker_manager(flaky_worker, {})
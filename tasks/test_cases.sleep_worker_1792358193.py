@@ -0,0 +1,75 @@
+import pickle
+import sys
+import zipfile
+import traceback
+import io
+def sleep_worker(secs):
+	import time
+	time.sleep(secs)
+	return secs
+def _pymw_worker_manager(func_name_to_call, options):
+	global _res_array
+	_res_array = []
+	try:
+		# Redirect stdout and stderr
+		old_stdout = sys.stdout
+		old_stderr = sys.stderr
+
+		if sys.version_info[0] > 2:
+			sys.stdout = io.StringIO()
+			sys.stderr = io.StringIO()
+		else:
+			sys.stdout = StringIO.StringIO()
+			sys.stderr = StringIO.StringIO()
+
+		# If there is a zip file, unzip the contents
+		if "arch_file" in options:
+			data_arch = zipfile.PyZipFile(file=options["arch_file"], mode='r')
+			archive_files = data_arch.namelist()
+			for file_name in archive_files:
+				decompressed_file = open(file_name, "wb")
+				decompressed_file.write(data_arch.read(file_name))
+				decompressed_file.close()
+			data_arch.close()
+		# Call the worker function
+		pymw_worker_func(func_name_to_call, options)
+		# Get any stdout/stderr printed during the worker execution
+		out_str = sys.stdout.getvalue()
+		err_str = sys.stderr.getvalue()
+		sys.stdout.close()
+		sys.stderr.close()
+		# Revert stdout/stderr to originals
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		# The interface is responsible for cleanup, so don't bother deleting the archive files
+		# TODO: modify this to deal with other options (multiple results, etc)
+		pymw_worker_write([_res_array[0], out_str, err_str], options)
+	except Exception as e:
+		sys.stdout = old_stdout
+		sys.stderr = old_stderr
+		traceback.print_exc()
+		exit(e)
+def pymw_emit_result(result):
+	global _res_array
+	_res_array.append(result)
+def pymw_worker_read(options):
+	# Pickles are binary, so use the underlying byte stream in Python 3
+	return pickle.Unpickler(getattr(sys.stdin, "buffer", sys.stdin)).load()
+def pymw_worker_write(output, options):
+	if "file_input" in options:
+		outfile = open(sys.argv[2], 'wb')
+		pickle.Pickler(outfile).dump(output[0])
+		outfile.close()
+		output[0]=None
+	outfile = getattr(sys.stdout, "buffer", sys.stdout)
+	outfile.write(pickle.dumps(output))
+	outfile.flush()
+def pymw_worker_func(func_name_to_call, options):
+	# Get the input data
+	input_data = pymw_worker_read(options)
+	if not input_data: input_data = ()
+	# Execute the worker function
+	result = func_name_to_call(*input_data)
+	# Output the result
+	pymw_emit_result(result)
+_pymw_worker_manager(sleep_worker, {})
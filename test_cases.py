@@ -1,12 +1,17 @@
 from pymw import *
 from pymw import interfaces
+from pymw import schedulers
 import unittest
 import sys
 import threading
 import os
 import signal
+import subprocess
 import tempfile
 import logging
+import time
+import pickle
+import shutil
 
 # TODO: add test for sending archives of files
 # TODO: add test for sending modules
@@ -39,6 +44,93 @@ def square(list1):
 def plus(list2):
 	return sum(list2)
 
+# Function to test tasks of different lengths
+def sleep_worker(secs):
+	import time
+	time.sleep(secs)
+	return secs
+
+# Function to test speculative execution, which is slow only the first time it runs
+def straggler_worker(marker_file, secs):
+	import os, time
+	if not os.path.exists(marker_file):
+		open(marker_file, "w").close()
+		time.sleep(secs)
+	return secs
+
+# Function to test retries, which fails until it has been run num_failures times
+# and always fails on workers with a bad_worker file
+def flaky_worker(counter_file, num_failures):
+	import os
+	if os.path.exists("bad_worker"):
+		raise Exception("bad worker")
+	counter = open(counter_file, "a+")
+	counter.seek(0)
+	num_runs = len(counter.read())
+	counter.write("x")
+	counter.close()
+	if num_runs < num_failures:
+		raise Exception("flaky failure")
+	return num_runs
+
+# Function to test streaming, which waits for the master to receive its first result
+def stream_worker(marker_file):
+	import os, time
+	yield 1
+	while not os.path.exists(marker_file):
+		time.sleep(0.01)
+	yield 2
+
+def progress_worker(marker_file):
+	import os, time
+	pymw_set_progress(0.5)
+	while not os.path.exists(marker_file):
+		time.sleep(0.01)
+	return 1
+
+# State of the master, which tasks of the fork interface see as it was when they were forked
+fork_state = {"value": 0}
+
+def fork_worker(num):
+	return fork_state["value"] + num
+
+def append_worker(obj_list, progress):
+	pymw_set_progress(progress)
+	obj_list.append(len(obj_list))
+	return obj_list
+
+# Interface simulating a batch system, on which tasks keep running while the master is restarted
+class BatchInterface:
+	def __init__(self):
+		self.reattached = []
+	
+	def execute_task(self, task, worker):
+		pass
+	
+	def reattach_task(self, task):
+		self.reattached.append(task)
+		input_data = pymw.PyMW_Master.pymw_master_read(None, task._input_arg)
+		outfile = open(task._output_arg, "wb")
+		pickle.Pickler(outfile).dump((input_data[0], "", ""))
+		outfile.close()
+		task.task_finished()
+		return True
+
+# Interface without a worker list, like Condor, which runs every task at once after a delay
+class DelayInterface:
+	def __init__(self, delay):
+		self.delay = delay
+	
+	def execute_task(self, task, worker):
+		def run_task():
+			time.sleep(self.delay)
+			input_data = pymw.PyMW_Master.pymw_master_read(None, task._input_arg)
+			outfile = open(task._output_arg, "wb")
+			pickle.Pickler(outfile).dump((input_data[0], "", ""))
+			outfile.close()
+			task.task_finished()
+		threading.Thread(target=run_task).start()
+
 def check_files(file_list):
 	for fname in file_list:
 		fp = open(fname, "r")
@@ -84,6 +176,110 @@ class BadInterface:
 		elif self.status_err == 2:
 			raise Exception()
 
+# In-memory stand-in for mpi4py, whose spawned workers run worker_func in threads
+# Messages are kept in the mailbox of their destination with the rank of their source
+class FakeMPIStatus:
+	def Get_source(self):
+		return self.source
+	
+	def Get_tag(self):
+		return self.tag
+
+class FakeMPIComm:
+	def __init__(self, rank, remote_size, mailbox, remote_mailboxes):
+		self._rank = rank
+		self._remote_size = remote_size
+		self._mailbox = mailbox
+		self._remote_mailboxes = remote_mailboxes
+		self.sent = []
+		self.num_probes = 0
+	
+	def Get_rank(self):
+		return self._rank
+	
+	def Get_remote_size(self):
+		return self._remote_size
+	
+	def send(self, obj, dest, tag):
+		self.sent.append((dest, tag, obj))
+		cond, messages = self._remote_mailboxes[dest]
+		cond.acquire()
+		messages.append((self._rank, tag, pickle.loads(pickle.dumps(obj))))
+		cond.notify_all()
+		cond.release()
+	
+	def Send(self, buf, dest, tag):
+		self.send(bytes(buf[0]), dest, tag)
+	
+	def _find(self, source, tag):
+		for index, (msg_source, msg_tag, obj) in enumerate(self._mailbox[1]):
+			if source in (-1, msg_source) and tag in (-1, msg_tag): return index
+		return None
+	
+	def Iprobe(self, source, tag, status=None):
+		self.num_probes += 1
+		cond, messages = self._mailbox
+		cond.acquire()
+		try:
+			index = self._find(source, tag)
+			if index is None: return False
+			if status: status.source, status.tag = messages[index][0], messages[index][1]
+			return True
+		finally:
+			cond.release()
+	
+	def recv(self, source, tag):
+		cond, messages = self._mailbox
+		cond.acquire()
+		try:
+			while self._find(source, tag) is None: cond.wait()
+			return messages.pop(self._find(source, tag))[2]
+		finally:
+			cond.release()
+	
+	def Recv(self, buf, source, tag):
+		buf[0][:] = self.recv(source, tag)
+	
+	def Disconnect(self):
+		pass
+
+class FakeMPI:
+	ANY_SOURCE = -1
+	ANY_TAG = -1
+	BYTE = None
+	THREAD_FUNNELED = 1
+	THREAD_MULTIPLE = 3
+	Status = FakeMPIStatus
+	
+	def __init__(self, worker_func, thread_level=3):
+		self.COMM_SELF = self.Comm = self
+		self._worker_func = worker_func
+		self._thread_level = thread_level
+		self._local = threading.local()
+		self.workers = []
+	
+	def Spawn(self, executable, args, maxprocs):
+		master_mailbox = (threading.Condition(), [])
+		worker_mailboxes = dict([(rank, (threading.Condition(), [])) for rank in range(maxprocs)])
+		self.comm = FakeMPIComm(0, maxprocs, master_mailbox, worker_mailboxes)
+		for rank in range(maxprocs):
+			worker_comm = FakeMPIComm(rank, 1, worker_mailboxes[rank], {0: master_mailbox})
+			thread = threading.Thread(target=self._run_worker, args=(worker_comm,))
+			thread.daemon = True
+			thread.start()
+			self.workers.append(thread)
+		return self.comm
+	
+	def _run_worker(self, comm):
+		self._local.comm = comm
+		self._worker_func()
+	
+	def Get_parent(self):
+		return self._local.comm
+	
+	def Query_thread(self):
+		return self._thread_level
+
 class TestBadInterface(unittest.TestCase):
 	def setUp(self):
 		self.bad_int = BadInterface()
@@ -129,6 +325,1140 @@ class TestBadInterface(unittest.TestCase):
 		except Exception as e:
 			self.assert_(e.args[0].count("no problem")>0)
 
+class TestTaskQueue(unittest.TestCase):
+	class QueueItem:
+		def __init__(self, priority=0, deadline=None):
+			self._priority = priority
+			self._deadline = deadline
+			self._times = {"submit_time": 0}
+	
+	def testPriorityOrder(self):
+		"""Checking that tasks are dispatched by priority, then in submission order"""
+		queue = pymw.PyMW_TaskQueue()
+		items = [self.QueueItem(priority=p) for p in (0, 5, 0, 10, 5)]
+		for item in items: queue.append(item)
+		self.assertEqual(queue.get_data(), [items[3], items[1], items[4], items[0], items[2]])
+		self.assertEqual(queue.get_data(1), [items[3]])
+		self.assertEqual(queue.pop(), items[3])
+		self.assertEqual(len(queue), 4)
+	
+	def testDeadlineOrder(self):
+		"""Checking that the deadline policy dispatches the earliest deadline first"""
+		queue = pymw.PyMW_TaskQueue(pymw.PyMW_TaskQueue.POLICY_DEADLINE)
+		items = [self.QueueItem(deadline=d) for d in (30, None, 10, 20)]
+		for item in items: queue.append(item)
+		self.assertEqual([queue.pop() for i in range(4)], [items[2], items[3], items[0], items[1]])
+		self.assertEqual(queue.pop(), None)
+	
+	def testLazyRemoval(self):
+		"""Checking that removed and specifically popped tasks are skipped"""
+		queue = pymw.PyMW_TaskQueue()
+		items = [self.QueueItem(priority=i) for i in range(200)]
+		for item in items: queue.append(item)
+		for item in items[100:]: self.assertTrue(queue.remove(item))
+		self.assertFalse(queue.remove(items[150]))
+		self.assertEqual(queue.pop_specific([items[150], items[50]]), items[50])
+		self.assertFalse(queue.contains(items[50]))
+		self.assertEqual(len(queue), 99)
+		self.assertEqual(queue.pop(), items[99])
+		stats = queue.get_wait_stats()
+		self.assertEqual(stats[99]["num_dispatched"], 1)
+		self.assertEqual(stats[98]["num_queued"], 1)
+	
+	def testQueueView(self):
+		"""Checking that the whole queue is returned in dispatch order without sorting it up front"""
+		queue = pymw.PyMW_TaskQueue()
+		items = [self.QueueItem(priority=(i*37)%100) for i in range(100)]
+		for item in items: queue.append(item)
+		for item in items[::3]: queue.remove(item)
+		expected = sorted(items[1::3]+items[2::3], key=lambda item: (-item._priority, items.index(item)))
+		view = queue.get_data()
+		self.assertEqual(view[0], expected[0])
+		self.assertEqual(len(view._items), 1)
+		self.assertEqual(len(view), len(expected))
+		self.assertEqual(list(view), expected)
+		self.assertEqual(view[-1], expected[-1])
+		self.assertEqual(queue.get_data(5), expected[:5])
+		self.assertEqual(queue.get_data(500), expected)
+		# Matchers without a match_window get the head of the queue, not all of it
+		scheduler = pymw.PyMW_Scheduler(queue, interfaces.threaded.ThreadInterface(), lambda tasks, workers: (None, None))
+		self.assertEqual(scheduler._match_window, scheduler.DEFAULT_MATCH_WINDOW)
+
+class TestRuntimeEstimator(unittest.TestCase):
+	class EstimateTask:
+		def __init__(self, func_name, size=0):
+			self._func_name = func_name
+			self.input_data = (size,)
+	
+	def testWorkerEstimates(self):
+		"""Checking that per-function and per-worker estimates are learned"""
+		estimator = pymw.PyMW_RuntimeEstimator(alpha=0.5)
+		task = self.EstimateTask("f")
+		self.assertEqual(estimator.estimate(task, "w1"), None)
+		estimator.record(task, "w1", 1.0)
+		estimator.record(task, "w2", 4.0)
+		self.assertEqual(estimator.estimate(task, "w1"), 1.0)
+		self.assertEqual(estimator.estimate(task, "w2"), 4.0)
+		self.assertEqual(estimator.estimate(task), 2.5)
+		self.assertEqual(estimator.get_worker_factor("w2"), 4.0)
+		# A function never run on w2 is estimated with the worker speed factor
+		other_task = self.EstimateTask("g")
+		estimator.record(other_task, "w1", 2.0)
+		self.assertEqual(estimator.estimate(other_task, "w2"), 8.0)
+	
+	def testSizeBuckets(self):
+		"""Checking that input size buckets are estimated separately"""
+		estimator = pymw.PyMW_RuntimeEstimator(size_func=lambda task: task.input_data[0])
+		estimator.record(self.EstimateTask("f", 10), "w1", 1.0)
+		estimator.record(self.EstimateTask("f", 1000), "w1", 100.0)
+		self.assertEqual(estimator.estimate(self.EstimateTask("f", 12)), 1.0)
+		self.assertEqual(estimator.estimate(self.EstimateTask("f", 900)), 100.0)
+		self.assertEqual(estimator.get_function_stats("f")[2], 2)
+	
+	def testSaveModel(self):
+		"""Checking that a saved model is loaded by a new estimator"""
+		model_fd, model_file = tempfile.mkstemp()
+		os.close(model_fd)
+		os.remove(model_file)
+		estimator = pymw.PyMW_RuntimeEstimator(model_file=model_file)
+		estimator.record(self.EstimateTask("f"), "w1", 3.0)
+		estimator.save()
+		new_estimator = pymw.PyMW_RuntimeEstimator(model_file=model_file)
+		os.remove(model_file)
+		self.assertEqual(new_estimator.estimate(self.EstimateTask("f"), "w1"), 3.0)
+	
+	def testStableWorkerNames(self):
+		"""Checking that workers of a new interface have the names the model knows them by"""
+		for interface_class in (interfaces.multicore.MulticoreInterface, interfaces.fork.ForkInterface):
+			estimator = pymw.PyMW_RuntimeEstimator()
+			old_interface, new_interface = interface_class(num_workers=2), interface_class(num_workers=2)
+			estimator.record(self.EstimateTask("f"), old_interface.get_available_workers()[0], 1.0)
+			estimator.record(self.EstimateTask("f"), old_interface.get_available_workers()[1], 3.0)
+			self.assertEqual(estimator.estimate(self.EstimateTask("f"), new_interface.get_available_workers()[1]), 3.0)
+			for interface in (old_interface, new_interface): interface._cleanup()
+
+class TestSchedulers(unittest.TestCase):
+	class SchedTask:
+		def __init__(self, cost):
+			self._func_name = "f"
+			self._cost = cost
+			self._priority = 0
+			self._times = {"submit_time": 0}
+	
+	class SchedScheduler:
+		def __init__(self):
+			self._task_queue = pymw.PyMW_TaskQueue()
+			self._estimator = pymw.PyMW_RuntimeEstimator()
+	
+	def setUp(self):
+		self.speeds = {"slow": 0.1, "medium": 1.0, "fast": 2.0}
+		self.scheduler = self.SchedScheduler()
+		self.tasks = [self.SchedTask(cost) for cost in (1, 100, 10)]
+		for task in self.tasks: self.scheduler._task_queue.append(task)
+	
+	def make_matcher(self, matcher_class, **args):
+		matcher = matcher_class(speed_func=self.speeds.__getitem__, clock=lambda: 0, **args)
+		matcher.attach(self.scheduler)
+		return matcher
+	
+	def testMinMin(self):
+		"""Checking that min-min matches the shortest task to the fastest worker"""
+		matcher = self.make_matcher(schedulers.MinMinMatcher)
+		self.assertEqual(matcher([], ["medium", "fast"]), (self.tasks[0], "fast"))
+	
+	def testMaxMinAndLPT(self):
+		"""Checking that max-min and LPT match the longest task to the fastest worker"""
+		for matcher_class in (schedulers.MaxMinMatcher, schedulers.LPTMatcher, schedulers.SufferageMatcher):
+			matcher = self.make_matcher(matcher_class)
+			self.assertEqual(matcher([], ["medium", "fast", "slow"]), (self.tasks[1], "fast"))
+	
+	def testSpeedProportional(self):
+		"""Checking that slow workers get short tasks and fast workers long tasks"""
+		matcher = self.make_matcher(schedulers.SpeedProportionalMatcher)
+		matcher([], ["slow", "medium", "fast"])
+		self.assertEqual(matcher([], ["slow"]), (self.tasks[0], "slow"))
+		self.assertEqual(matcher([], ["fast"]), (self.tasks[1], "fast"))
+	
+	def testLookahead(self):
+		"""Checking that long tasks wait for a busy fast worker instead of going to a slow one"""
+		matcher = self.make_matcher(schedulers.MaxMinMatcher)
+		self.assertEqual(matcher([], ["fast"]), (self.tasks[1], "fast"))
+		self.scheduler._task_queue.remove(self.tasks[1])
+		# The 10 second task is done sooner by waiting 50 seconds for the fast worker
+		self.assertEqual(matcher([], ["slow"]), (self.tasks[0], "slow"))
+		self.scheduler._task_queue.remove(self.tasks[0])
+		self.assertEqual(matcher([], ["slow"]), (None, None))
+		self.assertEqual(matcher([], ["medium"]), (self.tasks[2], "medium"))
+	
+	def testLookaheadGivesUp(self):
+		"""Checking that tasks stop waiting for a busy worker which overran its estimate or finished"""
+		now = [0]
+		matcher = schedulers.MaxMinMatcher(speed_func=self.speeds.__getitem__, clock=lambda: now[0])
+		matcher.attach(self.scheduler)
+		# The fast worker is expected to be ready after 50 seconds
+		self.assertEqual(matcher([], ["fast"]), (self.tasks[1], "fast"))
+		for task in self.tasks[:2]: self.scheduler._task_queue.remove(task)
+		self.assertEqual(matcher([], ["slow"]), (None, None))
+		now[0] = 120
+		self.assertEqual(matcher([], ["slow"]), (None, None))
+		# After overrunning by 100 seconds, it isn't expected to finish the 10 second task in time
+		now[0] = 150
+		self.assertEqual(matcher([], ["slow"]), (self.tasks[2], "slow"))
+		self.scheduler._task_queue.remove(self.tasks[2])
+		self.scheduler._task_queue.append(self.tasks[0])
+		now[0] = 0
+		matcher = schedulers.MaxMinMatcher(speed_func=self.speeds.__getitem__, clock=lambda: now[0])
+		matcher.attach(self.scheduler)
+		self.assertEqual(matcher([], ["fast"]), (self.tasks[0], "fast"))
+		self.scheduler._task_queue.remove(self.tasks[0])
+		self.scheduler._task_queue.append(self.tasks[1])
+		self.assertEqual(matcher([], ["slow"]), (None, None))
+		matcher.worker_finished("fast")
+		self.assertEqual(matcher([], ["slow"]), (self.tasks[1], "slow"))
+	
+	def testPrefetchExtendsReadyTime(self):
+		"""Checking that prefetching on a busy worker extends its expected ready time"""
+		matcher = self.make_matcher(schedulers.MaxMinMatcher)
+		self.assertEqual(matcher([], ["fast"]), (self.tasks[1], "fast"))
+		self.scheduler._task_queue.remove(self.tasks[1])
+		self.assertEqual(matcher.prefetch([], ["fast"]), (self.tasks[2], "fast"))
+		self.scheduler._task_queue.remove(self.tasks[2])
+		self.assertEqual(matcher._busy["fast"], 55.0)
+		# The slow worker no longer waits for the fast worker, which is busy for 55 seconds
+		self.assertEqual(matcher([], ["slow"]), (self.tasks[0], "slow"))
+	
+	def testFirstComeFirstServed(self):
+		"""Checking that the base matcher gives the first submitted task its fastest worker"""
+		matcher = self.make_matcher(schedulers.PyMW_Matcher)
+		self.assertEqual(matcher([], ["medium", "fast", "slow"]), (self.tasks[0], "fast"))
+
+class TestLocalityMatcher(unittest.TestCase):
+	class DataTask:
+		def __init__(self, keys):
+			self._data_keys = keys
+			self._priority = 0
+			self._times = {"submit_time": 0}
+	
+	class DataInterface:
+		def __init__(self):
+			self.worker_data = {"w1": set(), "w2": set()}
+		def get_worker_data(self, worker):
+			return self.worker_data[worker]
+	
+	def setUp(self):
+		self.scheduler = TestSchedulers.SchedScheduler()
+		self.scheduler._interface = self.DataInterface()
+		self.now = 0
+		self.matcher = schedulers.LocalityMatcher(delay=5, clock=lambda: self.now)
+		self.matcher.attach(self.scheduler)
+	
+	def match(self, worker_list):
+		task_list = self.scheduler._task_queue.get_data(self.matcher.match_window)
+		task, worker = self.matcher(task_list, worker_list)
+		if task: self.scheduler._task_queue.remove(task)
+		return task, worker
+	
+	def testLocalMatch(self):
+		"""Checking that tasks go to the worker holding their data"""
+		tasks = [self.DataTask(("b.zip",)), self.DataTask(("a.zip",))]
+		for task in tasks: self.scheduler._task_queue.append(task)
+		self.scheduler._interface.worker_data["w1"].add("a.zip")
+		self.assertEqual(self.match(["w1"]), (tasks[1], "w1"))
+		# Nobody holds b.zip, so there is no reason to wait
+		self.assertEqual(self.match(["w1", "w2"]), (tasks[0], "w2"))
+	
+	def testDelayScheduling(self):
+		"""Checking that tasks wait for a busy worker with their data until the delay passes"""
+		# w1 will hold a.zip after running the first task and stays busy
+		first_task = self.DataTask(("a.zip",))
+		self.scheduler._task_queue.append(first_task)
+		self.assertEqual(self.match(["w1"]), (first_task, "w1"))
+		task = self.DataTask(("a.zip",))
+		self.scheduler._task_queue.append(task)
+		self.assertEqual(self.match(["w2"]), (None, None))
+		self.now = 4
+		self.assertEqual(self.match(["w2"]), (None, None))
+		self.now = 6
+		self.assertEqual(self.match(["w2"]), (task, "w2"))
+	
+	def testDelayedTaskSkipped(self):
+		"""Checking that tasks behind one waiting for its data are matched meanwhile"""
+		first_task = self.DataTask(("a.zip",))
+		self.scheduler._task_queue.append(first_task)
+		self.assertEqual(self.match(["w1"]), (first_task, "w1"))
+		tasks = [self.DataTask(("a.zip",)), self.DataTask(()), self.DataTask(("b.zip",))]
+		for task in tasks: self.scheduler._task_queue.append(task)
+		self.assertEqual(self.match(["w2"]), (tasks[1], "w2"))
+		self.assertEqual(self.match(["w2"]), (tasks[2], "w2"))
+		self.assertEqual(self.match(["w2"]), (None, None))
+		self.now = 6
+		self.assertEqual(self.match(["w2"]), (tasks[0], "w2"))
+	
+	def testGenericWorkerData(self):
+		"""Checking that the generic interface reports archives copied to its workers"""
+		file_fd, file_name = tempfile.mkstemp()
+		os.write(file_fd, b"booga")
+		os.close(file_fd)
+		interface = interfaces.generic.GenericInterface(num_workers=2)
+		pymw_master = pymw.PyMW_Master(interface, scheduler_func=schedulers.LocalityMatcher())
+		tasks = [pymw_master.submit_task(check_files, input_data=([file_name.split("/")[-1]],), data_files=(file_name,)) for i in range(3)]
+		for task in tasks:
+			my_task, res = pymw_master.get_result(task)
+			self.assertTrue(res)
+		os.remove(file_name)
+		held = [key for wnum in range(2) for key in interface.get_worker_data(wnum)]
+		# Every data key of a task names an archive some worker holds
+		self.assertEqual(len(tasks[0]._data_keys), 1)
+		self.assertTrue(tasks[0]._data_keys[0] in held)
+
+class TestPrefetch(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testPrefetchResults(self):
+		"""Checking that prefetched tasks return correct results"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			interface = interface_class(num_workers=1, prefetch_depth=2)
+			pymw_master = pymw.PyMW_Master(interface)
+			tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(6)]
+			for i in range(6):
+				my_task, res = pymw_master.get_result(tasks[i])
+				self.assertEqual(res, i)
+			self.assertEqual(getattr(interface, "_input_objs", {}), {})
+	
+	def testPrefetchStealing(self):
+		"""Checking that an idle worker takes over tasks prefetched on a busy worker"""
+		interface = interfaces.multicore.MulticoreInterface(num_workers=2, prefetch_depth=2)
+		pymw_master = pymw.PyMW_Master(interface)
+		long_task = pymw_master.submit_task(sleep_worker, input_data=(3,))
+		short_tasks = [pymw_master.submit_task(sleep_worker, input_data=(0,)) for i in range(3)]
+		for task in short_tasks:
+			pymw_master.get_result(task)
+		self.assertEqual(long_task.get_total_time(), None)
+		my_task, res = pymw_master.get_result(long_task)
+		self.assertEqual(res, 3)
+
+class TestSpeculation(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testSpeculativeCopy(self):
+		"""Checking that a copy of a straggling task delivers its result and the original is cancelled"""
+		interface = interfaces.generic.GenericInterface(num_workers=2)
+		pymw_master = pymw.PyMW_Master(interface, speculative_factor=2)
+		marker_dir = tempfile.mkdtemp()
+		marker_file = os.path.join(marker_dir, "marker")
+		open(marker_file, "w").close()
+		# Teach the estimator how long the function usually takes
+		for i in range(3):
+			pymw_master.get_result(pymw_master.submit_task(straggler_worker, input_data=(marker_file, 30)))
+		os.remove(marker_file)
+		
+		task = pymw_master.submit_task(straggler_worker, input_data=(marker_file, 30))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 30)
+		self.assertTrue(task.get_total_time() < 10)
+		for i in range(20):
+			stats = pymw_master.get_status()["speculation"]
+			if stats["wasted"] > 0: break
+			time.sleep(0.1)
+		self.assertEqual(stats["launched"], 1)
+		self.assertEqual(stats["won"], 1)
+		self.assertEqual(stats["wasted"], 1)
+		os.remove(marker_file)
+		os.rmdir(marker_dir)
+
+class TestRetry(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		file_fd, self.counter_file = tempfile.mkstemp()
+		os.close(file_fd)
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		os.remove(self.counter_file)
+	
+	def testRetry(self):
+		"""Checking that failed tasks are retried until they succeed"""
+		pymw_master = pymw.PyMW_Master(retry_policy=pymw.PyMW_RetryPolicy(max_attempts=3, backoff=0.1))
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 2))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 2)
+		self.assertEqual(len(task._times["failures"]), 2)
+		self.assertEqual(pymw_master.get_status()["retries"]["retries"], 2)
+	
+	def testRetryLimit(self):
+		"""Checking that tasks fail after the maximum number of attempts"""
+		pymw_master = pymw.PyMW_Master()
+		policy = pymw.PyMW_RetryPolicy(max_attempts=2, backoff=0.1)
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 5), retry_policy=policy)
+		self.assertRaises(Exception, pymw_master.get_result, task)
+		self.assertEqual(len(task._times["failures"]), 2)
+		# Errors that aren't retryable fail right away
+		policy = pymw.PyMW_RetryPolicy(retry_on=(IOError,))
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 5), retry_policy=policy)
+		self.assertRaises(Exception, pymw_master.get_result, task)
+		self.assertEqual(len(task._times["failures"]), 1)
+	
+	def testBlacklist(self):
+		"""Checking that workers which fail too often no longer get tasks"""
+		interface = interfaces.generic.GenericInterface(num_workers=2)
+		open(os.path.join(interface._worker_dirs[1], "bad_worker"), "w").close()
+		pymw_master = pymw.PyMW_Master(interface, retry_policy=pymw.PyMW_RetryPolicy(backoff=0.1),
+									   blacklist_rate=0.5, blacklist_min_tasks=1)
+		tasks = [pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0)) for i in range(4)]
+		for task in tasks:
+			pymw_master.get_result(task)
+		self.assertEqual(list(pymw_master.get_status()["retries"]["blacklisted_workers"].keys()), ["1"])
+	
+	def testFailingTasksDontBlacklist(self):
+		"""Checking that tasks failing on every worker don't blacklist the workers and block the queue"""
+		pymw_master = pymw.PyMW_Master(interfaces.multicore.MulticoreInterface(num_workers=2),
+									   blacklist_rate=0.5, blacklist_min_tasks=2)
+		tasks = [pymw_master.submit_task(err_worker) for i in range(6)]
+		for task in tasks:
+			self.assertRaises(Exception, pymw_master.get_result, task)
+		self.assertEqual(pymw_master.get_status()["retries"]["blacklisted_workers"], {})
+	
+	def testBlacklistFallback(self):
+		"""Checking that blacklisted workers are used when no other worker can run the queued tasks"""
+		scheduler = pymw.PyMW_Scheduler(pymw.PyMW_TaskQueue(), interfaces.threaded.ThreadInterface(num_workers=2),
+										None, blacklist_rate=0.5, blacklist_min_tasks=1)
+		scheduler._blacklist[0] = scheduler._blacklist[1] = time.time()
+		self.assertEqual(scheduler._get_worker_list(), [0, 1])
+		scheduler._num_running = 1
+		self.assertEqual(scheduler._get_worker_list(), [])
+	
+	def testTimeout(self):
+		"""Checking that tasks running past their timeout are killed and their worker is freed"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			pymw_master = pymw.PyMW_Master(interface_class())
+			task = pymw_master.submit_task(sleep_worker, input_data=(30,), timeout=0.5)
+			self.assertRaises(pymw.TaskTimeoutException, pymw_master.get_result, task)
+			task = pymw_master.submit_task(null_worker, input_data=(1,), timeout=5)
+			my_task, res = pymw_master.get_result(task)
+			self.assertEqual(res, 1)
+			self.assertEqual(pymw_master.get_status()["retries"]["timeouts"], 1)
+	
+	def testTimeoutRetry(self):
+		"""Checking that timed out tasks are retried according to their policy"""
+		pymw_master = pymw.PyMW_Master()
+		os.remove(self.counter_file)
+		policy = pymw.PyMW_RetryPolicy(backoff=0.1, retry_on=(pymw.TaskTimeoutException,))
+		task = pymw_master.submit_task(straggler_worker, input_data=(self.counter_file, 30), timeout=1, retry_policy=policy)
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 30)
+		self.assertEqual(len(task._times["failures"]), 1)
+
+class TestCancel(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testCancel(self):
+		"""Checking that queued and running tasks can be cancelled and their worker is reused"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			pymw_master = pymw.PyMW_Master(interface_class())
+			long_task = pymw_master.submit_task(sleep_worker, input_data=(30,))
+			tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(3)]
+			while long_task._task_state is not long_task.TASK_RUNNING:
+				time.sleep(0.01)
+			self.assertEqual(pymw_master.cancel([long_task, tasks[1]]), 2)
+			self.assertRaises(pymw.TaskCancelledException, pymw_master.get_result, long_task)
+			self.assertRaises(pymw.TaskCancelledException, pymw_master.get_result, tasks[1])
+			for i in (0, 2):
+				my_task, res = pymw_master.get_result(tasks[i])
+				self.assertEqual(res, i)
+			# Finished tasks can't be cancelled
+			self.assertEqual(pymw_master.cancel(tasks[0]), 0)
+
+class TestResultCache(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.cache_dir = tempfile.mkdtemp()
+		file_fd, self.counter_file = tempfile.mkstemp()
+		os.close(file_fd)
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		os.remove(self.counter_file)
+		for file_name in os.listdir(self.cache_dir):
+			os.remove(os.path.join(self.cache_dir, file_name))
+		os.rmdir(self.cache_dir)
+	
+	def testCacheHit(self):
+		"""Checking that cached results are reused by later masters without executing the task"""
+		pymw_master = pymw.PyMW_Master(result_cache=self.cache_dir)
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 0)
+		self.assertEqual(pymw_master.get_status()["result_cache"]["stores"], 1)
+		
+		pymw_master = pymw.PyMW_Master(result_cache=self.cache_dir)
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0))
+		self.assertEqual(task._task_state, task.TASK_FINISHED)
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 0)
+		self.assertEqual(open(self.counter_file).read(), "x")
+		self.assertEqual(pymw_master.get_status()["result_cache"]["hit_ratio"], 1.0)
+		# Different input isn't a hit
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 1))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 1)
+	
+	def testLocalModuleKey(self):
+		"""Checking that editing a local module changes the cache key, and broken modules don't stop caching"""
+		module_dir = tempfile.mkdtemp()
+		for module_name, source in (("pymw_cache_helper", "X = 1\n"), ("pymw_cache_broken", "raise ValueError()\n")):
+			module_file = open(os.path.join(module_dir, module_name+".py"), "w")
+			module_file.write(source)
+			module_file.close()
+		sys.path.insert(0, module_dir)
+		try:
+			cache = pymw.PyMW_ResultCache(self.cache_dir)
+			old_key = cache.get_key(["def f(): pass"], ["pymw_cache_helper", "pymw_cache_broken"], [], (1,))
+			self.assertEqual(cache.get_key(["def f(): pass"], ["pymw_cache_helper", "pymw_cache_broken"], [], (1,)), old_key)
+			module_file = open(os.path.join(module_dir, "pymw_cache_helper.py"), "w")
+			module_file.write("X = 22\n")
+			module_file.close()
+			self.assertNotEqual(cache.get_key(["def f(): pass"], ["pymw_cache_helper", "pymw_cache_broken"], [], (1,)), old_key)
+		finally:
+			sys.path.remove(module_dir)
+			sys.modules.pop("pymw_cache_helper", None)
+			shutil.rmtree(module_dir)
+	
+	def testEviction(self):
+		"""Checking that the least recently used results are evicted from a full cache"""
+		cache = pymw.PyMW_ResultCache(self.cache_dir, max_bytes=2500)
+		for key in ("a", "b"):
+			cache.put(key, "x"*1000)
+		self.assertEqual(cache.get("a")[0], True)
+		cache.put("c", "x"*1000)
+		self.assertEqual(cache.get("b"), (False, None))
+		self.assertEqual(cache.get("a")[0], True)
+		self.assertEqual(cache.get_stats()["evictions"], 1)
+		# The cache index is rebuilt from the cache directory
+		cache = pymw.PyMW_ResultCache(self.cache_dir, max_bytes=2500)
+		self.assertEqual(cache.get("c"), (True, "x"*1000))
+
+class TestJournal(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		file_fd, self.counter_file = tempfile.mkstemp()
+		os.close(file_fd)
+		file_fd, self.journal_file = tempfile.mkstemp()
+		os.close(file_fd)
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		os.remove(self.counter_file)
+		os.remove(self.journal_file)
+		if os.path.exists(self.journal_file+".results"): os.remove(self.journal_file+".results")
+	
+	def testResume(self):
+		"""Checking that a resumed master restores finished tasks and only runs the missing ones"""
+		# Records are flushed as they are written, since the first master is still running when the second resumes
+		pymw_master = pymw.PyMW_Master(journal=pymw.PyMW_Journal(self.journal_file, flush_interval=0))
+		for i in range(2):
+			task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0))
+			pymw_master.get_result(task)
+		self.assertEqual(open(self.counter_file).read(), "xx")
+		
+		pymw_master = pymw.PyMW_Master(resume=self.journal_file)
+		tasks = [pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0)) for i in range(3)]
+		self.assertEqual([task._task_state for task in tasks[:2]], [tasks[0].TASK_FINISHED]*2)
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], [0, 1, 2])
+		self.assertEqual(pymw_master.get_status()["journal"]["restored"], 2)
+		self.assertEqual(open(self.counter_file).read(), "xxx")
+		pymw_master._journal.close(completed=True)
+	
+	def testResumeAfterCleanup(self):
+		"""Checking that results survive the cleanup of a master which didn't complete its journal"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.threaded.ThreadInterface):
+			open(self.counter_file, "w").close()
+			pymw_master = pymw.PyMW_Master(interface_class(), journal=self.journal_file)
+			tasks = [pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0)) for i in range(2)]
+			for task in tasks: pymw_master.get_result(task)
+			pymw_master._cleanup(None, None)
+			
+			pymw_master = pymw.PyMW_Master(interface_class(), resume=self.journal_file)
+			tasks = [pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0)) for i in range(2)]
+			self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], [0, 1])
+			self.assertEqual(pymw_master.get_status()["journal"]["restored"], 2)
+			self.assertEqual(open(self.counter_file).read(), "xx")
+			pymw_master._journal.close(completed=True)
+			pymw_master._cleanup(None, None)
+	
+	def testCompleted(self):
+		"""Checking that the outputs of a completed journal are deleted on cleanup"""
+		journal = pymw.PyMW_Journal(self.journal_file, flush_interval=0)
+		pymw_master = pymw.PyMW_Master(interfaces.threaded.ThreadInterface(), journal=journal)
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0))
+		pymw_master.get_result(task)
+		self.assertTrue(os.path.exists(self.journal_file+".results"))
+		journal.close(completed=True)
+		pymw_master._cleanup(None, None)
+		self.assertFalse(os.path.exists(self.journal_file+".results"))
+		self.assertFalse(os.path.exists(task._output_arg))
+		
+		pymw_master = pymw.PyMW_Master(resume=self.journal_file)
+		task = pymw_master.submit_task(flaky_worker, input_data=(self.counter_file, 0))
+		self.assertEqual(pymw_master.get_result(task)[1], 1)
+		self.assertEqual(pymw_master.get_status()["journal"]["restored"], 0)
+		pymw_master._journal.close(completed=True)
+	
+	def testReattach(self):
+		"""Checking that a resumed master reattaches to tasks still running on the interface"""
+		pymw_master = pymw.PyMW_Master(BatchInterface(), journal=pymw.PyMW_Journal(self.journal_file, flush_interval=0))
+		task = pymw_master.submit_task(null_worker, input_data=(5,))
+		while task._task_state is not task.TASK_RUNNING:
+			time.sleep(0.01)
+		
+		interface = BatchInterface()
+		pymw_master = pymw.PyMW_Master(interface, resume=self.journal_file)
+		task = pymw_master.submit_task(null_worker, input_data=(5,))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res, 5)
+		self.assertEqual(interface.reattached, [task])
+		self.assertEqual(pymw_master.get_status()["journal"]["reattached"], 1)
+		pymw_master._journal.close(completed=True)
+
+class TestResultStore(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.store_dir = tempfile.mkdtemp()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		for file_name in os.listdir(self.store_dir):
+			os.remove(os.path.join(self.store_dir, file_name))
+		os.rmdir(self.store_dir)
+	
+	def testStore(self):
+		"""Checking that results are stored in segments and can be reloaded"""
+		store = pymw.PyMW_ResultStore(self.store_dir, segment_bytes=2000)
+		for i in range(6):
+			store.put("task_"+str(i), str(i)*1000)
+		self.assertEqual(store.get_stats()["num_segments"], 3)
+		self.assertEqual(store.get("task_3"), "3"*1000)
+		self.assertRaises(KeyError, store.get, "task_9")
+		# Segments are deleted once all their results are removed
+		store.remove("task_0")
+		store.remove("task_1")
+		self.assertEqual(store.get_stats()["num_segments"], 2)
+		store.put("task_2", "replaced")
+		store.close()
+		
+		store = pymw.PyMW_ResultStore(self.store_dir, segment_bytes=2000)
+		self.assertEqual([key for key, result in store.iter_results()], ["task_3", "task_4", "task_5", "task_2"])
+		self.assertEqual(store.get("task_2"), "replaced")
+		store.close()
+	
+	def testMasterStore(self):
+		"""Checking that finished tasks keep their results in the result store"""
+		store = pymw.PyMW_ResultStore(self.store_dir)
+		pymw_master = pymw.PyMW_Master(interfaces.multicore.MulticoreInterface(), result_store=store)
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(4)]
+		my_task, res = pymw_master.get_result(tasks[2])
+		self.assertEqual(res, 2)
+		self.assertEqual(my_task._output_data, None)
+		results = dict(pymw_master.iter_results())
+		self.assertEqual(sorted(results.values()), [0, 1, 3])
+		self.assertEqual(len(store), 4)
+		self.assertEqual(pymw_master._interface._output_objs, {})
+		store.close()
+
+class TestLazyResult(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testLazyResult(self):
+		"""Checking that lazy results are only unpickled when used, and can be passed to other tasks"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			pymw_master = pymw.PyMW_Master(interface_class(), lazy_results=True)
+			task = pymw_master.submit_task(square, input_data=([1, 2, 3],))
+			my_task, res = pymw_master.get_result(task)
+			self.assertTrue(isinstance(res, pymw.PyMW_LazyResult))
+			task = pymw_master.submit_task(plus, input_data=(res,))
+			my_task, sum_res = pymw_master.get_result(task)
+			self.assertEqual(res._decoded, False)
+			self.assertEqual(sum_res.get(), 14)
+			self.assertEqual(res.get(), [1, 4, 9])
+	
+	def testLazyStoredResult(self):
+		"""Checking that lazy results in the result store are read from disk when used"""
+		store_dir = tempfile.mkdtemp()
+		pymw_master = pymw.PyMW_Master(lazy_results=True, result_store=store_dir)
+		task = pymw_master.submit_task(null_worker, input_data=("stored",))
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(res._data, None)
+		self.assertEqual(res.get(), "stored")
+		pymw_master._result_store.close(True)
+
+class TestStream(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.marker_file = tempfile.mktemp()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		os.remove(self.marker_file)
+	
+	def testStream(self):
+		"""Checking that results emitted by generator functions are streamed while the task runs"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			if os.path.exists(self.marker_file): os.remove(self.marker_file)
+			pymw_master = pymw.PyMW_Master(interface_class())
+			task = pymw_master.submit_task(stream_worker, input_data=(self.marker_file,))
+			result_stream = pymw_master.stream(task)
+			self.assertEqual(next(result_stream), 1)
+			self.assertEqual(task._task_state, task.TASK_RUNNING)
+			open(self.marker_file, "w").close()
+			self.assertEqual(list(result_stream), [2])
+			my_task, res = pymw_master.get_result(task)
+			self.assertEqual(res, [1, 2])
+			# Tasks of normal functions stream their result
+			task = pymw_master.submit_task(null_worker, input_data=(3,))
+			self.assertEqual(list(pymw_master.stream(task)), [3])
+	
+	def testStreamDelivered(self):
+		"""Checking that delivered tasks drop their emitted results, and stream the rest from the result store"""
+		pymw_master = pymw.PyMW_Master(interfaces.multicore.MulticoreInterface(), result_store=tempfile.mkdtemp())
+		task = pymw_master.submit_task(stream_worker, input_data=(self.marker_file,))
+		result_stream = pymw_master.stream(task)
+		self.assertEqual(next(result_stream), 1)
+		open(self.marker_file, "w").close()
+		my_task, res = pymw_master.get_result(task)
+		self.assertEqual(task._stream_items, [])
+		self.assertEqual(task._output_data, None)
+		self.assertEqual(list(result_stream), [2])
+		self.assertEqual(list(pymw_master.stream(task)), [1, 2])
+		pymw_master._result_store.close(True)
+
+class TestProgress(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.marker_file = tempfile.mktemp()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		os.remove(self.marker_file)
+	
+	def testProgress(self):
+		"""Checking that the progress reported by a running task is seen by the master"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			if os.path.exists(self.marker_file): os.remove(self.marker_file)
+			pymw_master = pymw.PyMW_Master(interface_class())
+			task = pymw_master.submit_task(progress_worker, input_data=(self.marker_file,))
+			while task.get_progress() == 0:
+				time.sleep(0.01)
+			self.assertEqual(task._task_state, task.TASK_RUNNING)
+			self.assertEqual(pymw_master.get_progress(), [0.5])
+			open(self.marker_file, "w").close()
+			pymw_master.get_result(task)
+			self.assertEqual(pymw_master.get_progress(task), [1.0])
+
+class TestFork(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		fork_state["value"] = 0
+	
+	def testForkState(self):
+		"""Checking that tasks of the fork interface use the objects of the master"""
+		fork_interface = interfaces.fork.ForkInterface(num_workers=2)
+		pymw_master = pymw.PyMW_Master(fork_interface)
+		fork_state["value"] = 10
+		tasks = [pymw_master.submit_task(fork_worker, input_data=(i,)) for i in range(4)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], [10, 11, 12, 13])
+		self.assertEqual(list(pymw_master.stream(pymw_master.submit_task(stream_worker, (tempfile.gettempdir(),)))), [1, 2])
+		self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+		# Delivered tasks don't keep their input
+		self.assertEqual(fork_interface._input_objs, {})
+	
+	def testZygote(self):
+		"""Checking that tasks forked from a zygote see the master as it was when the zygote was forked"""
+		fork_state["value"] = 10
+		fork_interface = interfaces.fork.ForkInterface(num_workers=2, zygote=True)
+		pymw_master = pymw.PyMW_Master(fork_interface)
+		fork_state["value"] = 20
+		task, res = pymw_master.get_result(pymw_master.submit_task(fork_worker, input_data=(1,)))
+		self.assertEqual(res, 11)
+		fork_interface.refresh_zygote()
+		task, res = pymw_master.get_result(pymw_master.submit_task(fork_worker, input_data=(1,)))
+		self.assertEqual(res, 21)
+
+class TestThread(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testThreadInterface(self):
+		"""Checking that the thread interface calls task functions on the input objects of the master"""
+		thread_interface = interfaces.threaded.ThreadInterface(num_workers=2)
+		pymw_master = pymw.PyMW_Master(thread_interface)
+		obj_list = []
+		task = pymw_master.submit_task(append_worker, input_data=(obj_list, 0.5))
+		my_task, res = pymw_master.get_result(task)
+		self.assertTrue(res is obj_list)
+		self.assertEqual(obj_list, [0])
+		self.assertFalse(os.path.exists(task._executable_name))
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(10)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(10)))
+		self.assertEqual(list(pymw_master.stream(pymw_master.submit_task(stream_worker, (tempfile.gettempdir(),)))), [1, 2])
+		self.assertRaises(ZeroDivisionError, pymw_master.get_result, pymw_master.submit_task(err_worker))
+		self.assertEqual(thread_interface._input_objs, {})
+
+class TestSubinterpreter(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testSubinterpreterInterface(self):
+		"""Checking that the subinterpreter interface (or its fallback) runs tasks"""
+		pymw_master = pymw.PyMW_Master(interfaces.subinterpreter.SubinterpreterInterface(num_workers=2))
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(10)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(10)))
+		task, res = pymw_master.get_result(pymw_master.submit_task(print_worker))
+		self.assertEqual(task._stdout, "stdout test")
+		self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+	
+	@unittest.skipIf(interfaces.subinterpreter._interpreters is None, "subinterpreters are not supported")
+	def testSubinterpreterTasks(self):
+		"""Checking that tasks run in subinterpreters, and tasks with data files are rejected"""
+		interface = interfaces.subinterpreter.SubinterpreterInterface(num_workers=2)
+		self.assertTrue(isinstance(interface, interfaces.subinterpreter.SubinterpreterInterface))
+		pymw_master = pymw.PyMW_Master(interface)
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(10)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(10)))
+		self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+		data_file = tempfile.NamedTemporaryFile(suffix=".dat", delete=False)
+		data_file.close()
+		try:
+			task = pymw_master.submit_task(check_files, input_data=([os.path.basename(data_file.name)],),
+										   data_files=(data_file.name,))
+			self.assertRaises(Exception, pymw_master.get_result, task)
+		finally:
+			os.remove(data_file.name)
+		interface._cleanup()
+
+class TestAsync(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.marker_file = tempfile.mktemp()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+		if os.path.exists(self.marker_file): os.remove(self.marker_file)
+	
+	def testAsyncInterfaces(self):
+		"""Checking that the asyncio driver runs the tasks of the generic and multicore interfaces"""
+		for interface_class in (interfaces.generic.GenericInterface, interfaces.multicore.MulticoreInterface):
+			if os.path.exists(self.marker_file): os.remove(self.marker_file)
+			pymw_master = pymw.PyMW_Master(interface_class(num_workers=8, use_async=True))
+			tasks = [pymw_master.submit_task(stream_worker, input_data=(self.marker_file,)) for i in range(8)]
+			for task in tasks:
+				while task._task_state != task.TASK_RUNNING: time.sleep(0.01)
+			# Python 3.12 and later also watch the processes from the event loop
+			if sys.version_info >= (3, 12): self.assertTrue(threading.active_count() < 8)
+			open(self.marker_file, "w").close()
+			self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], [[1, 2]]*8)
+			self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+			self.assertEqual(pymw_master._interface.get_prefetch_workers(), {})
+	
+	def testFinishOffLoop(self):
+		"""Checking that the asyncio driver doesn't handle finished processes in the event loop thread"""
+		from pymw.interfaces import async_driver
+		finished = []
+		done = threading.Event()
+		def finish_func(returncode, output, proc_stderr):
+			finished.append((returncode, threading.current_thread()))
+			done.set()
+		async_driver.start_process(None, [sys.executable, "-c", "pass"], [None, None, False], finish_func)
+		self.assertTrue(done.wait(5))
+		self.assertEqual(finished[0][0], 0)
+		self.assertNotEqual(finished[0][1], async_driver.get_driver()._thread)
+
+class TestSocket(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.pymw_interface = interfaces.tcp.SocketInterface(port=0, host="127.0.0.1", heartbeat_interval=0.2,
+															 heartbeat_timeout=1.0)
+		self.pymw_master = pymw.PyMW_Master(self.pymw_interface)
+		# Start two agents with one core each on localhost
+		package_dir = os.path.dirname(os.path.abspath(__file__))
+		agent_args = [sys.executable, os.path.join(package_dir, "scripts", "pymw-worker"), "-c", "1",
+					  "127.0.0.1:"+str(self.pymw_interface.address[1])]
+		agent_env = dict(os.environ, PYTHONPATH=package_dir, PYMW_AUTHKEY_FILE=self.pymw_interface.authkey_file)
+		self.agents = [subprocess.Popen(agent_args, env=agent_env) for i in range(2)]
+		while self.pymw_interface.get_status()["num_total_workers"] < 2: time.sleep(0.05)
+	
+	def tearDown(self):
+		self.pymw_interface._cleanup()
+		for agent in self.agents:
+			os.kill(agent.pid, signal.SIGCONT)
+			agent.kill()
+			agent.wait()
+		self._kill_timer.cancel()
+	
+	def testSocketInterface(self):
+		"""Checking that worker agents connected over TCP run tasks"""
+		tasks = [self.pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(10)]
+		self.assertEqual([self.pymw_master.get_result(task)[1] for task in tasks], list(range(10)))
+		task, res = self.pymw_master.get_result(self.pymw_master.submit_task(print_worker))
+		self.assertEqual(task._stdout, "stdout test")
+		self.assertEqual(list(self.pymw_master.stream(self.pymw_master.submit_task(stream_worker, (tempfile.gettempdir(),)))), [1, 2])
+		self.assertRaises(Exception, self.pymw_master.get_result, self.pymw_master.submit_task(err_worker))
+		self.assertEqual(len(self.pymw_interface.get_status()["agents"]), 2)
+		self.assertEqual(self.pymw_interface._input_objs, {})
+	
+	def testLostAgent(self):
+		"""Checking that the task of an agent which stops sending heartbeats runs on another agent"""
+		tasks = [self.pymw_master.submit_task(sleep_worker, input_data=(1,)) for i in range(2)]
+		for task in tasks:
+			while task._task_state != task.TASK_RUNNING: time.sleep(0.01)
+		os.kill(self.agents[0].pid, signal.SIGSTOP)
+		start_time = time.time()
+		self.assertEqual([self.pymw_master.get_result(task)[1] for task in tasks], [1, 1])
+		self.assertTrue(time.time() - start_time < 5)
+		self.assertEqual(self.pymw_master.get_status()["retries"]["retries"], 1)
+		self.assertEqual(self.pymw_interface.get_status()["num_total_workers"], 1)
+	
+	def testAuthkey(self):
+		"""Checking that the master only listens on all interfaces with an authkey, and rejects agents without it"""
+		from multiprocessing.connection import Client
+		import multiprocessing
+		self.assertRaises(Exception, interfaces.tcp.SocketInterface, port=0, host="", authkey=False)
+		# The generated key of the interface is only readable by the user, and removed on cleanup
+		key_file = self.pymw_interface.authkey_file
+		self.assertEqual(os.stat(key_file).st_mode & 0o777, 0o600)
+		with open(key_file, "rb") as f:
+			self.assertEqual(f.read(), self.pymw_interface.authkey)
+		self.assertRaises(multiprocessing.AuthenticationError, Client, self.pymw_interface.address, authkey=b"wrong")
+		other_interface = interfaces.tcp.SocketInterface(port=0)
+		self.assertNotEqual(other_interface.authkey, self.pymw_interface.authkey)
+		other_interface._cleanup()
+		self.assertFalse(os.path.exists(other_interface.authkey_file))
+		secure_interface = interfaces.tcp.SocketInterface(port=0, host="", authkey=b"secret")
+		try:
+			address = ("127.0.0.1", secure_interface.address[1])
+			self.assertRaises(multiprocessing.AuthenticationError, Client, address, authkey=b"wrong")
+			# A client without the key gets the challenge, and the connection is closed instead of welcomed
+			conn = Client(address)
+			conn.send(("hello", {"host": "unauthenticated", "cores": 1}))
+			messages = []
+			while True:
+				try:
+					messages.append(conn.recv_bytes())
+				except (EOFError, IOError, OSError):
+					break
+			conn.close()
+			self.assertFalse([msg for msg in messages if b"welcome" in msg])
+			self.assertEqual(secure_interface.get_status()["num_total_workers"], 0)
+		finally:
+			secure_interface._cleanup()
+
+class TestFederated(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+	
+	def tearDown(self):
+		self._kill_timer.cancel()
+	
+	def testFederatedInterface(self):
+		"""Checking that the federated interface runs tasks on all of its backends"""
+		pymw_interface = interfaces.federated.FederatedInterface(
+			[("local", interfaces.multicore.MulticoreInterface(num_workers=2)),
+			 ("remote", interfaces.generic.GenericInterface(num_workers=2))])
+		pymw_master = pymw.PyMW_Master(pymw_interface)
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(20)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(20)))
+		task, res = pymw_master.get_result(pymw_master.submit_task(print_worker))
+		self.assertEqual(task._stdout, "stdout test")
+		self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+		status = pymw_interface.get_status()
+		self.assertEqual(status["num_total_workers"], 4)
+		self.assertTrue(status["backends"]["local"]["num_tasks"] > 0)
+		self.assertTrue(status["backends"]["remote"]["num_tasks"] > 0)
+		self.assertEqual(status["backends"]["local"]["num_tasks"]+status["backends"]["remote"]["num_tasks"], 22)
+	
+	def testSharedWorkerLatency(self):
+		"""Checking that the latency of a backend without worker lists is measured for each task"""
+		delayed = interfaces.federated.Backend("delayed", DelayInterface(0.3))
+		pymw_interface = interfaces.federated.FederatedInterface([delayed])
+		pymw_master = pymw.PyMW_Master(pymw_interface)
+		tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(4)]
+		self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(4)))
+		status = pymw_interface.get_status()["backends"]["delayed"]
+		self.assertEqual(status["num_tasks"], 4)
+		self.assertEqual(status["num_running"], 0)
+		self.assertTrue(0.3 <= status["latency"] < 1.0)
+	
+	def testFederatedPolicy(self):
+		"""Checking that an expensive backend only gets the tasks the cheaper one can't start soon"""
+		local = interfaces.federated.Backend("local", interfaces.threaded.ThreadInterface(num_workers=2), latency=1.0)
+		burst = interfaces.federated.Backend("burst", interfaces.threaded.ThreadInterface(num_workers=2), cost=10.0)
+		pymw_interface = interfaces.federated.FederatedInterface([local, burst])
+		backend_names = lambda: set([worker.backend.name for worker in pymw_interface.get_available_workers()])
+		pymw_interface.set_queue_length(1)
+		self.assertEqual(backend_names(), set(["local"]))
+		pymw_interface.set_queue_length(3)
+		self.assertEqual(backend_names(), set(["local", "burst"]))
+		for worker in pymw_interface.get_available_workers():
+			if worker.backend is local: pymw_interface.reserve_worker(worker)
+		# Waiting for a local worker is faster for a few tasks, but not for many
+		self.assertEqual(backend_names(), set())
+		pymw_interface.set_queue_length(40)
+		self.assertEqual(backend_names(), set(["burst"]))
+
+class TestSubMaster(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		self.pymw_interface = interfaces.submaster.SubMasterInterface(num_submasters=2, num_workers=1, queue_depth=1)
+		self.pymw_master = pymw.PyMW_Master(self.pymw_interface)
+	
+	def tearDown(self):
+		self.pymw_interface._cleanup()
+		self._kill_timer.cancel()
+	
+	def testSubMasterInterface(self):
+		"""Checking that sub-masters run the tasks of the master"""
+		tasks = [self.pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(10)]
+		self.assertEqual([self.pymw_master.get_result(task)[1] for task in tasks], list(range(10)))
+		task, res = self.pymw_master.get_result(self.pymw_master.submit_task(print_worker))
+		self.assertEqual(task._stdout, "stdout test")
+		self.assertRaises(Exception, self.pymw_master.get_result, self.pymw_master.submit_task(err_worker))
+		status = self.pymw_interface.get_status()
+		self.assertEqual(status["num_total_workers"], 2)
+		self.assertEqual(sum([submaster["num_tasks"] for submaster in status["submasters"]]), 12)
+		self.assertTrue(min([submaster["num_tasks"] for submaster in status["submasters"]]) > 0)
+	
+	def testLostSubMaster(self):
+		"""Checking that the task of a sub-master which exits runs on another sub-master"""
+		tasks = [self.pymw_master.submit_task(sleep_worker, input_data=(1,)) for i in range(2)]
+		for task in tasks:
+			while task._task_state != task.TASK_RUNNING: time.sleep(0.01)
+		self.pymw_interface._submasters[0]._process.terminate()
+		start_time = time.time()
+		self.assertEqual([self.pymw_master.get_result(task)[1] for task in tasks], [1, 1])
+		self.assertTrue(time.time() - start_time < 5)
+		self.assertEqual(self.pymw_master.get_status()["retries"]["retries"], 1)
+		self.assertEqual(self.pymw_interface.get_status()["num_total_workers"], 1)
+	
+	def testSentResults(self):
+		"""Checking that sub-masters send errors pickled, and forget the tasks whose results they sent"""
+		import multiprocessing
+		thread_interface = interfaces.submaster.SubMasterInterface(num_submasters=1,
+																   interface_factory=interfaces.threaded.ThreadInterface)
+		try:
+			pymw_master = pymw.PyMW_Master(thread_interface)
+			self.assertRaises(ZeroDivisionError, pymw_master.get_result, pymw_master.submit_task(err_worker))
+		finally:
+			thread_interface._cleanup()
+		sub_master = pymw.PyMW_Master(interfaces.threaded.ThreadInterface())
+		conn, child_conn = multiprocessing.Pipe()
+		task_ids, tasks, lock = {}, {}, threading.Lock()
+		lock.acquire()
+		for task_id, task in enumerate([sub_master.submit_task(null_worker, input_data=(1,)),
+										sub_master.submit_task(err_worker)]):
+			task_ids[task], tasks[task_id] = task_id, task
+		lock.release()
+		results_thread = threading.Thread(target=interfaces.submaster._send_results,
+										  args=(child_conn, threading.Lock(), sub_master, task_ids, tasks, lock))
+		results_thread.daemon = True
+		results_thread.start()
+		results = {}
+		while len(results) < 2:
+			for result in conn.recv()[1]: results[result[0]] = result
+		self.assertEqual(pickle.loads(results[0][2]), 1)
+		self.assertTrue(isinstance(pickle.loads(results[1][1]), ZeroDivisionError))
+		self.assertEqual((task_ids, tasks), ({}, {}))
+		self.assertEqual((sub_master._submitted_tasks, sub_master._submitted_task_set), ([], set()))
+
+class TestMPI(unittest.TestCase):
+	def setUp(self):
+		self._kill_timer = threading.Timer(10, killAll)
+		self._kill_timer.start()
+		# In-process workers change the working directory
+		self._cwd = os.getcwd()
+		self._mpi = interfaces.mpi.MPI
+		self.fake_mpi = interfaces.mpi.MPI = FakeMPI(interfaces.mpi.inprocess_worker_func)
+		self.pymw_interface = interfaces.mpi.MPIInterface(num_workers=2, in_process=True)
+		self.pymw_master = pymw.PyMW_Master(self.pymw_interface)
+	
+	def tearDown(self):
+		self.pymw_interface._cleanup()
+		for thread in self.fake_mpi.workers: thread.join()
+		interfaces.mpi.MPI = self._mpi
+		os.chdir(self._cwd)
+		self._kill_timer.cancel()
+	
+	def testInProcess(self):
+		"""Checking that in-process MPI workers run tasks, and get each file once"""
+		tasks = [self.pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(6)]
+		self.assertEqual([self.pymw_master.get_result(task)[1] for task in tasks], list(range(6)))
+		self.assertRaises(Exception, self.pymw_master.get_result, self.pymw_master.submit_task(err_worker))
+		# Files are sent by content hash, so each worker gets a file once
+		sent_files = [(dest, msg[1]) for dest, tag, msg in self.fake_mpi.comm.sent if tag == 0 and msg and msg[0] == "file"]
+		self.assertEqual(len(sent_files), len(set(sent_files)))
+		self.assertTrue(len(sent_files) < 7)
+		for file_hash in self.pymw_interface._complete_files:
+			self.assertFalse(file_hash in self.pymw_interface._file_data)
+	
+	def testIdleProgress(self):
+		"""Checking that the MPI progress thread doesn't poll while no tasks run"""
+		self.assertEqual(self.pymw_master.get_result(self.pymw_master.submit_task(null_worker, input_data=(1,)))[1], 1)
+		num_probes = self.fake_mpi.comm.num_probes
+		time.sleep(0.2)
+		self.assertTrue(self.fake_mpi.comm.num_probes - num_probes <= 1)
+	
+	def testScriptWorkers(self):
+		"""Checking that MPI workers run scripts with and without MPI_THREAD_MULTIPLE"""
+		for thread_level in (FakeMPI.THREAD_MULTIPLE, FakeMPI.THREAD_FUNNELED):
+			fake_mpi = interfaces.mpi.MPI = FakeMPI(interfaces.mpi.worker_func, thread_level)
+			pymw_interface = interfaces.mpi.MPIInterface(num_workers=2)
+			pymw_master = pymw.PyMW_Master(pymw_interface)
+			tasks = [pymw_master.submit_task(null_worker, input_data=(i,)) for i in range(4)]
+			self.assertEqual([pymw_master.get_result(task)[1] for task in tasks], list(range(4)))
+			self.assertEqual(list(pymw_master.stream(pymw_master.submit_task(stream_worker, (tempfile.gettempdir(),)))), [1, 2])
+			self.assertRaises(Exception, pymw_master.get_result, pymw_master.submit_task(err_worker))
+			pymw_interface._cleanup()
+			for thread in fake_mpi.workers: thread.join()
+
 # TODO: add test case for killing workers
 class TestPyMW(unittest.TestCase):
 	def setUp(self):
@@ -219,6 +1549,20 @@ class TestPyMW(unittest.TestCase):
 		for file in file_list: os.remove(file[1])
 		
 		self.assert_(res)
+	
+	def testPriorityTasks(self):
+		"""Test that task priorities are accepted and reported in the queue wait statistics"""
+		tasks = [self.pymw_master.submit_task(null_worker, input_data=(i,), priority=i%2) for i in range(4)]
+		for task in tasks:
+			my_task, res = self.pymw_master.get_result(task)
+		wait_stats = self.pymw_master.get_status()["queue_wait"]
+		self.assertEqual(wait_stats[0]["num_dispatched"]+wait_stats[1]["num_dispatched"], 4)
+	
+	def testRuntimeEstimates(self):
+		"""Test that the master records execution times of finished tasks"""
+		task = self.pymw_master.submit_task(null_worker, input_data=(1,))
+		self.pymw_master.get_result(task)
+		self.assertTrue(self.pymw_master._estimator.estimate(task) >= 0)
 		
 	def testStandardOperation(self):
 		"""Test standard operation with null worker program"""
@@ -285,6 +1629,55 @@ if __name__ == '__main__':
 		interface_suite = unittest.TestLoader().loadTestsFromTestCase(TestBadInterface)
 		unittest.TextTestRunner(verbosity=2).run(interface_suite)
 
+	if len(sys.argv) == 1 or "--generic" in sys.argv:
+		print("|--------------------------------------|")
+		print("| Running test of internal structures. |")
+		print("|--------------------------------------|")
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestTaskQueue)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestRuntimeEstimator)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestSchedulers)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestLocalityMatcher)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestPrefetch)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestSpeculation)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestRetry)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestCancel)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestResultCache)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestJournal)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestResultStore)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestLazyResult)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestStream)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestProgress)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestFork)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestThread)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestSubinterpreter)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestAsync)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestSocket)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestFederated)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestSubMaster)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+		internal_suite = unittest.TestLoader().loadTestsFromTestCase(TestMPI)
+		unittest.TextTestRunner(verbosity=2).run(internal_suite)
+
 	# NOTE: some of these may fail because the tests will time out after 10 seconds.
 	# NOTE: perhaps we should make the timeout variable?
 	if "--boinc" in sys.argv: